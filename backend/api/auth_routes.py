@@ -1,41 +1,36 @@
-from flask import Blueprint, request, jsonify, session
-from argon2 import PasswordHasher
+from flask import Blueprint, request, jsonify, session, g
 from argon2.exceptions import VerifyMismatchError
-import secrets
-from datetime import datetime, timedelta
-from utils.rate_limiter import rate_limiter
-from database_postgres import SessionLocal, User, Session as DBSession
+from auth.hashing_service import hashing_service, HashingBusyError
+from auth.session_store import session_store
+from utils.rate_limiter import rate_limiter, rate_limit
+from database_postgres import get_db, User, VaultRekeyJob
+from crypto.encryption import PasswordEncryption, FORMAT_V3
+from crypto.key_cache import derived_key_cache
+from crypto.vault_migration import start_reencryption, start_key_rotation, upgrade_password_derived_entries
+from api.password_routes import require_auth, get_encryptor
+from config import Config
 
 auth_bp = Blueprint('auth', __name__)
-ph = PasswordHasher()
-
-def get_db():
-    """Get database session"""
-    db = SessionLocal()
-    try:
-        return db
-    except Exception as e:
-        db.close()
-        raise e
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
     ip = request.remote_addr
     
-    # Check rate limit
-    is_limited, wait_seconds = rate_limiter.is_rate_limited(ip)
-    if is_limited:
-        minutes = wait_seconds // 60
-        return jsonify({
-            'error': f'Too many failed attempts. Try again in {minutes} minutes.'
-        }), 429
-    
     data = request.json
     master_password = data.get('master_password', '').strip()
     
     if not master_password:
         return jsonify({'error': 'Master password required'}), 400
     
+    # Count this attempt before verifying: the decision comes from the
+    # increment itself, so concurrent guesses can't all pass one check
+    allowed, wait_seconds = rate_limiter.hit(ip)
+    if not allowed:
+        minutes = wait_seconds // 60
+        return jsonify({
+            'error': f'Too many failed attempts. Try again in {minutes} minutes.'
+        }), 429
+    
     db = get_db()
     
     try:
@@ -43,20 +38,14 @@ def login():
         user = db.query(User).first()
         
         if not user:
-            db.close()
-            rate_limiter.add_attempt(ip)
             return jsonify({'error': 'Invalid credentials'}), 401
         
-        # Verify password
+        # Verify password (the failed attempt is already counted)
         try:
-            ph.verify(user.master_password_hash, master_password)
+            hashing_service.verify(user.master_password_hash, master_password)
         except VerifyMismatchError:
-            db.close()
-            rate_limiter.add_attempt(ip)
-            
             # Check remaining attempts
-            attempts_count = len(rate_limiter.attempts.get(ip, []))
-            remaining = rate_limiter.max_attempts - attempts_count
+            remaining = rate_limiter.remaining(ip)
             
             if remaining > 0:
                 return jsonify({
@@ -70,54 +59,92 @@ def login():
         # Successful login - reset rate limit
         rate_limiter.reset_attempts(ip)
         
-        # Create session
-        session_token = secrets.token_urlsafe(32)
-        expires_at = datetime.utcnow() + timedelta(hours=24)
+        # Upgrade the stored hash in place if Argon2 parameters were retuned
+        if hashing_service.needs_rehash(user.master_password_hash):
+            try:
+                user.master_password_hash = hashing_service.hash(master_password)
+            except HashingBusyError:
+                pass  # Try again on a later login
+        
+        # Unwrap the vault key once (created on first login for older accounts)
+        encryptor = PasswordEncryption(master_password, key_cache=derived_key_cache, cache_owner=user.id)
+        if user.wrapped_vault_key:
+            vault_key = encryptor.unwrap_vault_key(user.wrapped_vault_key)
+            if PasswordEncryption.blob_format(user.wrapped_vault_key) != FORMAT_V3:
+                user.wrapped_vault_key = encryptor.wrap_vault_key(vault_key)
+        else:
+            vault_key = PasswordEncryption.generate_vault_key()
+            user.wrapped_vault_key = encryptor.wrap_vault_key(vault_key)
         
-        db_session = DBSession(
-            user_id=user.id,
-            session_token=session_token,
-            expires_at=expires_at
+        # An interrupted key rotation keeps its retired key readable until it resumes
+        keyring = {}
+        job = db.query(VaultRekeyJob).filter_by(user_id=user.id, status='running').first()
+        if job:
+            try:
+                keyring[job.from_key_id] = encryptor.unwrap_vault_key(job.wrapped_old_key)
+            except Exception as e:
+                # Don't lock the user out: log in without the retired key (its
+                # entries fail per entry) and leave the job for a later fix-up
+                print(f"⚠️ Rekey job {job.id} retired key unreadable for user {user.id}: {e!r}")
+                job = None
+        
+        vault = PasswordEncryption(
+            master_password,
+            vault_key=vault_key,
+            key_id=user.vault_key_id or 1,
+            keyring=keyring,
+            key_cache=derived_key_cache,
+            cache_owner=user.id
         )
-        db.add(db_session)
+        job_id = job.id if job else None
+        user_id = user.id
+        
+        # Entries that need the master password are upgraded now, within a time
+        # budget (the session keeps only the vault keys); the background job
+        # started below, which also holds the master password, does the rest
+        upgrade_password_derived_entries(db, user_id, vault, Config.LOGIN_UPGRADE_SECONDS)
+        
+        # Create a server-side session; the cookie only carries its token
+        session_token = session_store.create(db, user_id, vault)
         db.commit()
         
-        # Store in Flask session
-        session['user_id'] = user.id
-        session['master_password'] = master_password
-        session['expires_at'] = expires_at.isoformat()
+        session.clear()
+        session['token'] = session_token
         session.permanent = True
         
-        db.close()
+        # Upgrade older ciphertexts / resume a rotation under the current vault key
+        start_reencryption(user_id, vault, job_id)
         
         return jsonify({
             'success': True,
             'message': 'Login successful',
-            'user_id': user.id
+            'user_id': user_id
         }), 200
         
+    except HashingBusyError as e:
+        rate_limiter.refund(ip)  # The password was never checked
+        return e.to_response()
+        
     except Exception as e:
-        db.close()
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/check-session', methods=['GET'])
 def check_session():
     """Check if current session is valid and not expired"""
     try:
-        if 'user_id' not in session:
+        token = session.get('token')
+        if not token:
             return jsonify({'valid': False, 'error': 'No session found'}), 401
         
-        # Check if session has expired
-        if 'expires_at' in session:
-            expires_at = datetime.fromisoformat(session['expires_at'])
-            if datetime.utcnow() > expires_at:
-                session.clear()
-                return jsonify({'valid': False, 'error': 'Session expired'}), 401
+        state = session_store.load(token)
+        if state is None:
+            session.clear()
+            return jsonify({'valid': False, 'error': 'Session expired'}), 401
         
         return jsonify({
             'valid': True,
-            'user_id': session['user_id'],
-            'expires_at': session.get('expires_at')
+            'user_id': state.user_id,
+            'expires_at': state.expires_at.isoformat()
         }), 200
         
     except Exception as e:
@@ -127,14 +154,19 @@ def check_session():
 def logout():
     """Clear session and delete from database"""
     try:
-        user_id = session.get('user_id')
+        token = session.get('token')
         
-        if user_id:
-            # Delete session from database
+        if token:
+            state = session_store.load(token)
+            
+            # Delete session from database (and this worker's cache)
             db = get_db()
-            db.query(DBSession).filter(DBSession.user_id == user_id).delete()
+            session_store.revoke(db, token)
             db.commit()
-            db.close()
+            
+            # Zeroize cached PBKDF2 keys for this user
+            if state is not None:
+                derived_key_cache.purge(state.user_id)
         
         # Clear Flask session
         session.clear()
@@ -144,7 +176,102 @@ def logout():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@auth_bp.route('/rotate-key', methods=['POST'])
+@require_auth
+@rate_limit('rotate-key', limit=50, key=lambda: g.user_id, cost=10)
+def rotate_vault_key():
+    """
+    Replace the vault key and re-encrypt every entry under the new one.
+
+    Requires the master password again (the new key is wrapped under it).
+    Re-encryption runs in the background in checkpointed batches and resumes
+    at the next login if the worker stops mid-way.
+    """
+    data = request.get_json() or {}
+    master_password = data.get('master_password', '')
+    
+    if not master_password:
+        return jsonify({'error': 'Master password required'}), 400
+    
+    db = get_db()
+    
+    try:
+        user = db.query(User).filter_by(id=g.user_id).first()
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        try:
+            hashing_service.verify(user.master_password_hash, master_password)
+        except VerifyMismatchError:
+            return jsonify({'error': 'Invalid credentials'}), 401
+        
+        if db.query(VaultRekeyJob).filter_by(user_id=user.id, status='running').first():
+            return jsonify({'error': 'A key rotation is already in progress'}), 409
+        
+        current = get_encryptor()
+        new_key, job = start_key_rotation(db, user, master_password, current.vault_key)
+        
+        vault = PasswordEncryption(
+            master_password,
+            vault_key=new_key,
+            key_id=job.to_key_id,
+            keyring=current.keyring,
+            key_cache=derived_key_cache,
+            cache_owner=user.id
+        )
+        job_id = job.id
+        user_id = user.id
+        
+        # This session switches to the new key; others still hold the retired one
+        session_token = session.get('token')
+        session_store.update_keys(db, session_token, vault)
+        session_store.revoke_user(db, user_id, keep_token=session_token)
+        db.commit()
+        
+        start_reencryption(user_id, vault, job_id)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'running',
+            'recovery_key_reset': True,  # Resets are refused until a new recovery key is generated
+            'warning': 'Your recovery key no longer unlocks the vault. Generate a new recovery key now.'
+        }), 202
+        
+    except HashingBusyError as e:
+        return e.to_response()
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/rotate-key', methods=['GET'])
+@require_auth
+def rotate_vault_key_status():
+    """Progress of the most recent key rotation."""
+    db = get_db()
+    
+    try:
+        job = db.query(VaultRekeyJob).filter_by(
+            user_id=g.user_id
+        ).order_by(VaultRekeyJob.id.desc()).first()
+        
+        if not job:
+            return jsonify({'status': 'none'}), 200
+        
+        return jsonify({
+            'job_id': job.id,
+            'status': job.status,
+            'entries_done': job.entries_done,
+            'from_key_id': job.from_key_id,
+            'to_key_id': job.to_key_id
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit('register', limit=30, window_minutes=60, cost=10)
 def register():
     try:
         data = request.get_json()
@@ -153,23 +280,29 @@ def register():
         if not master_password:
             return jsonify({'error': 'Master password required'}), 400
         
-        password_hash = ph.hash(master_password)
-        
         db = get_db()
         
-        # Check if user already exists
+        # Check if user already exists (before paying for Argon2 and PBKDF2)
         existing_user = db.query(User).first()
         if existing_user:
-            db.close()
             return jsonify({'error': 'User already exists'}), 400
         
+        password_hash = hashing_service.hash(master_password)
+        vault_key = PasswordEncryption.generate_vault_key()
+        wrapped_vault_key = PasswordEncryption(master_password).wrap_vault_key(vault_key)
+        
         # Create new user
-        new_user = User(master_password_hash=password_hash)
+        new_user = User(
+            master_password_hash=password_hash,
+            wrapped_vault_key=wrapped_vault_key
+        )
         db.add(new_user)
         db.commit()
-        db.close()
         
         return jsonify({'message': 'User registered successfully'}), 201
         
+    except HashingBusyError as e:
+        return e.to_response()
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,28 +1,38 @@
-from flask import Blueprint, request, jsonify, session
-from datetime import datetime
-from database_postgres import SessionLocal, PasswordEntry
-from crypto.encryption import PasswordEncryption
+from flask import Blueprint, Response, request, jsonify, session, g, stream_with_context
+from flask.sessions import SecureCookieSessionInterface
+from database_postgres import get_db, bump_vault_version, User, PasswordEntry, VaultRekeyJob
+from auth.session_store import session_store
+from api.vault_query import LISTING_FIELDS, ListingQuery, select_fields, serialize_rows
+from api.vault_search import search_entry_ids
+from api.vault_import import READERS, ImportFormatError, detect_format, import_entries
+from api.vault_export import EXPORT_MODES, export_chunks
+from api.vault_batch import apply_batch
+from utils.rate_limiter import rate_limit
+from config import Config
 from utils.password_generator import PasswordGenerator
+from datetime import datetime
 
 password_bp = Blueprint('passwords', __name__, url_prefix='/api/passwords')
 pwd_gen = PasswordGenerator()
 
 def check_session_expiry():
-    """Check if session is expired, return (is_valid, error_response)"""
-    if 'user_id' not in session:
+    """Resolve the session token to server-side state, return (is_valid, error_response)"""
+    token = session.get('token')
+    if not token:
         return False, ({'error': 'Not authenticated'}, 401)
     
-    if 'expires_at' in session:
-        expires_at = datetime.fromisoformat(session['expires_at'])
-        if datetime.utcnow() > expires_at:
-            session.clear()
-            return False, ({'error': 'Session expired. Please log in again.'}, 401)
+    state = session_store.load(token)
+    if state is None:
+        session.clear()
+        return False, ({'error': 'Session expired. Please log in again.'}, 401)
     
+    g.user_id = state.user_id
+    g.session_state = state
     return True, None
 
-def get_db():
-    """Get database session"""
-    return SessionLocal()
+def get_encryptor():
+    """Encryptor holding the session's unwrapped vault key (and retired keys mid-rotation)."""
+    return g.session_state.encryptor
 
 def require_auth(f):
     """Decorator to require authentication for routes."""
@@ -35,45 +45,169 @@ def require_auth(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def parse_fields():
+    """Parse ?fields=website,username,... into a list (None = full listing)."""
+    raw = request.args.get('fields')
+    if not raw:
+        return None
+
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in LISTING_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    if 'id' not in fields:
+        fields.insert(0, 'id')  # Needed to reveal/edit an entry later
+    return fields
+
+def vault_etag(user_id):
+    """
+    Strong ETag for anything rendered from the user's vault: user id plus
+    vault_version, which every entry write bumps in its own transaction.
+    Read before the entries, so a write racing the request can only leave
+    the response tagged older than its data (the next request refetches).
+    """
+    version = get_db().query(User.vault_version).filter_by(id=user_id).scalar()
+    return f'{user_id}-{version}'
+
+def not_modified(etag):
+    """304 response if the client's If-None-Match already has etag, else None."""
+    if request.if_none_match.contains_weak(etag):  # Weak compare, as RFC 9110 requires here
+        return with_etag(Response(status=304), etag)
+    return None
+
+def no_store(response):
+    """Mark a response carrying decrypted passwords as never cacheable."""
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def with_etag(response, etag):
+    """
+    Tag a metadata-only vault response (never one with passwords, see
+    no_store); private and always revalidated. No Vary: Cookie (see
+    VaultSessionInterface): the ETag already carries the user id.
+    """
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+class VaultSessionInterface(SecureCookieSessionInterface):
+    """
+    Flask's cookie sessions, without the Vary: Cookie Flask adds whenever the
+    session is read, on ETag-tagged vault responses. The permanent session
+    cookie is re-signed on nearly every request, so varying on it would make
+    every cached copy a miss.
+    """
+
+    def save_session(self, app, session, response):
+        untag_cookie = response.headers.get('ETag') is not None and 'Cookie' not in response.vary
+        super().save_session(app, session, response)
+        if untag_cookie:
+            # HeaderSet.discard misses 'Cookie' once another value (CORS adds
+            # Origin) is present, so rebuild the header without it
+            vary = [value for value in response.vary if value.lower() != 'cookie']
+            if vary:
+                response.headers['Vary'] = ', '.join(vary)
+            else:
+                response.headers.pop('Vary', None)
+
+def security_level_for(password):
+    """Map password strength to the entry's security level: (level, strength)."""
+    strength = pwd_gen.calculate_strength(password)
+
+    if strength['level'] == 'Strong':
+        return 'Calm', strength
+    elif strength['level'] == 'Medium':
+        return 'Alert', strength
+    return 'Critical', strength
+
 @password_bp.route('/', methods=['GET'])
 @require_auth
 def get_all_passwords():
-    """Get all passwords for logged-in user."""
+    """
+    Get all passwords for logged-in user.
+
+    ?fields=website,username,security_level returns only those columns and
+    skips decryption entirely (use /<id>/reveal to decrypt a single entry).
+
+    Filters, sort order and ?limit=/?cursor= pages are described in
+    api/vault_query.py; next_cursor is null on the last page.
+
+    Metadata-only (?fields= without password) responses carry the vault
+    ETag; a matching If-None-Match gets a 304 without reading any entry.
+    Responses with decrypted passwords are no-store and never tagged, so the
+    plaintext vault never lands in the browser's HTTP cache.
+    """
     try:
-        user_id = session['user_id']
-        master_password = session['master_password']
+        user_id = g.user_id
+
+        try:
+            fields = parse_fields()
+            listing = ListingQuery.from_args(request.args, Config.LISTING_MAX_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        fields = fields or LISTING_FIELDS
+        decrypts = 'password' in fields
+
+        etag = None if decrypts else vault_etag(user_id)
+        cached = not_modified(etag) if etag else None
+        if cached is not None:
+            return cached
+
+        statement = listing.apply(select_fields(fields).where(PasswordEntry.user_id == user_id))
+        rows, next_cursor = listing.page(get_db().execute(statement).all())
+
+        encryptor = get_encryptor() if decrypts else None
+        passwords = serialize_rows(fields, rows, encryptor)
+
+        response = jsonify({
+            'success': True,
+            'count': len(passwords),
+            'passwords': passwords,
+            'next_cursor': next_cursor
+        })
+        return (no_store(response) if decrypts else with_etag(response, etag)), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to retrieve passwords: {str(e)}'
+        }), 500
+
+@password_bp.route('/search', methods=['GET'])
+@require_auth
+def search_passwords():
+    """
+    Full-text search: ?q=git alice (prefix match on every word, best first).
+
+    Only the matched entries are decrypted. ?limit= defaults to 20.
+    """
+    try:
+        user_id = g.user_id
+
+        q = request.args.get('q', '')
+        try:
+            limit = int(request.args.get('limit', 20))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= Config.LISTING_MAX_PAGE_SIZE:
+            return jsonify({
+                'success': False,
+                'error': f'limit must be between 1 and {Config.LISTING_MAX_PAGE_SIZE}'
+            }), 400
 
         db = get_db()
-        entries = db.query(PasswordEntry).filter_by(user_id=user_id).all()
-
-        encryptor = PasswordEncryption(master_password)
-        passwords = []
-
-        for entry in entries:
-            try:
-                decrypted_password = encryptor.decrypt(entry.encrypted_password)
-
-                passwords.append({
-                    'id': entry.id,
-                    'website': entry.website,
-                    'username': entry.username,
-                    'password': decrypted_password,
-                    'security_level': entry.security_level,
-                    'notes': entry.notes,
-                    'created_at': entry.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                    'updated_at': entry.updated_at.strftime('%Y-%m-%d %H:%M:%S')
-                })
-            except Exception as e:
-                passwords.append({
-                    'id': entry.id,
-                    'website': entry.website,
-                    'username': entry.username,
-                    'password': '[Decryption failed]',
-                    'security_level': 'Critical',
-                    'error': str(e)
-                })
-
-        db.close()
+        ids = search_entry_ids(db, user_id, q, limit)
+
+        rows = db.execute(select_fields(LISTING_FIELDS).where(
+            PasswordEntry.user_id == user_id,
+            PasswordEntry.id.in_(ids)
+        )).all() if ids else []
+        rank = {entry_id: position for position, entry_id in enumerate(ids)}
+        rows.sort(key=lambda row: rank[row.id])
+
+        passwords = serialize_rows(LISTING_FIELDS, rows, get_encryptor())
 
         return jsonify({
             'success': True,
@@ -84,7 +218,7 @@ def get_all_passwords():
     except Exception as e:
         return jsonify({
             'success': False,
-            'error': f'Failed to retrieve passwords: {str(e)}'
+            'error': f'Failed to search passwords: {str(e)}'
         }), 500
 
 @password_bp.route('/', methods=['POST'])
@@ -92,8 +226,7 @@ def get_all_passwords():
 def add_password():
     """Add new password to vault."""
     try:
-        user_id = session['user_id']
-        master_password = session['master_password']
+        user_id = g.user_id
 
         data = request.get_json()
         website = data.get('website')
@@ -107,16 +240,9 @@ def add_password():
                 'error': 'Website, username, and password are required'
             }), 400
 
-        strength = pwd_gen.calculate_strength(password)
-
-        if strength['level'] == 'Strong':
-            security_level = 'Calm'
-        elif strength['level'] == 'Medium':
-            security_level = 'Alert'
-        else:
-            security_level = 'Critical'
+        security_level, strength = security_level_for(password)
 
-        encryptor = PasswordEncryption(master_password)
+        encryptor = get_encryptor()
         encrypted_password = encryptor.encrypt(password)
 
         db = get_db()
@@ -131,9 +257,9 @@ def add_password():
         )
 
         db.add(new_entry)
+        bump_vault_version(db.connection(), user_id)
         db.commit()
         password_id = new_entry.id
-        db.close()
 
         return jsonify({
             'success': True,
@@ -149,52 +275,220 @@ def add_password():
             'error': f'Failed to save password: {str(e)}'
         }), 500
 
+@password_bp.route('/import', methods=['POST'])
+@require_auth
+@rate_limit('import', limit=20, window_minutes=60, key=lambda: g.user_id)
+def import_passwords():
+    """
+    Bulk import a CSV / JSON / NDJSON export from another password manager.
+
+    Send the file as the raw request body (Content-Type text/csv,
+    application/json or application/x-ndjson) or as a multipart "file"
+    field; ?format= overrides detection. The body is read as a stream and
+    committed in batches (see api/vault_import.py). Rows that can't be
+    imported are listed with their line/item number at the end.
+    """
+    try:
+        user_id = g.user_id
+
+        upload = request.files.get('file')
+        try:
+            if upload is not None:
+                file_format = detect_format(request.args.get('format'), upload.mimetype, upload.filename)
+                stream = upload.stream
+            else:
+                file_format = detect_format(request.args.get('format'), request.mimetype)
+                stream = request.stream
+        except ImportFormatError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        summary = import_entries(
+            get_db(), user_id, READERS[file_format](stream), get_encryptor(), security_level_for,
+            batch_size=Config.IMPORT_BATCH_SIZE, max_rows=Config.IMPORT_MAX_ROWS
+        )
+
+        return jsonify({
+            'success': summary.error is None,
+            'format': file_format,
+            **summary.to_dict()
+        }), 200 if summary.error is None else 400
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to import passwords: {str(e)}'
+        }), 500
+
+@password_bp.route('/export', methods=['GET'])
+@require_auth
+@rate_limit('export', limit=10, window_minutes=60, key=lambda: g.user_id)
+def export_passwords():
+    """
+    Download the vault as NDJSON, streamed batch by batch.
+
+    ?mode=plain (default) decrypts every entry; ?mode=ciphertext skips
+    decryption and emits the stored blobs plus the wrapped vault key (see
+    api/vault_export.py).
+    """
+    try:
+        user_id = g.user_id
+
+        mode = request.args.get('mode', 'plain')
+        if mode not in EXPORT_MODES:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown mode: {mode} (expected {', '.join(EXPORT_MODES)})"
+            }), 400
+
+        if mode == 'ciphertext' and get_db().query(VaultRekeyJob.id).filter_by(
+                user_id=user_id, status='running').first():
+            # Some blobs are still under the retired key, which the header can't carry
+            return jsonify({
+                'success': False,
+                'error': 'A key rotation is in progress; try again when it completes'
+            }), 409
+
+        encryptor = get_encryptor() if mode == 'plain' else None
+        chunks = export_chunks(user_id, mode, encryptor, batch_size=Config.EXPORT_BATCH_SIZE)
+        filename = f"bino-vault-{mode}-{datetime.utcnow().strftime('%Y%m%d')}.ndjson"
+
+        return Response(stream_with_context(chunks), mimetype='application/x-ndjson', headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-store'
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to export passwords: {str(e)}'
+        }), 500
+
+@password_bp.route('/batch', methods=['POST'])
+@require_auth
+def batch_passwords():
+    """
+    Create, update and delete many entries in one request and one transaction.
+
+    Body: {"operations": [{"op": "delete", "id": 4}, ...], "atomic": false}
+    (format in api/vault_batch.py). Returns one result per operation, in
+    order; with atomic=true any failed operation rolls back the whole batch.
+    """
+    try:
+        user_id = g.user_id
+
+        data = request.get_json(silent=True) or {}
+        operations = data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            return jsonify({
+                'success': False,
+                'error': 'operations must be a non-empty list'
+            }), 400
+        if len(operations) > Config.BATCH_MAX_OPERATIONS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {Config.BATCH_MAX_OPERATIONS} operations per batch'
+            }), 400
+
+        results, committed = apply_batch(
+            get_db(), user_id, operations, get_encryptor(), security_level_for,
+            atomic=bool(data.get('atomic', False))
+        )
+        failed = sum(1 for result in results if result['status'] == 'error')
+
+        return jsonify({
+            'success': failed == 0,
+            'committed': committed,
+            'failed': failed,
+            'results': results
+        }), 200 if committed else 400
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to apply batch: {str(e)}'
+        }), 500
+
 @password_bp.route('/<int:password_id>', methods=['GET'])
 @require_auth
 def get_password(password_id):
-    """Get specific password by ID."""
+    """
+    Get specific password by ID.
+
+    ?fields= works as on the listing. Metadata-only responses carry the vault
+    ETag and answer a matching If-None-Match with 304; with the password
+    (the default) the response is no-store and untagged, like the listing.
+    """
+    try:
+        user_id = g.user_id
+
+        try:
+            fields = parse_fields() or LISTING_FIELDS
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        decrypts = 'password' in fields
+
+        etag = None if decrypts else vault_etag(user_id)
+        cached = not_modified(etag) if etag else None
+        if cached is not None:
+            return cached
+
+        db = get_db()
+        row = db.execute(select_fields(fields).where(
+            PasswordEntry.id == password_id,
+            PasswordEntry.user_id == user_id
+        )).first()
+
+        if not row:
+            return jsonify({
+                'success': False,
+                'error': 'Password not found'
+            }), 404
+
+        password_data = serialize_rows(fields, [row], get_encryptor() if decrypts else None)[0]
+
+        response = jsonify({
+            'success': True,
+            'password': password_data
+        })
+        return (no_store(response) if decrypts else with_etag(response, etag)), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to retrieve password: {str(e)}'
+        }), 500
+
+@password_bp.route('/<int:password_id>/reveal', methods=['POST'])
+@require_auth
+def reveal_password(password_id):
+    """Decrypt a single password on demand (pairs with the ?fields= listing)."""
     try:
-        user_id = session['user_id']
-        master_password = session['master_password']
+        user_id = g.user_id
 
         db = get_db()
-        entry = db.query(PasswordEntry).filter_by(
+        entry = db.query(PasswordEntry.encrypted_password).filter_by(
             id=password_id,
             user_id=user_id
         ).first()
 
         if not entry:
-            db.close()
             return jsonify({
                 'success': False,
                 'error': 'Password not found'
             }), 404
 
-        encryptor = PasswordEncryption(master_password)
-        decrypted_password = encryptor.decrypt(entry.encrypted_password)
-
-        password_data = {
-            'id': entry.id,
-            'website': entry.website,
-            'username': entry.username,
-            'password': decrypted_password,
-            'security_level': entry.security_level,
-            'notes': entry.notes,
-            'created_at': entry.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated_at': entry.updated_at.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        decrypted_password = get_encryptor().decrypt(entry.encrypted_password)
 
-        db.close()
-
-        return jsonify({
+        return no_store(jsonify({
             'success': True,
-            'password': password_data
-        }), 200
+            'id': password_id,
+            'password': decrypted_password
+        })), 200
 
     except Exception as e:
         return jsonify({
             'success': False,
-            'error': f'Failed to retrieve password: {str(e)}'
+            'error': f'Failed to reveal password: {str(e)}'
         }), 500
 
 @password_bp.route('/<int:password_id>', methods=['PUT'])
@@ -202,8 +496,7 @@ def get_password(password_id):
 def update_password(password_id):
     """Update existing password."""
     try:
-        user_id = session['user_id']
-        master_password = session['master_password']
+        user_id = g.user_id
 
         data = request.get_json()
 
@@ -214,7 +507,6 @@ def update_password(password_id):
         ).first()
 
         if not entry:
-            db.close()
             return jsonify({
                 'success': False,
                 'error': 'Password not found'
@@ -228,23 +520,16 @@ def update_password(password_id):
 
         if 'password' in data:
             new_password = data['password']
-            strength = pwd_gen.calculate_strength(new_password)
-
-            if strength['level'] == 'Strong':
-                entry.security_level = 'Calm'
-            elif strength['level'] == 'Medium':
-                entry.security_level = 'Alert'
-            else:
-                entry.security_level = 'Critical'
+            entry.security_level, _ = security_level_for(new_password)
 
-            encryptor = PasswordEncryption(master_password)
+            encryptor = get_encryptor()
             entry.encrypted_password = encryptor.encrypt(new_password)
 
         if 'notes' in data:
-            entry.notes = data['notes']
+            entry.notes = data['notes'] or ''
 
+        bump_vault_version(db.connection(), user_id)
         db.commit()
-        db.close()
 
         return jsonify({
             'success': True,
@@ -262,7 +547,7 @@ def update_password(password_id):
 def delete_password(password_id):
     """Delete password from vault."""
     try:
-        user_id = session['user_id']
+        user_id = g.user_id
 
         db = get_db()
         entry = db.query(PasswordEntry).filter_by(
@@ -271,15 +556,14 @@ def delete_password(password_id):
         ).first()
 
         if not entry:
-            db.close()
             return jsonify({
                 'success': False,
                 'error': 'Password not found'
             }), 404
 
         db.delete(entry)
+        bump_vault_version(db.connection(), user_id)
         db.commit()
-        db.close()
 
         return jsonify({
             'success': True,
@@ -1,16 +1,16 @@
-from flask import Blueprint, request, jsonify, session
-from argon2 import PasswordHasher
+from flask import Blueprint, request, jsonify, g
 from argon2.exceptions import VerifyMismatchError
+from auth.hashing_service import hashing_service, HashingBusyError
+from auth.session_store import session_store
 import secrets
 import string
-from database_postgres import SessionLocal, User, Session as DBSession
+from database_postgres import get_db, bump_vault_version, User, PasswordEntry, VaultRekeyJob, SECURITY_LEVEL_LOST
+from crypto.encryption import PasswordEncryption
+from crypto.key_cache import derived_key_cache
+from api.password_routes import require_auth, get_encryptor
+from utils.rate_limiter import rate_limit
 
 recovery_bp = Blueprint('recovery', __name__)
-ph = PasswordHasher()
-
-def get_db():
-    """Get database session"""
-    return SessionLocal()
 
 def generate_recovery_key():
     """Generate 24-character alphanumeric recovery key"""
@@ -18,13 +18,16 @@ def generate_recovery_key():
     return ''.join(secrets.choice(chars) for _ in range(24))
 
 @recovery_bp.route('/generate', methods=['POST'])
+@require_auth
+@rate_limit('recovery-generate', limit=50, key=lambda: g.user_id, cost=10)
 def create_recovery_key():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Not authenticated'}), 401
-    
-    user_id = session['user_id']
+    user_id = g.user_id
     recovery_key = generate_recovery_key()
-    recovery_key_hash = ph.hash(recovery_key)
+    
+    try:
+        recovery_key_hash = hashing_service.hash(recovery_key)
+    except HashingBusyError as e:
+        return e.to_response()
     
     db = get_db()
     
@@ -32,12 +35,24 @@ def create_recovery_key():
         user = db.query(User).filter_by(id=user_id).first()
         
         if not user:
-            db.close()
             return jsonify({'error': 'User not found'}), 404
         
         user.recovery_key_hash = recovery_key_hash
+        
+        # Also wrap the vault key under the recovery key so a reset keeps the vault readable
+        encryptor = get_encryptor()
+        recovery_wrapper = PasswordEncryption(recovery_key)
+        if encryptor.vault_key:
+            user.recovery_wrapped_vault_key = recovery_wrapper.wrap_vault_key(encryptor.vault_key)
+        else:
+            user.recovery_wrapped_vault_key = None
+        
+        # ...and a running rotation's retired key, which this session still holds
+        job = db.query(VaultRekeyJob).filter_by(user_id=user.id, status='running').first()
+        if job:
+            old_key = encryptor.keyring.get(job.from_key_id)
+            job.recovery_wrapped_old_key = recovery_wrapper.wrap_vault_key(old_key) if old_key else None
         db.commit()
-        db.close()
         
         return jsonify({
             'success': True,
@@ -46,10 +61,11 @@ def create_recovery_key():
         }), 200
         
     except Exception as e:
-        db.close()
         return jsonify({'error': str(e)}), 500
 
+# Recovery routes share one budget per IP: 5 verifies, or 2 resets (verify + hash)
 @recovery_bp.route('/verify', methods=['POST'])
+@rate_limit('recovery', limit=50, cost=10)
 def verify_recovery_key():
     data = request.json
     recovery_key = data.get('recovery_key', '').strip()
@@ -63,22 +79,22 @@ def verify_recovery_key():
         user = db.query(User).filter(User.recovery_key_hash.isnot(None)).first()
         
         if not user:
-            db.close()
             return jsonify({'valid': False}), 400
         
         try:
-            ph.verify(user.recovery_key_hash, recovery_key)
-            db.close()
+            hashing_service.verify(user.recovery_key_hash, recovery_key)
             return jsonify({'valid': True, 'user_id': user.id}), 200
         except VerifyMismatchError:
-            db.close()
             return jsonify({'valid': False}), 400
             
+    except HashingBusyError as e:
+        return e.to_response()
+        
     except Exception as e:
-        db.close()
         return jsonify({'valid': False, 'error': str(e)}), 500
 
 @recovery_bp.route('/reset-password', methods=['POST'])
+@rate_limit('recovery', limit=50, cost=20)
 def reset_password():
     data = request.json
     recovery_key = data.get('recovery_key', '').strip()
@@ -93,27 +109,72 @@ def reset_password():
         user = db.query(User).filter(User.recovery_key_hash.isnot(None)).first()
         
         if not user:
-            db.close()
             return jsonify({'error': 'No recovery key set'}), 400
         
         try:
-            ph.verify(user.recovery_key_hash, recovery_key)
+            hashing_service.verify(user.recovery_key_hash, recovery_key)
         except VerifyMismatchError:
-            db.close()
             return jsonify({'error': 'Invalid recovery key'}), 401
         
+        # Refuse a reset that would leave entries unreadable: the recovery key
+        # must unlock the current vault key and, mid-rotation, the retired one.
+        # (A key from before recovery wraps existed is handled below.)
+        job = db.query(VaultRekeyJob).filter_by(user_id=user.id, status='running').first()
+        rotated = (user.vault_key_id or 1) > 1
+        if user.wrapped_vault_key and not user.recovery_wrapped_vault_key and rotated:
+            return jsonify({
+                'error': 'This recovery key predates a key rotation and cannot unlock the vault. '
+                         'Log in and generate a new recovery key.'
+            }), 409
+        if job and not job.recovery_wrapped_old_key:
+            return jsonify({
+                'error': 'A key rotation is in progress that this recovery key cannot unlock. '
+                         'Log in to let it finish, then try again.'
+            }), 409
+        
         # Update master password hash
-        new_password_hash = ph.hash(new_password)
+        new_password_hash = hashing_service.hash(new_password)
         user.master_password_hash = new_password_hash
         
+        # Re-wrap the vault key (and a running rotation's retired key) under the
+        # new password; entries stay as they are. Accounts that never had a
+        # vault key get a fresh one on next login.
+        recovery_wrapper = PasswordEncryption(recovery_key)
+        new_wrapper = PasswordEncryption(new_password)
+        warning = None
+        if user.recovery_wrapped_vault_key:
+            vault_key = recovery_wrapper.unwrap_vault_key(user.recovery_wrapped_vault_key)
+            user.wrapped_vault_key = new_wrapper.wrap_vault_key(vault_key)
+        elif user.wrapped_vault_key:
+            # Recovery key generated before vault keys were wrapped under it:
+            # only the forgotten password opens the vault, so start a new one
+            # under a new key id and mark every existing entry as lost
+            user.wrapped_vault_key = None
+            user.vault_key_id = (user.vault_key_id or 1) + 1
+            db.query(PasswordEntry).filter_by(user_id=user.id).update(
+                {PasswordEntry.security_level: SECURITY_LEVEL_LOST}, synchronize_session=False
+            )
+            bump_vault_version(db.connection(), user.id)
+            warning = ('This recovery key was created before it could unlock the vault. '
+                       'Your password was reset, but existing entries cannot be decrypted.')
+        if job:
+            old_key = recovery_wrapper.unwrap_vault_key(job.recovery_wrapped_old_key)
+            job.wrapped_old_key = new_wrapper.wrap_vault_key(old_key)
+        
         # Clear all sessions for this user
-        db.query(DBSession).filter_by(user_id=user.id).delete()
+        session_store.revoke_user(db, user.id)
         
         db.commit()
-        db.close()
+        derived_key_cache.purge(user.id)
+        
+        body = {'success': True, 'message': 'Password reset successful'}
+        if warning:
+            body['vault_recovered'] = False
+            body['warning'] = warning
+        return jsonify(body), 200
         
-        return jsonify({'success': True, 'message': 'Password reset successful'}), 200
+    except HashingBusyError as e:
+        return e.to_response()
         
     except Exception as e:
-        db.close()
         return jsonify({'error': str(e)}), 500
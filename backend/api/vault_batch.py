@@ -0,0 +1,164 @@
+"""
+Apply a list of create/update/delete operations in one transaction.
+
+    {"operations": [
+        {"op": "create", "website": "...", "username": "...", "password": "...", "notes": "..."},
+        {"op": "update", "id": 12, "notes": "rotated"},
+        {"op": "delete", "id": 40}
+     ],
+     "atomic": false}
+
+Operations are validated first, then grouped so each kind costs a
+constant number of statements however many there are:
+- deletes: one DELETE ... WHERE user_id = ? AND id IN (...)
+- updates: targets loaded with one SELECT ... IN; the flush sends one
+  executemany UPDATE per set of changed columns
+- creates: one flush (batched INSERT ... RETURNING on PostgreSQL; SQLite
+  can't order batched RETURNING, so there it is one in-process INSERT per row)
+followed by the vault_version bump and a single commit, so the whole batch
+costs one fsync. An id may appear in only one operation.
+
+Each operation gets a result in input order. Failed operations are skipped
+and the rest committed, unless atomic is true, in which case any failure
+rolls back the whole batch.
+"""
+from sqlalchemy import delete, select
+from database_postgres import PasswordEntry, bump_vault_version, unindex_entries
+from api.vault_import import MAX_LENGTHS
+
+OPERATIONS = ('create', 'update', 'delete')
+EDITABLE_FIELDS = ('website', 'username', 'password', 'notes')
+
+
+def _check_fields(operation: dict, required: tuple):
+    """
+    Raises:
+        ValueError: Missing required field or bad value
+    """
+    for field in required:
+        if not operation.get(field):
+            raise ValueError(f'{field} is required')
+    for field in EDITABLE_FIELDS:
+        if field not in operation:
+            continue
+        value = operation[field]
+        if field == 'notes':
+            if value is not None and not isinstance(value, str):
+                raise ValueError('notes must be a string')
+        elif not isinstance(value, str) or not value:
+            raise ValueError(f'{field} must be a non-empty string')
+        if field in MAX_LENGTHS and value and len(value) > MAX_LENGTHS[field]:
+            raise ValueError(f'{field} longer than {MAX_LENGTHS[field]} characters')
+
+
+def _entry_id(operation: dict) -> int:
+    entry_id = operation.get('id')
+    if not isinstance(entry_id, int) or isinstance(entry_id, bool):
+        raise ValueError('id must be an integer')
+    return entry_id
+
+
+def apply_batch(db, user_id: int, operations: list, encryptor, security_level_for, atomic: bool = False):
+    """
+    Returns:
+        (results in input order, committed) where each result is
+        {'index', 'op', 'id', 'status': 'ok' | 'error'[, 'error']}
+    """
+    results = [{'index': index, 'op': None, 'id': None, 'status': 'ok'} for index in range(len(operations))]
+    creates, updates, deletes = [], {}, {}
+    seen_ids = set()
+
+    def fail(index, message):
+        results[index]['status'] = 'error'
+        results[index]['error'] = message
+
+    # 1. Validate and group (no database access yet)
+    for index, operation in enumerate(operations):
+        try:
+            if not isinstance(operation, dict):
+                raise ValueError('Operation must be an object')
+            op = operation.get('op')
+            if op not in OPERATIONS:
+                raise ValueError(f"op must be one of {', '.join(OPERATIONS)}")
+            results[index]['op'] = op
+
+            if op == 'create':
+                _check_fields(operation, required=('website', 'username', 'password'))
+                creates.append((index, operation))
+                continue
+
+            entry_id = _entry_id(operation)
+            results[index]['id'] = entry_id
+            if entry_id in seen_ids:
+                raise ValueError('id appears in more than one operation')
+            seen_ids.add(entry_id)
+
+            if op == 'update':
+                _check_fields(operation, required=())
+                if not any(field in operation for field in EDITABLE_FIELDS):
+                    raise ValueError('Nothing to update')
+                updates[entry_id] = (index, operation)
+            else:
+                deletes[entry_id] = index
+        except ValueError as e:
+            fail(index, str(e))
+
+    # 2. Resolve ids: one query for every update/delete target, scoped to the user
+    owned = {}
+    if seen_ids:
+        owned = {entry.id: entry for entry in db.scalars(
+            select(PasswordEntry).where(PasswordEntry.user_id == user_id, PasswordEntry.id.in_(seen_ids))
+        )}
+    for entry_id, index in deletes.items():
+        if entry_id not in owned:
+            fail(index, 'Password not found')
+    for entry_id, (index, _) in updates.items():
+        if entry_id not in owned:
+            fail(index, 'Password not found')
+
+    if atomic and any(result['status'] == 'error' for result in results):
+        return results, False
+
+    # 3. Apply set-wise, then commit once
+    delete_ids = [entry_id for entry_id in deletes if entry_id in owned]
+    if delete_ids:
+        for entry_id in delete_ids:
+            db.expunge(owned[entry_id])  # Deleted below in SQL, not through the session
+        db.execute(delete(PasswordEntry).where(
+            PasswordEntry.user_id == user_id, PasswordEntry.id.in_(delete_ids)
+        ).execution_options(synchronize_session=False))
+        unindex_entries(db.connection(), delete_ids)
+
+    for entry_id, (index, operation) in updates.items():
+        entry = owned.get(entry_id)
+        if entry is None:
+            continue
+        for field in ('website', 'username'):
+            if field in operation:
+                setattr(entry, field, operation[field])
+        if 'notes' in operation:
+            entry.notes = operation['notes'] or ''  # null clears, as on create
+        if 'password' in operation:
+            entry.security_level, _ = security_level_for(operation['password'])
+            entry.encrypted_password = encryptor.encrypt(operation['password'])
+
+    new_entries = []
+    for index, operation in creates:
+        entry = PasswordEntry(
+            user_id=user_id,
+            website=operation['website'],
+            username=operation['username'],
+            encrypted_password=encryptor.encrypt(operation['password']),
+            security_level=security_level_for(operation['password'])[0],
+            notes=operation.get('notes') or ''
+        )
+        new_entries.append((index, entry))
+    db.add_all(entry for _, entry in new_entries)
+
+    db.flush()
+    for index, entry in new_entries:
+        results[index]['id'] = entry.id
+    if any(result['status'] == 'ok' for result in results):
+        bump_vault_version(db.connection(), user_id)
+    db.commit()
+    return results, True
@@ -0,0 +1,105 @@
+"""
+Constant-memory NDJSON export of a user's vault.
+
+Modes:
+- plain: one decrypted entry per line (website, username, password,
+  notes, ...); re-importable with POST /api/passwords/import?format=ndjson.
+  An entry that fails to decrypt is written with password null and its
+  error, and import rejects that row rather than storing a placeholder.
+- ciphertext: no decryption at all. The first line is a header with the
+  user's wrapped vault key (sealed under the master password), then one
+  line per entry with the stored blob base64-encoded. Restoring needs the
+  master password, so the file is safe to keep as an offline backup.
+
+Rows are read through yield_per (a server-side cursor on PostgreSQL) and
+decrypted/serialized one batch at a time, so memory does not grow with the
+vault. The generator opens and closes its own DB session because it runs
+after the view function has returned.
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import select
+from database_postgres import SessionLocal, User, PasswordEntry
+from api.vault_query import format_timestamp
+
+EXPORT_MODES = ('plain', 'ciphertext')
+EXPORT_FORMAT_VERSION = 1
+
+EXPORT_COLUMNS = (
+    PasswordEntry.id, PasswordEntry.website, PasswordEntry.username,
+    PasswordEntry.encrypted_password, PasswordEntry.security_level,
+    PasswordEntry.notes, PasswordEntry.created_at, PasswordEntry.updated_at
+)
+
+
+def _b64(data) -> str:
+    if isinstance(data, str):
+        data = data.encode('utf-8')  # Legacy text ciphertexts
+    return base64.b64encode(bytes(data)).decode('ascii')
+
+
+def _metadata(row) -> dict:
+    return {
+        'id': row.id,
+        'website': row.website,
+        'username': row.username,
+        'security_level': row.security_level,
+        'notes': row.notes,
+        'created_at': format_timestamp(row.created_at),
+        'updated_at': format_timestamp(row.updated_at)
+    }
+
+
+def _plain_lines(rows, encryptor) -> list:
+    results = encryptor.decrypt_many(row.encrypted_password for row in rows)
+    lines = []
+    for row, (password, error) in zip(rows, results):
+        item = _metadata(row)
+        if error is None:
+            item['password'] = password
+        else:
+            item.update(password=None, error=error)
+        lines.append(json.dumps(item))
+    return lines
+
+
+def _ciphertext_lines(rows) -> list:
+    return [json.dumps({**_metadata(row), 'encrypted_password': _b64(row.encrypted_password)})
+            for row in rows]
+
+
+def _header(db, user_id: int) -> str:
+    user = db.get(User, user_id)
+    return json.dumps({
+        'bino_vault_export': EXPORT_FORMAT_VERSION,
+        'mode': 'ciphertext',
+        'exported_at': format_timestamp(datetime.utcnow()),
+        'vault_key_id': user.vault_key_id,
+        'wrapped_vault_key': _b64(user.wrapped_vault_key) if user.wrapped_vault_key else None
+    })
+
+
+def export_chunks(user_id: int, mode: str, encryptor=None, batch_size: int = 500):
+    """
+    Yield the export as NDJSON text, one chunk per batch of batch_size entries.
+
+    Args:
+        mode: 'plain' (needs encryptor) or 'ciphertext'
+    """
+    db = SessionLocal()
+    try:
+        if mode == 'ciphertext':
+            yield _header(db, user_id) + '\n'
+
+        statement = (
+            select(*EXPORT_COLUMNS)
+            .where(PasswordEntry.user_id == user_id)
+            .order_by(PasswordEntry.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for rows in db.execute(statement).partitions():
+            lines = _plain_lines(rows, encryptor) if mode == 'plain' else _ciphertext_lines(rows)
+            yield '\n'.join(lines) + '\n'
+    finally:
+        db.close()
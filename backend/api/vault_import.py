@@ -0,0 +1,344 @@
+"""
+Streaming import of CSV / JSON exports from other password managers.
+
+Formats:
+- csv: Chrome/Edge, Firefox, Bitwarden, LastPass, 1Password, KeePass
+  (columns are matched by name, see FIELD_ALIASES)
+- json: a list of entries, or Bitwarden's {"folders": [...], "items": [...]}
+- ndjson: one entry object per line (BinO-Vault's own export)
+
+The upload is parsed incrementally: rows are read from the request stream,
+scored, encrypted and inserted batch by batch (one executemany INSERT and
+one commit per batch), so memory stays flat however large the export is.
+"""
+import csv
+import io
+import json
+import re
+from sqlalchemy import insert
+from database_postgres import PasswordEntry, bump_vault_version, index_entries
+
+# Our field <- column names used by the common managers (lowercased)
+FIELD_ALIASES = {
+    'website': ('website', 'url', 'login_uri', 'web site', 'uri', 'hostname', 'origin'),
+    'username': ('username', 'login_username', 'login name', 'login', 'user', 'email'),
+    'password': ('password', 'login_password'),
+    'notes': ('notes', 'note', 'extra', 'comments', 'comment'),
+    'title': ('name', 'title', 'account')  # Website fallback when there is no URL
+}
+MAX_LENGTHS = {'website': 255, 'username': 255, 'notes': 1000}
+MAX_REPORTED_ERRORS = 100
+JSON_CHUNK_SIZE = 64 * 1024
+
+BITWARDEN_LOGIN_TYPE = 1
+FORMATS = ('csv', 'json', 'ndjson')
+FORMAT_BY_MIMETYPE = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson'
+}
+
+
+class ImportFormatError(ValueError):
+    """The file itself is unreadable (as opposed to one bad row)."""
+
+
+def detect_format(requested: str, mimetype: str, filename: str = None) -> str:
+    """
+    ?format= wins, then the upload's content type, then its file extension.
+
+    Raises:
+        ImportFormatError: Unknown or undetectable format
+    """
+    if requested:
+        if requested not in FORMATS:
+            raise ImportFormatError(f"Unknown format: {requested} (expected {', '.join(FORMATS)})")
+        return requested
+    if mimetype in FORMAT_BY_MIMETYPE:
+        return FORMAT_BY_MIMETYPE[mimetype]
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension in FORMATS:
+        return extension
+    raise ImportFormatError('Cannot tell the file format; pass ?format=csv, json or ndjson')
+
+
+def _text(stream):
+    """Decode a binary stream as UTF-8 (a leading BOM, as Excel writes it, is dropped)."""
+    if not isinstance(stream, io.BufferedIOBase):
+        stream = io.BufferedReader(stream)
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+def iter_csv(stream):
+    """Yield (line number, {lowercased column: value}) per CSV record."""
+    reader = csv.reader(_text(stream))
+    try:
+        header = [name.strip().lower() for name in next(reader)]
+    except StopIteration:
+        return
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ImportFormatError(f'Unreadable CSV header: {e}')
+
+    while True:
+        try:
+            values = next(reader)
+        except StopIteration:
+            return
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ImportFormatError(f'Unreadable CSV near line {reader.line_num}: {e}')
+        if any(value.strip() for value in values):
+            yield reader.line_num, dict(zip(header, values))
+
+
+def iter_ndjson(stream):
+    """Yield (line number, object) per non-blank line."""
+    for line_number, line in enumerate(_text(stream), start=1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                raise ImportFormatError(f'Invalid JSON on line {line_number}: {e}')
+
+
+class _JsonItemReader:
+    """
+    Pull the elements of a JSON array out of a text stream one at a time.
+
+    The standard library has no streaming JSON parser; this decodes each
+    element with JSONDecoder.raw_decode from a rolling buffer, reading more
+    only when an element is cut off, so the whole document is never in
+    memory. Accepts a top-level array or an object whose "items" key holds
+    the array (other keys, like Bitwarden's folders, are decoded and dropped).
+    """
+    _WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, text_stream):
+        self.stream = text_stream
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.stream.read(JSON_CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def _peek(self) -> str:
+        while True:
+            self.pos = self._WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._fill()
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ImportFormatError(f"Malformed JSON: expected '{char}'")
+        self.pos += 1
+
+    def _decode(self):
+        self._peek()  # raw_decode doesn't skip leading whitespace
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError as e:
+                if self.eof:
+                    raise ImportFormatError(f'Malformed JSON: {e}')
+                self._fill()
+                continue
+            if end == len(self.buffer) and not self.eof:
+                self._fill()  # A number at the buffer edge may continue in the next chunk
+                continue
+            self.pos = end
+            return value
+
+    def _array(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._decode()
+            separator = self._peek()
+            self.pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ImportFormatError("Malformed JSON: expected ',' or ']'")
+
+    def items(self):
+        first = self._peek()
+        if first == '[':
+            yield from self._array()
+            return
+        if first != '{':
+            raise ImportFormatError('Expected a JSON array or an object with "items"')
+
+        self.pos += 1
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._decode()
+            self._expect(':')
+            if key == 'items' and self._peek() == '[':
+                yield from self._array()
+            else:
+                self._decode()
+            separator = self._peek()
+            self.pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ImportFormatError("Malformed JSON: expected ',' or '}'")
+
+
+def iter_json(stream):
+    """Yield (item number, object) per element of the entries array."""
+    for number, item in enumerate(_JsonItemReader(_text(stream)).items(), start=1):
+        yield number, item
+
+
+READERS = {'csv': iter_csv, 'json': iter_json, 'ndjson': iter_ndjson}
+
+
+def _pick(record: dict, field: str) -> str:
+    for alias in FIELD_ALIASES[field]:
+        value = record.get(alias)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+    return ''
+
+
+def normalize(record) -> dict:
+    """
+    Map one exported record onto website/username/password/notes.
+
+    Raises:
+        ValueError: Row can't be imported (reported per row)
+    """
+    if not isinstance(record, dict):
+        raise ValueError('Entry is not an object')
+
+    if isinstance(record.get('type'), int):  # Bitwarden JSON item (login, note, card, identity)
+        if record['type'] != BITWARDEN_LOGIN_TYPE or not isinstance(record.get('login'), dict):
+            raise ValueError('Not a login item')
+        login = record['login']
+        uris = login.get('uris') or []
+        record = {
+            'name': record.get('name') or '',
+            'notes': record.get('notes') or '',
+            'username': login.get('username') or '',
+            'password': login.get('password') or '',
+            'url': (uris[0].get('uri') or '') if uris and isinstance(uris[0], dict) else ''
+        }
+    else:
+        record = {str(key).strip().lower(): value for key, value in record.items()}
+
+    entry = {
+        'website': _pick(record, 'website') or _pick(record, 'title'),
+        'username': _pick(record, 'username'),
+        'password': record.get('password') or record.get('login_password') or '',
+        'notes': _pick(record, 'notes')
+    }
+    if not isinstance(entry['password'], str) or not entry['password']:
+        if record.get('error'):  # Plain export line for an entry that didn't decrypt
+            raise ValueError(f"Password was not exported: {record['error']}")
+        raise ValueError('Missing password')
+    if not entry['website']:
+        raise ValueError('Missing website')
+    if not entry['username']:
+        entry['username'] = '-'  # Password-only logins (e.g. PIN pads) still import
+    for field, limit in MAX_LENGTHS.items():
+        if len(entry[field]) > limit:
+            raise ValueError(f'{field} longer than {limit} characters')
+    return entry
+
+
+class ImportSummary:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.error = None  # File-level problem that stopped the import
+
+    def row_failed(self, row: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'error': error})
+
+    def to_dict(self) -> dict:
+        return {
+            'error': self.error,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+def _insert_batch(db, user_id: int, batch: list, encryptor, security_level_for, summary: ImportSummary):
+    rows = []
+    for entry in batch:
+        rows.append({
+            'user_id': user_id,
+            'website': entry['website'],
+            'username': entry['username'],
+            'encrypted_password': encryptor.encrypt(entry['password']),
+            'security_level': security_level_for(entry['password'])[0],
+            'notes': entry['notes']
+        })
+
+    ids = db.scalars(
+        insert(PasswordEntry).returning(PasswordEntry.id, sort_by_parameter_order=True),
+        rows
+    ).all()
+    index_entries(db.connection(), [{**row, 'id': entry_id} for row, entry_id in zip(rows, ids)])
+    bump_vault_version(db.connection(), user_id)
+    db.commit()
+    summary.imported += len(rows)
+
+
+def import_entries(db, user_id: int, records, encryptor, security_level_for,
+                   batch_size: int, max_rows: int) -> ImportSummary:
+    """
+    Import (row number, record) pairs, committing every batch_size entries.
+
+    Args:
+        records: Iterator from one of READERS
+        encryptor: Session encryptor (vault key)
+        security_level_for: password -> (security_level, strength)
+        max_rows: Rows past this are not read
+
+    Returns:
+        ImportSummary. If the file turns out to be malformed part-way, the
+        rows before that point are kept and summary.error says where it stopped.
+    """
+    summary = ImportSummary()
+    batch = []
+    rows_read = 0
+
+    try:
+        for row, record in records:
+            rows_read += 1
+            if rows_read > max_rows:
+                summary.row_failed(row, f'Import limited to {max_rows} rows; the rest was not read')
+                break
+            try:
+                batch.append(normalize(record))
+            except ValueError as e:
+                summary.row_failed(row, str(e))
+                continue
+
+            if len(batch) >= batch_size:
+                _insert_batch(db, user_id, batch, encryptor, security_level_for, summary)
+                batch = []
+    except ImportFormatError as e:
+        summary.error = str(e)
+
+    if batch:
+        _insert_batch(db, user_id, batch, encryptor, security_level_for, summary)
+    return summary
@@ -0,0 +1,220 @@
+"""
+Server-side filtering, sorting and keyset pagination for the vault listing.
+
+Query string:
+    sort=-updated_at       updated_at | created_at | website | username,
+                           '-' prefix for descending (default -updated_at)
+    website=git            case-insensitive prefix
+    username=alice         case-insensitive prefix
+    security_level=Alert   Calm | Alert | Critical | Lost
+    limit=50               page size; with cursor, turns on pagination
+    cursor=...             next_cursor from the previous page
+
+Reads go through Core select() over just the listed columns: rows come back
+as plain tuples (no ORM identity map or relationship setup) and
+serialize_rows turns them into dicts directly.
+
+Pages are keyset (seek) pages: the cursor carries the last row's
+(sort value, id) and the next page starts strictly after it, so every
+page is an index range scan no matter how deep the client has paged,
+and rows added or deleted meanwhile never shift a page.
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, func, select, tuple_
+from database_postgres import PasswordEntry, SECURITY_LEVEL_LOST as LOST
+
+LISTING_FIELDS = ('id', 'website', 'username', 'password', 'security_level',
+                  'notes', 'created_at', 'updated_at')
+TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+
+SORT_KEYS = {
+    'updated_at': PasswordEntry.updated_at,
+    'created_at': PasswordEntry.created_at,
+    'website': func.lower(PasswordEntry.website),  # Matches the expression indexes
+    'username': func.lower(PasswordEntry.username)
+}
+TIMESTAMP_SORT_KEYS = ('updated_at', 'created_at')
+SECURITY_LEVELS = ('Calm', 'Alert', 'Critical', LOST)
+DEFAULT_SORT = '-updated_at'
+
+
+def _prefix_filter(column, prefix: str):
+    """
+    Case-insensitive "starts with" as a range on lower(column), which the
+    expression index can seek; the LIKE keeps the result exact under any
+    collation.
+    """
+    lowered = func.lower(column)
+    prefix = prefix.lower()
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return and_(
+        lowered >= prefix,
+        lowered < prefix + '\U0010ffff',
+        lowered.like(escaped + '%', escape='\\')
+    )
+
+
+class ListingQuery:
+    """Parsed listing parameters; apply() to a query, then page() its rows."""
+
+    def __init__(self, sort: str = DEFAULT_SORT, website: str = None, username: str = None,
+                 security_level: str = None, limit: int = None, cursor: str = None):
+        """
+        Raises:
+            ValueError: Unknown sort key or security level, bad cursor
+        """
+        self.descending = sort.startswith('-')
+        self.sort_key = sort.lstrip('-')
+        if self.sort_key not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {self.sort_key}")
+        if security_level is not None and security_level not in SECURITY_LEVELS:
+            raise ValueError(f"Unknown security level: {security_level}")
+
+        self.sort = sort
+        self.website = website
+        self.username = username
+        self.security_level = security_level
+        self.limit = limit
+        self.after = self._decode_cursor(cursor) if cursor else None
+
+    @classmethod
+    def from_args(cls, args, max_limit: int):
+        """
+        Build from request.args. A cursor without a limit uses max_limit.
+
+        Raises:
+            ValueError: Invalid parameter (reported to the client as a 400)
+        """
+        limit = args.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise ValueError('limit must be an integer')
+            if not 1 <= limit <= max_limit:
+                raise ValueError(f'limit must be between 1 and {max_limit}')
+        elif args.get('cursor'):
+            limit = max_limit
+
+        return cls(
+            sort=args.get('sort') or DEFAULT_SORT,
+            website=args.get('website') or None,
+            username=args.get('username') or None,
+            security_level=args.get('security_level') or None,
+            limit=limit,
+            cursor=args.get('cursor') or None
+        )
+
+    @property
+    def paginated(self) -> bool:
+        return self.limit is not None
+
+    def _decode_cursor(self, cursor: str):
+        try:
+            sort, value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if self.sort_key in TIMESTAMP_SORT_KEYS:
+                value = datetime.fromisoformat(value)
+            last_id = int(last_id)
+        except Exception:
+            raise ValueError('Invalid cursor')
+        if sort != self.sort:
+            raise ValueError('Cursor belongs to a different sort order')
+        return value, last_id
+
+    def _encode_cursor(self, value, last_id: int) -> str:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        raw = json.dumps([self.sort, value, last_id]).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def apply(self, query):
+        """
+        Add filters, keyset condition, ordering and limit to a query on
+        PasswordEntry (already filtered by user). Appends the sort value and
+        id as two trailing columns for page() to build the next cursor from.
+        """
+        sort_column = SORT_KEYS[self.sort_key]
+
+        if self.website:
+            query = query.filter(_prefix_filter(PasswordEntry.website, self.website))
+        if self.username:
+            query = query.filter(_prefix_filter(PasswordEntry.username, self.username))
+        if self.security_level:
+            query = query.filter(PasswordEntry.security_level == self.security_level)
+
+        if self.after is not None:
+            position = tuple_(sort_column, PasswordEntry.id)
+            query = query.filter(position < self.after if self.descending else position > self.after)
+
+        if self.descending:
+            query = query.order_by(sort_column.desc(), PasswordEntry.id.desc())
+        else:
+            query = query.order_by(sort_column, PasswordEntry.id)
+
+        query = query.add_columns(sort_column, PasswordEntry.id)
+        if self.paginated:
+            query = query.limit(self.limit + 1)  # One extra row tells us if there is a next page
+        return query
+
+    def page(self, rows):
+        """
+        Returns:
+            (rows without the two trailing columns, next cursor or None)
+        """
+        next_cursor = None
+        if self.paginated and len(rows) > self.limit:
+            rows = rows[:self.limit]
+            next_cursor = self._encode_cursor(rows[-1][-2], rows[-1][-1])
+        return [row[:-2] for row in rows], next_cursor
+
+
+def format_timestamp(value):
+    """'YYYY-MM-DD HH:MM:SS' (isoformat is several times faster than strftime)."""
+    return value.isoformat(' ', 'seconds') if value else None
+
+
+def select_fields(fields):
+    """Core SELECT of the given listing fields ('password' reads the stored blob)."""
+    return select(*[
+        PasswordEntry.encrypted_password if field == 'password' else getattr(PasswordEntry, field)
+        for field in fields
+    ])
+
+
+# An entry that fails to decrypt keeps only these (plus password, security_level, error)
+FAILED_ENTRY_FIELDS = ('id', 'website', 'username')
+
+
+def serialize_rows(fields, rows, encryptor=None) -> list:
+    """
+    Turn rows of select_fields(fields) into response dicts.
+
+    With 'password' among the fields the blobs are decrypted in one
+    decrypt_many batch (encryptor required). An entry that fails to decrypt
+    is reported in the listing's long-standing failure shape: id, website,
+    username, '[Decryption failed]', security_level 'Critical' (or 'Lost' if
+    it was marked lost) and its error.
+    """
+    timestamps = [field for field in fields if field in TIMESTAMP_FIELDS]
+    results = None
+    if 'password' in fields:
+        position = fields.index('password')
+        results = encryptor.decrypt_many(row[position] for row in rows)
+
+    items = []
+    for index, row in enumerate(rows):
+        item = dict(zip(fields, row))
+        for field in timestamps:
+            item[field] = format_timestamp(item[field])
+        if results is not None:
+            password, error = results[index]
+            if error is not None:
+                level = LOST if item.get('security_level') == LOST else 'Critical'
+                item = {field: item[field] for field in FAILED_ENTRY_FIELDS if field in item}
+                item.update(password=password, security_level=level, error=error)
+            else:
+                item['password'] = password
+        items.append(item)
+    return items
@@ -0,0 +1,66 @@
+"""
+Ranked full-text search over website, username and notes.
+
+Each word of the query becomes a prefix term and all terms must match
+("git ali" finds github.com / alice). Runs on the search index installed
+by database_postgres.install_search_index:
+- SQLite: FTS5 MATCH ranked by bm25 (website > username > notes)
+- PostgreSQL: tsvector @@ tsquery ranked by ts_rank over the weighted vector
+Only ids and ranks come back; the route decrypts just those entries.
+"""
+import re
+from sqlalchemy import text
+
+MAX_TERMS = 8
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+SEARCH_SQL = {
+    'sqlite': (
+        "SELECT f.rowid, bm25(password_entries_fts, 10.0, 5.0, 1.0) AS score "
+        "FROM password_entries_fts f JOIN password_entries p ON p.id = f.rowid "
+        "WHERE password_entries_fts MATCH :query AND p.user_id = :user_id "
+        "ORDER BY score LIMIT :limit"  # bm25: lower is better
+    ),
+    'postgresql': (
+        "SELECT id, ts_rank(search_vector, to_tsquery('simple', :query)) AS score "
+        "FROM password_entries "
+        "WHERE user_id = :user_id AND search_vector @@ to_tsquery('simple', :query) "
+        "ORDER BY score DESC, id LIMIT :limit"
+    )
+}
+
+
+def search_terms(q: str) -> list:
+    """Lowercased words of the query (punctuation dropped, at most MAX_TERMS)."""
+    return [word.lower() for word in _WORD.findall(q or '')][:MAX_TERMS]
+
+
+def build_match(terms: list, dialect: str) -> str:
+    """Prefix-match expression in the dialect's query syntax."""
+    if dialect == 'postgresql':
+        return ' & '.join(f'{term}:*' for term in terms)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_entry_ids(db, user_id: int, q: str, limit: int) -> list:
+    """
+    Returns:
+        Matching entry ids, best match first ([] if q has no words)
+
+    Raises:
+        NotImplementedError: Database without a search index
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+
+    dialect = db.get_bind().dialect.name
+    if dialect not in SEARCH_SQL:
+        raise NotImplementedError(f'Full-text search is not available on {dialect}')
+
+    rows = db.execute(text(SEARCH_SQL[dialect]), {
+        'query': build_match(terms, dialect),
+        'user_id': user_id,
+        'limit': limit
+    }).all()
+    return [row[0] for row in rows]
@@ -1,4 +1,4 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 import os
 import secrets
@@ -21,7 +21,8 @@ CORS(app, resources={
             "https://binovault-*.vercel.app"   # Vercel preview deployments
         ],
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
+        "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
+        "expose_headers": ["ETag"],                # Read by the client's conditional listing GETs
         "supports_credentials": True
     }
 })
@@ -32,24 +33,39 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'None' if os.environ.get('FLASK_ENV') == 'production' else 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = 86400  # 24 hours
 
-# ✅ Initialize PostgreSQL database
-from database_postgres import init_db
+# ✅ Check the database schema version (run `python migrate.py` to upgrade)
+from config import Config
+from migrations.runner import check_schema, upgrade, SchemaOutOfDateError
+from database_postgres import close_db
+
+if Config.AUTO_MIGRATE:
+    upgrade()
 
 try:
-    with app.app_context():
-        init_db()
-        print("✅ Database initialized successfully")
-except Exception as e:
-    print(f"⚠️ Database initialization error: {e}")
+    schema_version = check_schema()
+    print(f"✅ Database schema at version {schema_version}")
+except SchemaOutOfDateError as e:
+    print(f"❌ {e}. Run: python migrate.py")
+    raise
 
 # ✅ Import and register blueprints
 from api.auth_routes import auth_bp
 from api.recovery_routes import recovery_bp
-from api.password_routes import password_bp
+from api.password_routes import password_bp, VaultSessionInterface
+from auth.session_reaper import session_reaper
+from utils import metrics
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(recovery_bp, url_prefix='/api/recovery')
 app.register_blueprint(password_bp)  # Already has /api/passwords prefix
+app.session_interface = VaultSessionInterface()  # No Vary: Cookie on vault ETag responses
+
+# ✅ One DB session per request, always closed (rolled back on errors)
+app.teardown_appcontext(close_db)
+
+# ✅ Expired-session cleanup (runs under Gunicorn too; one worker at a time)
+if Config.SESSION_REAPER_ENABLED:
+    session_reaper.start()
 
 # Test route
 @app.route('/')
@@ -61,19 +77,22 @@ def home():
 def health():
     return {'status': 'healthy'}, 200
 
+# Per-worker counters (key cache, ...); only served with METRICS_TOKEN set
+def metrics_snapshot():
+    if not metrics.is_authorized(request.headers.get('Authorization'), Config.METRICS_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+    return metrics.snapshot(), 200
+
+if Config.METRICS_TOKEN:
+    app.add_url_rule('/metrics', view_func=metrics_snapshot)
+else:
+    print("ℹ️ /metrics disabled (set METRICS_TOKEN to enable it)")
+
 if __name__ == '__main__':
     print("🔐 Starting BinO-Vault API server...")
     print("👉 http://localhost:5000")
     print("✅ Session encryption enabled")
     print("✅ Password routes registered")
     
-    # Clean up expired sessions on startup
-    print("🧹 Cleaning up expired sessions...")
-    try:
-        from cleanup_sessions import cleanup_expired_sessions
-        cleanup_expired_sessions()
-    except Exception as e:
-        print(f"⚠️ Session cleanup failed: {e}")
-    
     # Development server (Gunicorn used in production)
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,269 @@
+from argon2 import extract_parameters, PasswordHasher
+from contextlib import contextmanager
+from config import Config
+from utils import metrics
+import os
+import random
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, in-process budget only
+    fcntl = None
+
+
+class AdmissionTimeout(Exception):
+    """Raised when Argon2 memory could not be reserved within the timeout."""
+
+
+class MemoryAdmissionController:
+    """
+    In-process admission control for Argon2 memory (one worker's budget).
+
+    WHY:
+    - Every Argon2 hash/verify allocates memory_cost KiB (64 MiB by default)
+    - Without a limit, a burst of logins can push a small container into OOM
+    - Callers reserve memory_cost KiB before hashing and wait (up to a
+      timeout) while the budget is used up, so concurrent Argon2 memory
+      never exceeds the configured budget
+
+    A single request larger than the whole budget is admitted alone.
+    Only threads of this process share the budget; under several Gunicorn
+    workers use HostAdmissionController.
+    """
+
+    def __init__(self, budget_kib: int, timeout: float = 5.0):
+        """
+        Args:
+            budget_kib: Total Argon2 memory allowed at once (KiB)
+            timeout: Default seconds to wait for a reservation
+        """
+        self.budget_kib = budget_kib
+        self.timeout = timeout
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        self.waiting = 0
+        self.admitted = 0
+        self.timeouts = 0
+        self.peak_kib = 0
+
+    @contextmanager
+    def reserve(self, memory_kib: int, timeout: float = None):
+        """
+        Hold memory_kib of the budget for the duration of the with-block.
+
+        Raises:
+            AdmissionTimeout: Budget not available within timeout
+        """
+        needed = min(memory_kib, self.budget_kib)
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self._in_use + needed > self.budget_kib:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise AdmissionTimeout(f'Argon2 memory budget exhausted ({self.budget_kib} KiB)')
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+            self._in_use += needed
+            self.admitted += 1
+            self.peak_kib = max(self.peak_kib, self._in_use)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_use -= needed
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'scope': 'process',
+                'budget_kib': self.budget_kib,
+                'in_use_kib': self._in_use,
+                'peak_kib': self.peak_kib,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'timeouts': self.timeouts
+            }
+
+
+class HostAdmissionController:
+    """
+    Argon2 memory budget shared by every worker process on the host.
+
+    WHY:
+    - Gunicorn forks several workers; an in-process budget per worker lets
+      the container run workers x budget of Argon2 at once
+    - The budget is split into slots of slot_kib, each a lock file in
+      lock_dir; a reservation holds ceil(memory_kib / slot_kib) slots with
+      flock(2), which every process (and thread) on the host contends on
+    - The kernel drops a lock when its holder exits, so a crashed worker
+      never leaks budget; a forked child (e.g. the Argon2 process pool)
+      closes its inherited copies so it can't keep a parent's slots locked
+
+    Waiters poll every few ms until the deadline. A request larger than the
+    whole budget takes every slot, i.e. runs alone.
+    """
+
+    POLL_INTERVAL = 0.005  # seconds, plus jitter so waiters don't retry in lockstep
+
+    def __init__(self, budget_kib: int, slot_kib: int, lock_dir: str, timeout: float = 5.0):
+        """
+        Args:
+            budget_kib: Total Argon2 memory allowed at once across the host (KiB)
+            slot_kib: Budget granularity, normally the configured memory_cost
+            lock_dir: Directory for the slot lock files (same path in every worker)
+            timeout: Default seconds to wait for a reservation
+        """
+        self.budget_kib = budget_kib
+        self.slot_kib = slot_kib
+        self.slots = max(1, budget_kib // slot_kib)
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._held_fds = set()
+        os.makedirs(lock_dir, mode=0o700, exist_ok=True)
+        # Forks wait for lock-file bookkeeping to finish, so a child always knows what it inherited
+        os.register_at_fork(before=self._lock.acquire, after_in_parent=self._lock.release,
+                            after_in_child=self._close_inherited)
+
+        self.in_use_kib = 0  # Held by this worker
+        self.waiting = 0
+        self.admitted = 0
+        self.timeouts = 0
+        self.peak_kib = 0
+
+    def _slot_path(self, index: int) -> str:
+        return os.path.join(self.lock_dir, f'slot-{index}.lock')
+
+    def _try_acquire(self, needed: int) -> list:
+        """
+        Lock needed free slots without blocking; [] (holding nothing) if not
+        enough are free. Caller holds self._lock.
+        """
+        held = []
+        start = random.randrange(self.slots)  # Spread processes over the slots
+        for offset in range(self.slots):
+            fd = os.open(self._slot_path((start + offset) % self.slots), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            held.append(fd)
+            self._held_fds.add(fd)
+            if len(held) == needed:
+                return held
+        self._release(held)
+        return []
+
+    def _release(self, held: list):
+        """Caller holds self._lock."""
+        for fd in held:
+            self._held_fds.discard(fd)
+            os.close(fd)  # Closing the last descriptor of the file drops its flock
+
+    def _close_inherited(self):
+        for fd in self._held_fds:
+            os.close(fd)
+        self._held_fds = set()
+        self._lock.release()  # Taken by the before-fork hook in the parent
+
+    @contextmanager
+    def reserve(self, memory_kib: int, timeout: float = None):
+        """
+        Hold memory_kib of the host budget for the duration of the with-block.
+
+        Raises:
+            AdmissionTimeout: Budget not available within timeout
+        """
+        needed = min(-(-memory_kib // self.slot_kib), self.slots)
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+
+        with self._lock:
+            self.waiting += 1
+        try:
+            while True:
+                with self._lock:
+                    held = self._try_acquire(needed)
+                if held:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise AdmissionTimeout(f'Argon2 memory budget exhausted ({self.budget_kib} KiB)')
+                time.sleep(min(remaining, self.POLL_INTERVAL * (1 + random.random())))
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        reserved = needed * self.slot_kib
+        with self._lock:
+            self.in_use_kib += reserved
+            self.admitted += 1
+            self.peak_kib = max(self.peak_kib, self.in_use_kib)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_use_kib -= reserved
+                self._release(held)
+
+    def stats(self) -> dict:
+        """This worker's share of the host budget (in_use/peak) and its waits."""
+        with self._lock:
+            return {
+                'scope': 'host',
+                'budget_kib': self.budget_kib,
+                'slot_kib': self.slot_kib,
+                'slots': self.slots,
+                'in_use_kib': self.in_use_kib,
+                'peak_kib': self.peak_kib,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'timeouts': self.timeouts
+            }
+
+
+def build_admission_controller():
+    """Host-wide budget where flock exists (Linux/macOS), else this process only."""
+    if Config.ARGON2_ADMISSION_SCOPE == 'host' and fcntl is not None:
+        return HostAdmissionController(
+            budget_kib=Config.ARGON2_MEMORY_BUDGET_MB * 1024,
+            slot_kib=Config.ARGON2_MEMORY_COST,
+            lock_dir=Config.ARGON2_ADMISSION_DIR,
+            timeout=Config.ARGON2_ADMISSION_TIMEOUT
+        )
+    return MemoryAdmissionController(
+        budget_kib=Config.ARGON2_MEMORY_BUDGET_MB * 1024,
+        timeout=Config.ARGON2_ADMISSION_TIMEOUT
+    )
+
+
+def hash_memory_cost(params: dict = None) -> int:
+    """memory_cost (KiB) that hashing with these PasswordHasher kwargs will use."""
+    if params and 'memory_cost' in params:
+        return params['memory_cost']
+    return PasswordHasher().memory_cost
+
+
+def verify_memory_cost(password_hash: str) -> int:
+    """memory_cost (KiB) recorded in a stored hash (verify uses the hash's parameters)."""
+    try:
+        return extract_parameters(password_hash).memory_cost
+    except Exception:
+        return hash_memory_cost()  # Malformed hash: verify will fail fast anyway
+
+
+argon2_admission = build_admission_controller()
+metrics.register('argon2_admission', argon2_admission.stats)
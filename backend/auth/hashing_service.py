@@ -0,0 +1,200 @@
+from argon2 import PasswordHasher, extract_parameters
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from auth.admission import argon2_admission, AdmissionTimeout, hash_memory_cost, verify_memory_cost
+from config import Config
+from utils import metrics
+import threading
+import time
+
+
+class HashingBusyError(Exception):
+    """Raised when the hashing queue is full; maps to 503 + Retry-After."""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Server busy, please retry shortly')
+        self.retry_after = retry_after
+
+    def to_response(self):
+        """Flask response tuple for route handlers."""
+        return (
+            {'error': 'Server busy, please retry shortly'},
+            503,
+            {'Retry-After': str(self.retry_after)}
+        )
+
+
+def _hasher(params):
+    return PasswordHasher(**params) if params else PasswordHasher()
+
+
+COST_PARAMETERS = ('time_cost', 'memory_cost', 'parallelism', 'hash_len', 'salt_len')
+
+
+def is_rehash_upgrade(hasher: PasswordHasher, password_hash: str) -> bool:
+    """
+    True if hasher's parameters differ from the stored hash's and none of
+    them is lower, so a rehash only ever strengthens a hash. Retuning to
+    cheaper settings applies to new hashes, never to existing ones.
+    """
+    if not hasher.check_needs_rehash(password_hash):
+        return False
+    try:
+        stored = extract_parameters(password_hash)
+    except Exception:
+        return False
+    return all(getattr(hasher, name) >= getattr(stored, name) for name in COST_PARAMETERS)
+
+
+def _hash_task(params, password, submitted_at):
+    started_at = time.time()
+    return _hasher(params).hash(password), started_at - submitted_at
+
+
+def _verify_task(params, password_hash, password, submitted_at):
+    started_at = time.time()
+    return _hasher(params).verify(password_hash, password), started_at - submitted_at
+
+
+class HashingService:
+    """
+    Runs Argon2 hash/verify on a fixed-size worker pool with a bounded queue.
+
+    WHY:
+    - Each Argon2 call costs tens of ms of CPU and 64 MiB of RAM
+    - Run inline, a login flood ties up every request worker
+    - A fixed pool caps concurrent hashing; a bounded queue caps waiting work,
+      and anything beyond that is rejected fast (503 + Retry-After)
+    - Each call also reserves its memory_cost from the global Argon2 memory
+      budget (auth.admission) before it is dispatched
+    - A broken pool (e.g. an OOM-killed Argon2 child) is dropped and rebuilt
+      on the next call; the call that hit it gets 503 + Retry-After
+
+    USAGE:
+    - verify() raises VerifyMismatchError on a wrong password, like
+      PasswordHasher.verify, so call sites keep their error handling
+    """
+
+    def __init__(self, workers: int, queue_size: int, retry_after: int = 2,
+                 pool_kind: str = 'process', params: dict = None):
+        """
+        Args:
+            workers: Number of hashing processes (or threads)
+            queue_size: Requests allowed to wait for a free worker
+            retry_after: Seconds suggested to rejected clients
+            pool_kind: 'process' (default) or 'thread'
+            params: PasswordHasher keyword arguments (None = library defaults)
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self.pool_kind = pool_kind
+        self.params = params or {}
+
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._pool = None
+        self._lock = threading.Lock()
+
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.pool_restarts = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.pool_kind == 'thread':
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='argon2')
+            else:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _discard_pool(self, pool):
+        """Drop a broken pool so the next call builds a new one (once, however many callers saw it break)."""
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+            self.pool_restarts += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, memory_kib, task, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusyError(self.retry_after)
+
+        try:
+            with self._lock:
+                self.in_flight += 1
+                self.max_queue_depth = max(self.max_queue_depth, self.in_flight - self.workers)
+                pool = self._get_pool()
+
+            try:
+                with argon2_admission.reserve(memory_kib):
+                    result, waited = pool.submit(task, self.params, *args, time.time()).result()
+            except AdmissionTimeout:
+                with self._lock:
+                    self.rejected += 1
+                raise HashingBusyError(self.retry_after)
+            except BrokenExecutor as e:
+                print(f"⚠️ Argon2 pool broke ({e!r}); rebuilding it")
+                self._discard_pool(pool)
+                with self._lock:
+                    self.rejected += 1
+                raise HashingBusyError(self.retry_after)
+
+            with self._lock:
+                self.completed += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            return result
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        """Hash a password (Argon2id)."""
+        return self._run(hash_memory_cost(self.params), _hash_task, password)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """
+        Verify a password against a stored hash.
+
+        Raises:
+            VerifyMismatchError: Password doesn't match
+            HashingBusyError: Queue is full (or the pool broke and is being rebuilt)
+        """
+        return self._run(verify_memory_cost(password_hash), _verify_task, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True if our parameters would strengthen a stored hash (cheap, no hashing)."""
+        return is_rehash_upgrade(_hasher(self.params), password_hash)
+
+    def stats(self) -> dict:
+        """Queue depth and wait-time metrics."""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'queue_depth': max(0, self.in_flight - self.workers),
+                'max_queue_depth': self.max_queue_depth,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'pool_restarts': self.pool_restarts,
+                'avg_wait_ms': round(self.total_wait / self.completed * 1000, 2) if self.completed else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 2)
+            }
+
+
+hashing_service = HashingService(
+    workers=Config.HASHING_WORKERS,
+    queue_size=Config.HASHING_QUEUE_SIZE,
+    retry_after=Config.HASHING_RETRY_AFTER,
+    pool_kind=Config.HASHING_POOL_KIND,
+    params=Config.argon2_params()
+)
+metrics.register('hashing', hashing_service.stats)
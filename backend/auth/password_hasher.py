@@ -1,5 +1,8 @@
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
+from auth.admission import argon2_admission, verify_memory_cost
+from auth.hashing_service import is_rehash_upgrade
+from config import Config
 import secrets
 import string
 
@@ -12,17 +15,12 @@ class MasterPasswordManager:
     - Argon2id: Memory-hard hashing (prevents GPU attacks)
     - Recovery key: 256-bit entropy (secure fallback if password forgotten)
     - No plaintext storage: Only hashes stored in database
+    - Every hash/verify reserves its memory from the global Argon2 budget
     """
 
     def __init__(self):
         """Initialize Argon2 hasher with security parameters from config."""
-        self.hasher = PasswordHasher(
-            time_cost=2,  # 2 iterations
-            memory_cost=65536,  # 64 MB RAM
-            parallelism=4,  # 4 threads
-            hash_len=32,  # 256-bit hash
-            salt_len=16  # 128-bit salt
-        )
+        self.hasher = PasswordHasher(**Config.argon2_params())
 
     def hash_password(self, password: str) -> str:
         """
@@ -34,7 +32,8 @@ class MasterPasswordManager:
         Returns:
             Argon2 hash string (includes salt, parameters, hash)
         """
-        return self.hasher.hash(password)
+        with argon2_admission.reserve(self.hasher.memory_cost):
+            return self.hasher.hash(password)
 
     def verify_password(self, password: str, password_hash: str) -> bool:
         """
@@ -48,11 +47,24 @@ class MasterPasswordManager:
             True if password matches, False otherwise
         """
         try:
-            self.hasher.verify(password_hash, password)
+            with argon2_admission.reserve(verify_memory_cost(password_hash)):
+                self.hasher.verify(password_hash, password)
             return True
         except VerifyMismatchError:
             return False
 
+    def needs_rehash(self, password_hash: str) -> bool:
+        """
+        Check whether a stored hash uses weaker Argon2 parameters than ours.
+
+        Args:
+            password_hash: Stored Argon2 hash
+
+        Returns:
+            True if re-hashing with the current parameters would strengthen it
+        """
+        return is_rehash_upgrade(self.hasher, password_hash)
+
     def generate_recovery_key(self) -> str:
         """
         Generate cryptographically secure recovery key.
@@ -90,7 +102,8 @@ class MasterPasswordManager:
         Returns:
             Argon2 hash of recovery key
         """
-        return self.hasher.hash(recovery_key)
+        with argon2_admission.reserve(self.hasher.memory_cost):
+            return self.hasher.hash(recovery_key)
 
     def verify_recovery_key(self, recovery_key: str, key_hash: str) -> bool:
         """
@@ -104,7 +117,8 @@ class MasterPasswordManager:
             True if key matches, False otherwise
         """
         try:
-            self.hasher.verify(key_hash, recovery_key)
+            with argon2_admission.reserve(verify_memory_cost(key_hash)):
+                self.hasher.verify(key_hash, recovery_key)
             return True
         except VerifyMismatchError:
             return False
@@ -0,0 +1,164 @@
+from sqlalchemy import select, delete, text
+from datetime import datetime
+from config import Config
+from database_postgres import engine, Session as DBSession
+from utils import metrics
+import random
+import threading
+import time
+
+# Arbitrary app-wide key for pg_try_advisory_lock ("BINO" in ASCII)
+REAPER_LOCK_KEY = 0x42494E4F
+
+
+def delete_expired_sessions(conn, batch_size: int, now: datetime = None) -> int:
+    """
+    Delete expired session rows in batches of batch_size, committing each batch.
+
+    Each batch picks the oldest expired ids through the expires_at index, so
+    no single statement holds locks on an unbounded number of rows.
+
+    Returns:
+        Number of rows deleted
+    """
+    table = DBSession.__table__
+    now = now or datetime.utcnow()
+    expired_ids = (
+        select(table.c.id)
+        .where(table.c.expires_at < now)
+        .order_by(table.c.expires_at)
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+
+    deleted = 0
+    while True:
+        count = conn.execute(delete(table).where(table.c.id.in_(expired_ids))).rowcount
+        conn.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+class SessionReaper:
+    """
+    Periodically deletes expired sessions from inside the app.
+
+    WHY:
+    - Gunicorn never runs app.py as __main__, so startup-only cleanup never ran
+    - Goes through the app's SQLAlchemy engine, so it works on PostgreSQL too
+
+    DESIGN:
+    - One daemon thread per worker, sleeping interval +/- jitter so workers
+      started together don't all wake at once
+    - On PostgreSQL a session-level advisory lock (pg_try_advisory_lock)
+      lets only one worker reap per round; the others skip
+    - On SQLite there is a single host and deletes are idempotent, so no lock
+    """
+
+    def __init__(self, interval: float = 300, jitter: float = 0.2, batch_size: int = 500):
+        """
+        Args:
+            interval: Average seconds between runs
+            jitter: Fraction of interval added/subtracted at random
+            batch_size: Rows deleted per statement
+        """
+        self.interval = interval
+        self.jitter = jitter
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.runs = 0
+        self.skipped = 0
+        self.deleted = 0
+        self.errors = 0
+        self.last_run = None
+
+    def _next_delay(self) -> float:
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def run_once(self) -> int:
+        """
+        Reap once if this worker gets the lock.
+
+        Returns:
+            Rows deleted (0 if another worker holds the lock)
+        """
+        with engine.connect() as conn:
+            locking = engine.dialect.name == 'postgresql'
+            if locking:
+                acquired = conn.execute(
+                    text("SELECT pg_try_advisory_lock(:key)"), {'key': REAPER_LOCK_KEY}
+                ).scalar()
+                conn.commit()
+                if not acquired:
+                    self.skipped += 1
+                    return 0
+
+            try:
+                deleted = delete_expired_sessions(conn, self.batch_size)
+            finally:
+                if locking:
+                    self._unlock(conn)
+
+        self.runs += 1
+        self.deleted += deleted
+        self.last_run = time.time()
+        return deleted
+
+    @staticmethod
+    def _unlock(conn):
+        """
+        Release the session-level advisory lock, even after a failed batch.
+
+        An error inside delete_expired_sessions leaves the transaction
+        aborted, so roll back first or the unlock itself fails and the lock
+        stays held on a pooled connection (every worker would skip from
+        then on). If the unlock still fails, discard the connection: the
+        server drops session locks when it closes.
+        """
+        try:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': REAPER_LOCK_KEY})
+            conn.commit()
+        except Exception:
+            conn.invalidate()
+
+    def _loop(self):
+        while not self._stop.wait(self._next_delay()):
+            try:
+                deleted = self.run_once()
+                if deleted:
+                    print(f"🧹 Reaped {deleted} expired sessions")
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ Session reaper failed: {e}")
+
+    def start(self):
+        """Start the background thread (no-op if already running)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='session-reaper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'deleted': self.deleted,
+            'errors': self.errors,
+            'last_run': self.last_run
+        }
+
+
+session_reaper = SessionReaper(
+    interval=Config.SESSION_REAP_INTERVAL,
+    jitter=Config.SESSION_REAP_JITTER,
+    batch_size=Config.SESSION_REAP_BATCH_SIZE
+)
+metrics.register('session_reaper', session_reaper.stats)
@@ -0,0 +1,192 @@
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.backends import default_backend
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from config import Config
+from database_postgres import SessionLocal, Session as DBSession
+from crypto.encryption import PasswordEncryption
+from utils import metrics
+import hashlib
+import secrets
+import threading
+import time
+
+
+class SessionState:
+    """What a request needs from its session: owner, expiry and unwrapped vault keys."""
+
+    __slots__ = ('token_hash', 'user_id', 'expires_at', 'encryptor')
+
+    def __init__(self, token_hash, user_id, expires_at, encryptor):
+        self.token_hash = token_hash
+        self.user_id = user_id
+        self.expires_at = expires_at
+        self.encryptor = encryptor
+
+    def is_expired(self) -> bool:
+        return datetime.utcnow() > self.expires_at
+
+
+class SessionStore:
+    """
+    Server-side sessions behind an opaque cookie token.
+
+    SECURITY DESIGN:
+    - The cookie carries only a random token; the sessions row stores its
+      SHA-256 (unique, indexed session_token column), never the token itself
+    - The unwrapped vault keyring is sealed on the row under a key derived
+      from the token (HKDF), so a database dump alone can't open it
+    - The master password is never kept in the session
+    - Logout deletes the row, so the token stops working server-side
+
+    PERFORMANCE:
+    - A per-worker TTL cache maps token hash -> SessionState, so repeat
+      requests skip the DB lookup, the unseal and any timestamp parsing
+    - Other workers may serve a revoked token until their cache entry
+      expires (SESSION_CACHE_TTL seconds)
+    """
+
+    def __init__(self, cache_ttl: float = 30, cache_size: int = 1024,
+                 lifetime: timedelta = timedelta(hours=24)):
+        """
+        Args:
+            cache_ttl: Seconds a looked-up session is served from memory
+            cache_size: Maximum cached sessions per worker (LRU)
+            lifetime: How long a new session stays valid
+        """
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.lifetime = lifetime
+        self._cache = OrderedDict()  # {token_hash: (SessionState, cached_until)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _hash_token(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _wrapping_key(token: str) -> bytes:
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b'bino-vault session keyring',
+            backend=default_backend()
+        ).derive(token.encode('utf-8'))
+
+    def _cache_put(self, state: SessionState):
+        cached_until = time.monotonic() + self.cache_ttl
+        with self._lock:
+            self._cache[state.token_hash] = (state, cached_until)
+            self._cache.move_to_end(state.token_hash)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, predicate):
+        with self._lock:
+            for token_hash in [h for h, (state, _) in self._cache.items() if predicate(state)]:
+                del self._cache[token_hash]
+
+    def create(self, db, user_id: int, encryptor: PasswordEncryption) -> str:
+        """
+        Create a session row for user_id holding encryptor's keyring.
+
+        The row is added to db; the caller commits.
+
+        Returns:
+            Opaque token for the cookie
+        """
+        token = secrets.token_urlsafe(32)
+        expires_at = datetime.utcnow() + self.lifetime
+        sealed = encryptor.seal_keyring(self._wrapping_key(token)) if encryptor.vault_key else None
+
+        db.add(DBSession(
+            user_id=user_id,
+            session_token=self._hash_token(token),
+            wrapped_vault_key=sealed,
+            expires_at=expires_at
+        ))
+        return token
+
+    def load(self, token: str):
+        """
+        Resolve a cookie token to its SessionState (None if unknown or expired).
+        """
+        token_hash = self._hash_token(token)
+        now = time.monotonic()
+
+        with self._lock:
+            cached = self._cache.get(token_hash)
+            if cached is not None and cached[1] > now:
+                self._cache.move_to_end(token_hash)
+                self.hits += 1
+                state = cached[0]
+                return None if state.is_expired() else state
+            self.misses += 1
+
+        db = SessionLocal()
+        try:
+            row = db.query(
+                DBSession.user_id, DBSession.expires_at, DBSession.wrapped_vault_key
+            ).filter(DBSession.session_token == token_hash).first()
+        finally:
+            db.close()
+
+        if row is None or datetime.utcnow() > row.expires_at:
+            self._cache_drop(lambda state: state.token_hash == token_hash)
+            return None
+
+        if row.wrapped_vault_key:
+            encryptor = PasswordEncryption.from_sealed_keyring(
+                row.wrapped_vault_key, self._wrapping_key(token)
+            )
+        else:
+            encryptor = PasswordEncryption()
+
+        state = SessionState(token_hash, row.user_id, row.expires_at, encryptor)
+        self._cache_put(state)
+        return state
+
+    def update_keys(self, db, token: str, encryptor: PasswordEncryption):
+        """Replace the keyring sealed on a session (after a key rotation). Caller commits."""
+        token_hash = self._hash_token(token)
+        db.query(DBSession).filter(DBSession.session_token == token_hash).update(
+            {DBSession.wrapped_vault_key: encryptor.seal_keyring(self._wrapping_key(token))}
+        )
+        self._cache_drop(lambda state: state.token_hash == token_hash)
+
+    def revoke(self, db, token: str):
+        """Delete one session. Caller commits."""
+        token_hash = self._hash_token(token)
+        db.query(DBSession).filter(DBSession.session_token == token_hash).delete()
+        self._cache_drop(lambda state: state.token_hash == token_hash)
+
+    def revoke_user(self, db, user_id: int, keep_token: str = None):
+        """Delete every session of a user (optionally keeping one). Caller commits."""
+        query = db.query(DBSession).filter(DBSession.user_id == user_id)
+        keep_hash = self._hash_token(keep_token) if keep_token else None
+        if keep_hash:
+            query = query.filter(DBSession.session_token != keep_hash)
+        query.delete(synchronize_session=False)
+        self._cache_drop(lambda state: state.user_id == user_id and state.token_hash != keep_hash)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+session_store = SessionStore(
+    cache_ttl=Config.SESSION_CACHE_TTL,
+    cache_size=Config.SESSION_CACHE_SIZE,
+    lifetime=Config.SESSION_TOKEN_LIFETIME
+)
+metrics.register('session_cache', session_store.stats)
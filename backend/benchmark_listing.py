@@ -0,0 +1,116 @@
+"""
+Benchmark the vault listing read path: ORM entities vs Core column rows.
+
+Usage:
+    python benchmark_listing.py --sizes 1000 10000 100000
+    python benchmark_listing.py --sizes 10000 --decrypt
+
+Inserts a throwaway user with N entries into DATABASE_URL, then times
+loading and serializing the whole vault both ways (best of --repeat runs,
+fresh session each run):
+- orm:  db.query(PasswordEntry) + per-attribute dict + strftime (the old path)
+- core: select_fields(LISTING_FIELDS) + serialize_rows (the current path)
+
+Decryption is the same for both paths and dominates the total, so it is
+left out unless --decrypt is given. The user is deleted afterwards.
+"""
+import argparse
+import time
+from sqlalchemy import delete, insert
+from database_postgres import init_db, SessionLocal, User, PasswordEntry
+from crypto.encryption import PasswordEncryption
+from api.vault_query import LISTING_FIELDS, select_fields, serialize_rows
+
+METADATA_FIELDS = tuple(field for field in LISTING_FIELDS if field != 'password')
+
+
+def make_vault(size, encryptor):
+    db = SessionLocal()
+    user = User(master_password_hash='unused')
+    db.add(user)
+    db.commit()
+
+    blob = encryptor.encrypt('correct horse battery staple')
+    db.execute(insert(PasswordEntry), [
+        {'user_id': user.id, 'website': f'site{i}.example.com', 'username': f'user{i}@example.com',
+         'encrypted_password': blob, 'security_level': 'Calm', 'notes': 'benchmark entry'}
+        for i in range(size)
+    ])
+    db.commit()
+    user_id = user.id
+    db.close()
+    return user_id
+
+
+def drop_vault(user_id):
+    db = SessionLocal()
+    db.execute(delete(PasswordEntry).where(PasswordEntry.user_id == user_id))
+    db.execute(delete(User).where(User.id == user_id))
+    db.commit()
+    db.close()
+
+
+def orm_listing(db, user_id, encryptor):
+    entries = db.query(PasswordEntry).filter(PasswordEntry.user_id == user_id).all()
+    items = [{
+        'id': entry.id,
+        'website': entry.website,
+        'username': entry.username,
+        'security_level': entry.security_level,
+        'notes': entry.notes,
+        'created_at': entry.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'updated_at': entry.updated_at.strftime('%Y-%m-%d %H:%M:%S')
+    } for entry in entries]
+    if encryptor is not None:
+        results = encryptor.decrypt_many(entry.encrypted_password for entry in entries)
+        for item, (password, _) in zip(items, results):
+            item['password'] = password
+    return items
+
+
+def core_listing(db, user_id, encryptor):
+    fields = LISTING_FIELDS if encryptor is not None else METADATA_FIELDS
+    rows = db.execute(select_fields(fields).where(PasswordEntry.user_id == user_id)).all()
+    return serialize_rows(fields, rows, encryptor)
+
+
+def best_of(listing, user_id, encryptor, repeat):
+    timings = []
+    for _ in range(repeat):
+        db = SessionLocal()
+        start = time.perf_counter()
+        items = listing(db, user_id, encryptor)
+        timings.append(time.perf_counter() - start)
+        db.close()
+    return min(timings), len(items)
+
+
+def run(sizes, repeat, decrypt):
+    init_db()
+    encryptor = PasswordEncryption(vault_key=PasswordEncryption.generate_vault_key())
+
+    for size in sizes:
+        user_id = make_vault(size, encryptor)
+        try:
+            orm, count = best_of(orm_listing, user_id, encryptor if decrypt else None, repeat)
+            core, _ = best_of(core_listing, user_id, encryptor if decrypt else None, repeat)
+        finally:
+            drop_vault(user_id)
+
+        assert count == size
+        print(f"   {size:>9,} entries  orm={orm * 1000:9.1f} ms ({size / orm:>9,.0f} rows/s)  "
+              f"core={core * 1000:9.1f} ms ({size / core:>9,.0f} rows/s)  {orm / core:4.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Vault listing read-path benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Vault sizes to time')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per path (best is reported)')
+    parser.add_argument('--decrypt', action='store_true', help='Include password decryption')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"VAULT LISTING: ORM vs Core read path{' (with decryption)' if args.decrypt else ''}")
+    print("=" * 70 + "\n")
+    run(args.sizes, args.repeat, args.decrypt)
@@ -0,0 +1,86 @@
+"""
+Benchmark the login rate limiter under a flood of distinct IPs.
+
+Usage:
+    python benchmark_rate_limiter.py --ips 1000000 --max-keys 100000
+    python benchmark_rate_limiter.py --backend host --checks 100000
+    python benchmark_rate_limiter.py --backend database --checks 5000
+
+Feeds one failed attempt per distinct IP (a scanner never repeats) and
+prints traced memory and per-call latency every checkpoint. With the bounded
+key table, memory grows until max_keys and then stays flat.
+
+--backend host / database time hit (the login path) and add_attempt against
+the shared-memory counter file in a temp dir / the counter table in
+DATABASE_URL instead.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from database_postgres import init_db
+from utils.rate_limiter import RateLimiter, HostBackend, DatabaseBackend
+
+
+def run(ips, max_keys, checkpoints):
+    limiter = RateLimiter(max_keys=max_keys)
+    step = max(1, ips // checkpoints)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+
+    for i in range(1, ips + 1):
+        ip = f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}#{i >> 24}'
+        limiter.hit(ip)
+
+        if i % step == 0:
+            elapsed = time.perf_counter() - start
+            current = tracemalloc.get_traced_memory()[0] - baseline
+            stats = limiter.stats()
+            print(f"   {i:>9,} IPs  keys={stats['keys']:>7,}  "
+                  f"memory={current / 1024 / 1024:7.1f} MiB  {elapsed / i * 1e6:5.2f} µs/IP")
+
+    tracemalloc.stop()
+
+
+def run_shared(backend_name, checks):
+    if backend_name == 'host':
+        backend = HostBackend(15 * 60, os.path.join(tempfile.mkdtemp(), 'bench.counters'))
+    else:
+        init_db()
+        backend = DatabaseBackend(15 * 60)
+    limiter = RateLimiter(max_attempts=10 ** 9, backend=backend)
+
+    for label, op in (('hit', limiter.hit), ('add_attempt', limiter.add_attempt)):
+        start = time.perf_counter()
+        for i in range(checks):
+            op(f'bench-{i % 1000}')
+        elapsed = time.perf_counter() - start
+        print(f"   {label:<16} {elapsed / checks * 1e6:8.1f} µs/call")
+
+    for i in range(1000):
+        limiter.reset_attempts(f'bench-{i}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rate limiter memory benchmark')
+    parser.add_argument('--ips', type=int, default=1000000, help='Distinct IPs to simulate')
+    parser.add_argument('--max-keys', type=int, default=100000, help='Key table cap')
+    parser.add_argument('--checkpoints', type=int, default=10)
+    parser.add_argument('--backend', choices=('local', 'host', 'database'), default='local')
+    parser.add_argument('--checks', type=int, default=5000, help='Calls per operation (shared backends)')
+    args = parser.parse_args()
+
+    if args.backend != 'local':
+        print("=" * 70)
+        print(f"RATE LIMITER: shared {args.backend} backend, {args.checks:,} calls per operation")
+        print("=" * 70 + "\n")
+        run_shared(args.backend, args.checks)
+        raise SystemExit
+
+    print("=" * 70)
+    print(f"RATE LIMITER: {args.ips:,} distinct IPs, max_keys={args.max_keys:,}")
+    print("=" * 70 + "\n")
+    run(args.ips, args.max_keys, args.checkpoints)
@@ -0,0 +1,90 @@
+"""
+Benchmark Argon2id on this host and pick parameters for a target verify latency.
+
+Usage:
+    python calibrate_argon2.py --target-ms 150 --percentile 95
+
+Search order: keep parallelism at the host's core count (max 4), start from
+the largest memory cost allowed, raise time cost while the chosen percentile
+stays under target, and halve memory if even time_cost=1 is too slow.
+
+Print the resulting settings as environment variables. Stored hashes are
+upgraded to the new parameters on each user's next successful login, so no
+migration is needed. A hash is only re-hashed if none of its parameters
+would go down: settings cheaper than the library defaults (t=3, 64 MiB,
+p=4) apply to new accounts only.
+"""
+import argparse
+import os
+import time
+from argon2 import PasswordHasher
+
+MIN_MEMORY_KIB = 19 * 1024  # OWASP minimum for Argon2id
+MAX_TIME_COST = 10
+
+
+def measure(time_cost, memory_cost, parallelism, samples, percentile):
+    """Return the given latency percentile (ms) of verify with these parameters."""
+    hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    password_hash = hasher.hash('calibration-password')
+
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.verify(password_hash, 'calibration-password')
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    index = min(len(timings) - 1, int(round(percentile / 100 * len(timings))) - 1)
+    return timings[max(0, index)]
+
+
+def calibrate(target_ms, percentile, samples, max_memory_kib, parallelism):
+    """Return (time_cost, memory_cost, parallelism, latency_ms) closest to target without exceeding it."""
+    memory_cost = max_memory_kib
+
+    while True:
+        latency = measure(1, memory_cost, parallelism, samples, percentile)
+        print(f"   t=1 m={memory_cost // 1024}MiB p={parallelism}: p{percentile}={latency:.1f}ms")
+
+        if latency <= target_ms or memory_cost // 2 < MIN_MEMORY_KIB:
+            break
+        memory_cost //= 2
+
+    best = (1, memory_cost, parallelism, latency)
+    for time_cost in range(2, MAX_TIME_COST + 1):
+        latency = measure(time_cost, memory_cost, parallelism, samples, percentile)
+        print(f"   t={time_cost} m={memory_cost // 1024}MiB p={parallelism}: p{percentile}={latency:.1f}ms")
+        if latency > target_ms:
+            break
+        best = (time_cost, memory_cost, parallelism, latency)
+
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Calibrate Argon2id cost for this host')
+    parser.add_argument('--target-ms', type=float, default=150, help='Target verify latency (ms)')
+    parser.add_argument('--percentile', type=float, default=95, help='Latency percentile to hold under target')
+    parser.add_argument('--samples', type=int, default=20, help='Verifications per candidate')
+    parser.add_argument('--max-memory-mb', type=int, default=64, help='Upper bound for memory cost (MiB)')
+    parser.add_argument('--parallelism', type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"CALIBRATING ARGON2ID (target p{args.percentile:g} <= {args.target_ms:g}ms)")
+    print("=" * 70 + "\n")
+
+    time_cost, memory_cost, parallelism, latency = calibrate(
+        args.target_ms, args.percentile, args.samples, args.max_memory_mb * 1024, args.parallelism
+    )
+
+    if latency > args.target_ms:
+        print(f"\n⚠️ Even the cheapest allowed setting takes {latency:.1f}ms on this host")
+
+    print(f"\n✅ Selected: time_cost={time_cost}, memory_cost={memory_cost // 1024}MiB, "
+          f"parallelism={parallelism} (p{args.percentile:g}={latency:.1f}ms)\n")
+    print("Add to the deployment environment:")
+    print(f"ARGON2_TIME_COST={time_cost}")
+    print(f"ARGON2_MEMORY_COST={memory_cost}")
+    print(f"ARGON2_PARALLELISM={parallelism}")
@@ -1,27 +1,14 @@
-import sqlite3
-import os
-from datetime import datetime
+"""
+Delete expired sessions now (the app's background reaper does this
+periodically; this is for manual runs and cron).
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'passwords.db')
+Works on both SQLite and PostgreSQL through the app's SQLAlchemy engine.
+"""
+from auth.session_reaper import session_reaper
 
 def cleanup_expired_sessions():
-    """Delete all expired sessions from database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Get current time
-    now = datetime.now().isoformat()
-    
-    # Count expired sessions before deletion
-    cursor.execute("SELECT COUNT(*) FROM sessions WHERE expires_at < ?", (now,))
-    expired_count = cursor.fetchone()[0]
-    
-    # Delete expired sessions
-    cursor.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
-    
-    conn.commit()
-    conn.close()
-    
+    """Delete all expired sessions from database (in batches)"""
+    expired_count = session_reaper.run_once()
     print(f"✅ Cleaned up {expired_count} expired sessions")
     return expired_count
 
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 
@@ -9,23 +10,130 @@ class Config:
 
     # Session settings
     SESSION_LIFETIME = timedelta(minutes=30)
+    SESSION_TOKEN_LIFETIME = timedelta(hours=24)  # Server-side session rows (cookie holds only the token)
+    SESSION_CACHE_TTL = int(os.getenv('SESSION_CACHE_TTL', '30'))  # seconds a lookup is served from memory
+    SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '1024'))
+
+    # Expired-session reaper (background thread per worker, one runs at a time)
+    SESSION_REAPER_ENABLED = os.getenv('SESSION_REAPER_ENABLED', 'True') == 'True'
+    SESSION_REAP_INTERVAL = int(os.getenv('SESSION_REAP_INTERVAL', '300'))  # seconds
+    SESSION_REAP_JITTER = 0.2  # +/- fraction of the interval
+    SESSION_REAP_BATCH_SIZE = int(os.getenv('SESSION_REAP_BATCH_SIZE', '500'))
 
     # Database settings
     DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'bino_vault.db')
+    AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', 'False') == 'True'  # Apply migrations at startup (single-process dev only)
+
+    # Connection pool (per worker process)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '5'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # seconds; below server/proxy idle timeouts
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'True') == 'True'  # Drop dead connections before use
+
+    # SQLite pragma profile (applied on every new connection)
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')  # Readers don't block behind writers
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    SQLITE_CACHE_SIZE_KIB = int(os.getenv('SQLITE_CACHE_SIZE_KIB', '16384'))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)))  # bytes
+
+    @classmethod
+    def sqlite_pragmas(cls):
+        """PRAGMA name -> value, in the order they are applied."""
+        return {
+            'journal_mode': cls.SQLITE_JOURNAL_MODE,
+            'synchronous': cls.SQLITE_SYNCHRONOUS,
+            'busy_timeout': cls.SQLITE_BUSY_TIMEOUT_MS,
+            'cache_size': -cls.SQLITE_CACHE_SIZE_KIB,  # Negative = KiB rather than pages
+            'mmap_size': cls.SQLITE_MMAP_SIZE
+        }
 
     # Encryption settings
     ENCRYPTION_KEY_SIZE = 32
     SALT_SIZE = 16
+    PBKDF2_ITERATIONS = int(os.getenv('PBKDF2_ITERATIONS', '100000'))  # Recorded in each v3 header
+
+    # Login and route rate limiters (sliding-window counters)
+    RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+    RATE_LIMIT_SWEEP_INTERVAL = int(os.getenv('RATE_LIMIT_SWEEP_INTERVAL', '60'))  # seconds
+    # host: counters in a flock'd shared-memory file, one per limiter in RATE_LIMIT_HOST_DIR, shared by
+    # every worker process on the host; microseconds per check (the default).
+    # database: counters shared by every worker and host, ~1 ms write per request; set it for several hosts.
+    # local: in-process counters; a single worker only, or the limit multiplies by the number of workers
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'host')
+    RATE_LIMIT_HOST_DIR = os.getenv('RATE_LIMIT_HOST_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'bino-vault-rate-limits'))
+    RATE_LIMIT_FALLBACK_COOLDOWN = int(os.getenv('RATE_LIMIT_FALLBACK_COOLDOWN', '30'))  # seconds on local counters after a backend error
+
+    # GET /metrics: Bearer token required; unset = the route isn't registered
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+    # Vault listing pages (?limit= / ?cursor=)
+    LISTING_MAX_PAGE_SIZE = int(os.getenv('LISTING_MAX_PAGE_SIZE', '200'))
+
+    # Bulk import (POST /api/passwords/import)
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '500'))  # rows per INSERT + commit
+    IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', '50000'))
+
+    # Streaming export (GET /api/passwords/export)
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '500'))  # rows per yield_per partition
+
+    # Batch mutations (POST /api/passwords/batch)
+    BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', '500'))
+
+    # Derived-key cache (PBKDF2 results, keyed by user + salt)
+    KEY_CACHE_MAX_ENTRIES = int(os.getenv('KEY_CACHE_MAX_ENTRIES', '256'))
+    KEY_CACHE_IDLE_TTL = int(os.getenv('KEY_CACHE_IDLE_TTL', '900'))  # seconds
+
+    # Seconds a login spends upgrading password-derived (legacy) entries before
+    # handing the rest to the background re-encryption job
+    LOGIN_UPGRADE_SECONDS = float(os.getenv('LOGIN_UPGRADE_SECONDS', '3'))
+
+    # Batch decryption (shared thread pool per worker, capped per request)
+    DECRYPT_POOL_SIZE = int(os.getenv('DECRYPT_POOL_SIZE', str(min(8, os.cpu_count() or 1))))
+    DECRYPT_MAX_PARALLEL = int(os.getenv('DECRYPT_MAX_PARALLEL', '4'))
 
     # Password generation settings
     PASSWORD_MIN_LENGTH = 12
     PASSWORD_MAX_LENGTH = 64
     PASSWORD_DEFAULT_LENGTH = 16
 
-    # Argon2id parameters
-    ARGON2_TIME_COST = 2
-    ARGON2_MEMORY_COST = 65536
-    ARGON2_PARALLELISM = 4
+    # Argon2id parameters, defaulting to argon2-cffi's PasswordHasher() (t=3,
+    # 64 MiB, p=4) that existing hashes were made with. Tune per host with
+    # calibrate_argon2.py; stored hashes are re-hashed on the next successful
+    # login only if no parameter goes down
+    ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', '3'))
+    ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', '65536'))  # KiB
+    ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', '4'))
+    ARGON2_HASH_LEN = 32
+    ARGON2_SALT_LEN = 16
+
+    # Argon2 hashing service (worker pool + bounded queue, 503 when full)
+    HASHING_WORKERS = int(os.getenv('HASHING_WORKERS', str(min(4, os.cpu_count() or 1))))
+    HASHING_QUEUE_SIZE = int(os.getenv('HASHING_QUEUE_SIZE', '16'))
+    HASHING_RETRY_AFTER = int(os.getenv('HASHING_RETRY_AFTER', '2'))  # seconds
+    HASHING_POOL_KIND = os.getenv('HASHING_POOL_KIND', 'process')  # process or thread
+
+    # Argon2 memory budget for the whole host: every worker process reserves
+    # its hashes/verifies from the same flock'd slot files in ARGON2_ADMISSION_DIR
+    # ('process' scope, or no flock on the platform: each worker gets the full budget)
+    ARGON2_MEMORY_BUDGET_MB = int(os.getenv('ARGON2_MEMORY_BUDGET_MB', '256'))
+    ARGON2_ADMISSION_TIMEOUT = float(os.getenv('ARGON2_ADMISSION_TIMEOUT', '5'))  # seconds
+    ARGON2_ADMISSION_SCOPE = os.getenv('ARGON2_ADMISSION_SCOPE', 'host')  # host or process
+    ARGON2_ADMISSION_DIR = os.getenv('ARGON2_ADMISSION_DIR',
+                                     os.path.join(tempfile.gettempdir(), 'bino-vault-argon2'))
+
+    @classmethod
+    def argon2_params(cls):
+        """PasswordHasher keyword arguments for new hashes."""
+        return {
+            'time_cost': cls.ARGON2_TIME_COST,
+            'memory_cost': cls.ARGON2_MEMORY_COST,
+            'parallelism': cls.ARGON2_PARALLELISM,
+            'hash_len': cls.ARGON2_HASH_LEN,
+            'salt_len': cls.ARGON2_SALT_LEN
+        }
 
     # CORS settings
     CORS_ORIGINS = [
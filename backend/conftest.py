@@ -0,0 +1,91 @@
+"""Point the app at a throwaway SQLite database (and rate-limit counter dir) before any test imports it."""
+import os
+import tempfile
+
+_scratch = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_scratch, 'test_vault.db')
+os.environ['RATE_LIMIT_HOST_DIR'] = os.path.join(_scratch, 'rate-limits')  # Fresh counters every run
+
+import pytest
+from flask import Flask
+from database_postgres import init_db, close_db, SessionLocal, User, PasswordEntry
+from crypto.encryption import PasswordEncryption
+
+collect_ignore = ['test_full_flow.py']  # Manual script against a live passwords.db
+
+MASTER_PASSWORD = "MyPassword123"
+
+
+class Vault:
+    """A test user: id, unwrapped vault key, its encryptor and entry ids (insert order)."""
+
+    def __init__(self, user_id, vault_key, encryptor, entry_ids):
+        self.user_id = user_id
+        self.vault_key = vault_key
+        self.encryptor = encryptor
+        self.entry_ids = entry_ids
+
+
+def create_vault(db, count=0, entry=None) -> Vault:
+    """
+    Add a user whose vault key is wrapped under MASTER_PASSWORD, with count
+    entries site{i} / me / secret{i}. entry(i) may return overrides for any
+    PasswordEntry column (e.g. encrypted_password=b'unused').
+    """
+    vault_key = PasswordEncryption.generate_vault_key()
+    user = User(
+        master_password_hash='unused',
+        wrapped_vault_key=PasswordEncryption(MASTER_PASSWORD).wrap_vault_key(vault_key)
+    )
+    db.add(user)
+    db.commit()
+
+    encryptor = PasswordEncryption(vault_key=vault_key)
+    entries = []
+    for i in range(count):
+        columns = {'website': f'site{i}', 'username': 'me'}
+        columns.update(entry(i) if entry else {})
+        if 'encrypted_password' not in columns:
+            columns['encrypted_password'] = encryptor.encrypt(f'secret{i}')
+        entries.append(PasswordEntry(user_id=user.id, **columns))
+    db.add_all(entries)
+    db.commit()
+    return Vault(user.id, vault_key, encryptor, [entry.id for entry in entries])
+
+
+@pytest.fixture
+def db():
+    """A session on the test database (init_db: create_all, no migrations), closed after the test."""
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_vault(db):
+    """make_vault(count=0, entry=None) -> Vault (see create_vault)."""
+    return lambda count=0, entry=None: create_vault(db, count, entry)
+
+
+@pytest.fixture
+def make_client(db):
+    """make_client(vault) -> Flask test client for the password routes, logged in as vault's user."""
+    from auth.session_store import session_store
+    from api.password_routes import password_bp, VaultSessionInterface
+
+    def factory(vault):
+        token = session_store.create(db, vault.user_id, vault.encryptor)
+        db.commit()
+
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        app.register_blueprint(password_bp)
+        app.session_interface = VaultSessionInterface()
+        app.teardown_appcontext(close_db)
+        client = app.test_client()
+        with client.session_transaction() as flask_session:
+            flask_session['token'] = token
+        return client
+
+    return factory
@@ -2,8 +2,46 @@ from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.backends import default_backend
+from cryptography.exceptions import InvalidTag
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
 import os
 import base64
+import json
+import struct
+import threading
+
+VAULT_KEY_SIZE = 32  # AES-256 data-encryption key
+DECRYPTION_FAILED = '[Decryption failed]'
+
+# Stored formats (dispatch on the first byte/characters of the blob)
+FORMAT_UNKNOWN = 0  # Corrupt/unrecognised: fails in decrypt, never in a pre-scan
+FORMAT_V1_LEGACY = 1  # base64 text: salt(16) | iv(12) | ct | tag(16), PBKDF2-100000
+FORMAT_V2_ENVELOPE = 2  # text: 'v2:' + base64(iv | ct | tag) under the vault key
+FORMAT_V3 = 3  # binary: header | [salt] | iv | ct | tag (current)
+
+ENVELOPE_PREFIX = 'v2:'  # ':' is not in the base64 alphabet, so legacy blobs never match
+
+# v3 header: format byte, KDF id byte, KDF cost (uint32), key id (uint32)
+V3_HEADER = struct.Struct('>BBII')
+KDF_NONE = 0  # Sealed directly with the vault key identified by key id
+KDF_PBKDF2_SHA256 = 1  # Key derived from the master password, cost = iterations
+LEGACY_PBKDF2_ITERATIONS = 100000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Shared decryption pool for this worker (created on first use)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=Config.DECRYPT_POOL_SIZE,
+                thread_name_prefix='decrypt'
+            )
+        return _executor
 
 
 class PasswordEncryption:
@@ -15,132 +53,341 @@ class PasswordEncryption:
     - GCM mode: Provides authentication (prevents tampering)
     - Authenticated encryption: Attackers can't modify ciphertext without detection
 
-    SECURITY DESIGN:
-    1. Master password → derive encryption key (PBKDF2)
-    2. Each password gets unique IV (nonce)
-    3. GCM tag ensures data integrity
-    4. Salt stored with ciphertext (no key reuse)
+    SECURITY DESIGN (envelope encryption):
+    1. Each user has a random 256-bit vault key (data-encryption key)
+    2. Vault key is wrapped once under the master password (PBKDF2)
+    3. Entries are sealed directly with the vault key (no KDF per entry)
+    4. Each password gets unique IV (nonce), GCM tag ensures data integrity
+
+    STORAGE FORMAT (v3, raw bytes):
+    - Header: format byte | KDF id | KDF cost | key id (authenticated as GCM AAD)
+    - KDF id PBKDF2 adds a 16-byte salt after the header (used for wrapped keys)
+    - Older text formats (v1 per-entry PBKDF2, v2 'v2:' envelope) still decrypt
+      and are upgraded to v3 by crypto.vault_migration
+    - Key id lets entries of a retired vault key stay readable while a key
+      rotation re-encrypts them
     """
 
-    def __init__(self, master_password: str):
+    def __init__(self, master_password: str = None, vault_key: bytes = None,
+                 key_cache=None, cache_owner=None, key_id: int = 1, keyring: dict = None):
         """
-        Initialize encryption with master password.
+        Initialize encryption with master password and/or vault key.
 
         Args:
-            master_password: User's master password (not stored, only used to derive key)
+            master_password: User's master password (only needed to wrap/unwrap
+                the vault key and to read legacy entries)
+            vault_key: Unwrapped 32-byte vault key (used for all new entries)
+            key_cache: Optional DerivedKeyCache to reuse PBKDF2 results
+            cache_owner: Cache namespace for this master password (the user id)
+            key_id: Id of vault_key, recorded in every v3 header
+            keyring: Optional {key_id: vault_key} of retired keys that may still
+                be read (during a key rotation)
         """
-        self.master_password = master_password.encode('utf-8')
+        self.master_password = master_password.encode('utf-8') if master_password is not None else None
+        self.vault_key = vault_key
+        self.key_cache = key_cache
+        self.cache_owner = cache_owner
+        self.key_id = key_id
+        self.keyring = dict(keyring or {})
+        if vault_key is not None:
+            self.keyring[key_id] = vault_key
 
-    def _derive_key(self, salt: bytes) -> bytes:
+    def _derive_key(self, salt: bytes, iterations: int = LEGACY_PBKDF2_ITERATIONS) -> bytes:
         """
         Derive encryption key from master password using PBKDF2.
 
         WHY PBKDF2:
         - Key derivation function (stretches password into strong key)
-        - 100,000 iterations makes brute-force expensive
+        - Iteration count is stored in the v3 header, so it can be raised
+          (Config.PBKDF2_ITERATIONS) without breaking existing data
         - SHA-256 is fast but secure enough for key derivation
 
         Args:
             salt: Random salt (ensures same password produces different keys)
+            iterations: PBKDF2 cost read from the blob
 
         Returns:
             32-byte encryption key
         """
+        if self.master_password is None:
+            raise ValueError('Master password required for password-derived keys')
+
+        derive = lambda s: self._pbkdf2(s, iterations)
+        if self.key_cache is not None:
+            return self.key_cache.get_or_derive(self.cache_owner, salt, derive)
+        return derive(salt)
+
+    def _pbkdf2(self, salt: bytes, iterations: int) -> bytes:
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,  # AES-256 requires 32-byte key
             salt=salt,
-            iterations=100000,  # NIST recommendation (2023)
+            iterations=iterations,
             backend=default_backend()
         )
         return kdf.derive(self.master_password)
 
-    def encrypt(self, plaintext: str) -> str:
+    @staticmethod
+    def _seal(key: bytes, data: bytes, aad: bytes = None) -> bytes:
+        """Encrypt bytes with AES-256-GCM, returning iv + ciphertext + tag."""
+        iv = os.urandom(12)  # 96-bit IV (GCM standard)
+        cipher = Cipher(algorithms.AES(key), modes.GCM(iv), backend=default_backend())
+        encryptor = cipher.encryptor()
+        if aad:
+            encryptor.authenticate_additional_data(aad)
+        ciphertext = encryptor.update(data) + encryptor.finalize()
+        return iv + ciphertext + encryptor.tag
+
+    @staticmethod
+    def _open(key: bytes, sealed: bytes, aad: bytes = None) -> bytes:
+        """Decrypt iv + ciphertext + tag produced by _seal (verifies the tag)."""
+        iv = sealed[:12]
+        tag = sealed[-16:]
+        ciphertext = sealed[12:-16]
+        cipher = Cipher(algorithms.AES(key), modes.GCM(iv, tag), backend=default_backend())
+        decryptor = cipher.decryptor()
+        if aad:
+            decryptor.authenticate_additional_data(aad)
+        return decryptor.update(ciphertext) + decryptor.finalize()
+
+    @staticmethod
+    def blob_format(encrypted_data) -> int:
         """
-        Encrypt a password for storage.
+        Identify the stored format (FORMAT_V1_LEGACY, FORMAT_V2_ENVELOPE,
+        FORMAT_V3, or FORMAT_UNKNOWN). Never raises, whatever the input.
+        """
+        if isinstance(encrypted_data, (bytes, bytearray, memoryview)):
+            encrypted_data = bytes(encrypted_data)
+            if encrypted_data[:1] == bytes([FORMAT_V3]):
+                return FORMAT_V3 if len(encrypted_data) >= V3_HEADER.size else FORMAT_UNKNOWN
+            try:
+                encrypted_data = encrypted_data.decode('ascii')  # Text blob stored as bytes
+            except UnicodeDecodeError:
+                return FORMAT_UNKNOWN
+        if not isinstance(encrypted_data, str):
+            return FORMAT_UNKNOWN
+        if encrypted_data.startswith(ENVELOPE_PREFIX):
+            return FORMAT_V2_ENVELOPE
+        return FORMAT_V1_LEGACY
 
-        ENCRYPTION PROCESS:
-        1. Generate random salt (16 bytes)
-        2. Derive encryption key from master password + salt
-        3. Generate random IV (12 bytes for GCM)
-        4. Encrypt plaintext with AES-256-GCM
-        5. Combine: salt + iv + ciphertext + tag
-        6. Base64 encode for storage
+    @classmethod
+    def needs_kdf(cls, encrypted_data) -> bool:
+        """True if decrypting the blob runs PBKDF2 (v1, or v3 with a password KDF)."""
+        version = cls.blob_format(encrypted_data)
+        if version == FORMAT_V3:
+            return bytes(encrypted_data)[1] != KDF_NONE
+        return version == FORMAT_V1_LEGACY
 
-        Args:
-            plaintext: Password to encrypt (e.g., "MyP@ssw0rd!")
+    def current_header(self) -> bytes:
+        """v3 header of an entry that is up to date for this encryptor's key."""
+        return V3_HEADER.pack(FORMAT_V3, KDF_NONE, 0, self.key_id)
 
-        Returns:
-            Base64-encoded encrypted data (safe for database storage)
+    @classmethod
+    def is_legacy(cls, encrypted_data) -> bool:
+        """True if the blob should be upgraded to v3 under the vault key."""
+        return cls.blob_format(encrypted_data) != FORMAT_V3 or cls.needs_kdf(encrypted_data)
+
+    def _encrypt_v3(self, data: bytes, kdf_id: int) -> bytes:
+        if kdf_id == KDF_PBKDF2_SHA256:
+            iterations = Config.PBKDF2_ITERATIONS
+            header = V3_HEADER.pack(FORMAT_V3, kdf_id, iterations, 0)
+            salt = os.urandom(16)  # 128-bit salt
+            return header + salt + self._seal(self._derive_key(salt, iterations), data, header)
+
+        if self.vault_key is None:
+            raise ValueError('Vault key required to encrypt')
+        header = self.current_header()
+        return header + self._seal(self.vault_key, data, header)
+
+    def _decrypt_v3(self, blob: bytes) -> bytes:
+        header = blob[:V3_HEADER.size]
+        _, kdf_id, cost, key_id = V3_HEADER.unpack(header)
+        body = blob[V3_HEADER.size:]
+
+        if kdf_id == KDF_PBKDF2_SHA256:
+            return self._open(self._derive_key(body[:16], cost), body[16:], header)
+
+        if kdf_id != KDF_NONE:
+            raise ValueError(f'Unsupported KDF id {kdf_id}')
+        if key_id not in self.keyring:
+            raise ValueError(f'Entry sealed with unknown key id {key_id}')
+        return self._open(self.keyring[key_id], body, header)
+
+    def _decrypt_v2(self, sealed: bytes) -> bytes:
         """
-        # Generate random salt and IV
-        salt = os.urandom(16)  # 128-bit salt
-        iv = os.urandom(12)  # 96-bit IV (GCM standard)
+        v2 envelopes don't record their key id: try the current vault key, then
+        the retired keys (after a rotation the current key is no longer theirs).
+        The GCM tag rejects every key but the right one.
+        """
+        if not self.keyring:
+            raise ValueError('Vault key required to decrypt this entry')
+        key_ids = sorted(self.keyring, key=lambda key_id: (key_id != self.key_id, -key_id))
+        for key_id in key_ids:
+            try:
+                return self._open(self.keyring[key_id], sealed)
+            except InvalidTag:
+                continue
+        raise ValueError('No vault key in the keyring opens this entry')
 
-        # Derive encryption key
-        key = self._derive_key(salt)
+    def _decrypt_bytes(self, encrypted_data) -> bytes:
+        """Dispatch on the stored format version."""
+        version = self.blob_format(encrypted_data)
 
-        # Create AES-256-GCM cipher
-        cipher = Cipher(
-            algorithms.AES(key),
-            modes.GCM(iv),
-            backend=default_backend()
-        )
-        encryptor = cipher.encryptor()
+        if version == FORMAT_UNKNOWN:
+            raise ValueError('Unrecognized encrypted data format')
+        if version == FORMAT_V3:
+            return self._decrypt_v3(bytes(encrypted_data))
+
+        if isinstance(encrypted_data, (bytes, bytearray, memoryview)):
+            encrypted_data = bytes(encrypted_data).decode('ascii')
+
+        if version == FORMAT_V2_ENVELOPE:
+            return self._decrypt_v2(base64.b64decode(encrypted_data[len(ENVELOPE_PREFIX):]))
+
+        # v1: base64(salt + iv + ciphertext + tag), PBKDF2-100000
+        encrypted_bytes = base64.b64decode(encrypted_data)
+        return self._open(self._derive_key(encrypted_bytes[:16]), encrypted_bytes[16:])
+
+    @staticmethod
+    def generate_vault_key() -> bytes:
+        """Generate a new random vault key (never stored unwrapped)."""
+        return os.urandom(VAULT_KEY_SIZE)
+
+    def wrap_vault_key(self, vault_key: bytes) -> bytes:
+        """
+        Wrap a vault key under the master password for storage on the user row.
 
-        # Encrypt the password
-        ciphertext = encryptor.update(plaintext.encode('utf-8')) + encryptor.finalize()
+        This is the only place new data pays the PBKDF2 cost, once per login.
+        """
+        return self._encrypt_v3(vault_key, KDF_PBKDF2_SHA256)
 
-        # Get authentication tag (proves data wasn't tampered with)
-        tag = encryptor.tag
+    def unwrap_vault_key(self, wrapped_key) -> bytes:
+        """
+        Unwrap a stored vault key (v3, or v1 text from before the binary format).
+
+        Raises:
+            Exception: If the master password is wrong or the wrapped key was tampered
+        """
+        return self._decrypt_bytes(wrapped_key)
 
-        # Combine all components: salt + iv + ciphertext + tag
-        encrypted_data = salt + iv + ciphertext + tag
+    def seal_keyring(self, wrapping_key: bytes) -> bytes:
+        """
+        Seal the current vault key id and keyring under a 32-byte wrapping key.
 
-        # Base64 encode for safe storage in database
-        return base64.b64encode(encrypted_data).decode('utf-8')
+        Used by the server-side session store: the session row keeps the sealed
+        keyring and only the cookie's token can derive the wrapping key.
+        """
+        payload = json.dumps({
+            'current': self.key_id,
+            'keys': {str(key_id): base64.b64encode(key).decode('ascii') for key_id, key in self.keyring.items()}
+        }).encode('utf-8')
+        header = V3_HEADER.pack(FORMAT_V3, KDF_NONE, 0, 0)
+        return header + self._seal(wrapping_key, payload, header)
 
-    def decrypt(self, encrypted_data: str) -> str:
+    @classmethod
+    def from_sealed_keyring(cls, sealed: bytes, wrapping_key: bytes, **kwargs):
+        """
+        Rebuild an encryptor from seal_keyring output.
+
+        Raises:
+            Exception: If the wrapping key is wrong or the blob was tampered
+        """
+        sealed = bytes(sealed)
+        header = sealed[:V3_HEADER.size]
+        payload = json.loads(cls._open(wrapping_key, sealed[V3_HEADER.size:], header))
+        keyring = {int(key_id): base64.b64decode(key) for key_id, key in payload['keys'].items()}
+        current = payload['current']
+        return cls(vault_key=keyring.get(current), key_id=current, keyring=keyring, **kwargs)
+
+    def encrypt(self, plaintext: str) -> bytes:
+        """
+        Encrypt a password for storage.
+
+        ENCRYPTION PROCESS:
+        1. Build the v3 header (format, KDF none, key id)
+        2. Generate random IV (12 bytes for GCM)
+        3. Encrypt plaintext with AES-256-GCM under the vault key, header as AAD
+        4. Store raw bytes: header + iv + ciphertext + tag (no base64)
+
+        Args:
+            plaintext: Password to encrypt (e.g., "MyP@ssw0rd!")
+
+        Without a vault key the entry falls back to a password-derived key
+        (KDF id PBKDF2 + salt in the header).
+
+        Returns:
+            Encrypted bytes for a LargeBinary column
+        """
+        kdf_id = KDF_NONE if self.vault_key is not None else KDF_PBKDF2_SHA256
+        return self._encrypt_v3(plaintext.encode('utf-8'), kdf_id)
+
+    def decrypt(self, encrypted_data) -> str:
         """
         Decrypt a stored password.
 
         DECRYPTION PROCESS:
-        1. Base64 decode
-        2. Extract: salt (16) + iv (12) + ciphertext + tag (16)
-        3. Derive encryption key from master password + salt
-        4. Decrypt with AES-256-GCM
-        5. Verify authentication tag (fails if data was tampered)
+        1. v3 bytes: read header, then AES-256-GCM with the vault key (or the
+           password-derived key described by the header)
+        2. v2 text: AES-256-GCM with the vault key
+        3. v1 text: derive key from master password + salt, then AES-256-GCM
+        4. Verify authentication tag (fails if data or header was tampered)
 
         Args:
-            encrypted_data: Base64-encoded encrypted password
+            encrypted_data: Stored encrypted password (bytes or legacy text)
 
         Returns:
             Decrypted plaintext password
 
         Raises:
-            Exception: If decryption fails (wrong master password or tampered data)
+            Exception: If decryption fails (wrong key or tampered data)
         """
-        # Base64 decode
-        encrypted_bytes = base64.b64decode(encrypted_data.encode('utf-8'))
+        return self._decrypt_bytes(encrypted_data).decode('utf-8')
 
-        # Extract components
-        salt = encrypted_bytes[:16]  # First 16 bytes
-        iv = encrypted_bytes[16:28]  # Next 12 bytes
-        tag = encrypted_bytes[-16:]  # Last 16 bytes
-        ciphertext = encrypted_bytes[28:-16]  # Everything in between
+    def _decrypt_safe(self, encrypted_data):
+        try:
+            return self.decrypt(encrypted_data), None
+        except Exception as e:
+            return DECRYPTION_FAILED, str(e)
 
-        # Derive encryption key
-        key = self._derive_key(salt)
+    def _decrypt_chunk(self, chunk):
+        return [(index, self._decrypt_safe(encrypted_data)) for index, encrypted_data in chunk]
 
-        # Create AES-256-GCM cipher
-        cipher = Cipher(
-            algorithms.AES(key),
-            modes.GCM(iv, tag),  # Tag verifies authenticity
-            backend=default_backend()
-        )
-        decryptor = cipher.decryptor()
+    def decrypt_many(self, encrypted_items, max_parallel: int = None) -> list:
+        """
+        Decrypt a batch of stored passwords, keeping input order.
+
+        WHY THREADS:
+        - PBKDF2 and AES-GCM run in OpenSSL and release the GIL
+        - Legacy entries (one PBKDF2 each) decrypt on several cores at once
+        - Vault-key entries take microseconds, so a batch without KDF
+          entries is decrypted inline (thread hand-off would cost more)
+
+        The batch is split into at most max_parallel chunks, so one large vault
+        never occupies more than max_parallel threads of the shared pool.
+
+        Args:
+            encrypted_items: Iterable of stored encrypted passwords
+            max_parallel: Per-call thread cap (default: Config.DECRYPT_MAX_PARALLEL)
+
+        Returns:
+            List of (plaintext, error) tuples. Failed items come back as
+            (DECRYPTION_FAILED, error message); successful ones have error None.
+        """
+        items = list(encrypted_items)
+        if max_parallel is None:
+            max_parallel = Config.DECRYPT_MAX_PARALLEL
+
+        kdf_count = sum(1 for item in items if self.needs_kdf(item))
+        workers = min(max_parallel, kdf_count)
+        if workers <= 1:
+            return [self._decrypt_safe(item) for item in items]
 
-        # Decrypt
-        plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+        indexed = list(enumerate(items))
+        chunks = [indexed[i::workers] for i in range(workers)]
+        futures = [_get_executor().submit(self._decrypt_chunk, chunk) for chunk in chunks]
 
-        return plaintext.decode('utf-8')
+        results = [None] * len(items)
+        for future in futures:
+            for index, result in future.result():
+                results[index] = result
+        return results
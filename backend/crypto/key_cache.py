@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from utils import metrics
+
+
+class DerivedKeyCache:
+    """
+    Bounded LRU cache for PBKDF2-derived keys, keyed by (owner, salt).
+
+    WHY:
+    - Legacy entries and the wrapped vault key derive their AES key from the
+      master password + a stored salt (100,000 PBKDF2 iterations each time)
+    - Re-opening the same entry re-derives the same key; caching skips that
+
+    SECURITY DESIGN:
+    - Fixed number of slots (LRU eviction) so memory stays bounded
+    - Idle TTL: keys not used for a while are dropped
+    - Keys held in bytearrays and overwritten with zeros when evicted or purged
+    - purge(owner) on logout/password reset wipes everything for that user
+    """
+
+    def __init__(self, max_entries: int = 256, idle_ttl: float = 900):
+        """
+        Args:
+            max_entries: Maximum number of cached keys
+            idle_ttl: Seconds a key may stay unused before it is evicted
+        """
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._entries = OrderedDict()  # {(owner, salt): (bytearray key, last_used)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _zeroize(key: bytearray):
+        for i in range(len(key)):
+            key[i] = 0
+
+    def _evict(self, cache_key):
+        key, _ = self._entries.pop(cache_key)
+        self._zeroize(key)
+        self.evictions += 1
+
+    def _expire(self, now: float):
+        """Drop idle entries (oldest are at the front of the OrderedDict)."""
+        while self._entries:
+            cache_key, (_, last_used) = next(iter(self._entries.items()))
+            if now - last_used < self.idle_ttl:
+                break
+            self._evict(cache_key)
+
+    def get_or_derive(self, owner, salt: bytes, derive) -> bytes:
+        """
+        Return the cached key for (owner, salt), calling derive(salt) on a miss.
+
+        The lock is not held while deriving, so slow PBKDF2 calls don't block
+        other lookups. Two threads missing on the same salt both derive; the
+        second result simply replaces the first.
+        """
+        cache_key = (owner, bytes(salt))
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+            cached = self._entries.get(cache_key)
+            if cached is not None:
+                self._entries[cache_key] = (cached[0], now)
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return bytes(cached[0])
+            self.misses += 1
+
+        key = derive(salt)
+
+        with self._lock:
+            if cache_key in self._entries:
+                self._evict(cache_key)
+                self.evictions -= 1  # Replacement, not a capacity eviction
+            self._entries[cache_key] = (bytearray(key), time.monotonic())
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+        return key
+
+    def purge(self, owner) -> int:
+        """Zeroize and remove every key cached for owner. Returns number removed."""
+        with self._lock:
+            doomed = [cache_key for cache_key in self._entries if cache_key[0] == owner]
+            for cache_key in doomed:
+                key, _ = self._entries.pop(cache_key)
+                self._zeroize(key)
+            return len(doomed)
+
+    def clear(self):
+        """Zeroize and remove every cached key."""
+        with self._lock:
+            for key, _ in self._entries.values():
+                self._zeroize(key)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters (each hit saved one PBKDF2 derivation)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+derived_key_cache = DerivedKeyCache(
+    max_entries=Config.KEY_CACHE_MAX_ENTRIES,
+    idle_ttl=Config.KEY_CACHE_IDLE_TTL
+)
+metrics.register('derived_key_cache', derived_key_cache.stats)
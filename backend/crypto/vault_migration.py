@@ -0,0 +1,237 @@
+"""
+Streaming re-encryption of a user's vault entries.
+
+One pipeline covers both:
+- Format upgrades: v1/v2 text and password-derived v3 entries are rewritten as
+  v3 under the vault key (runs in the background after each login)
+- Key rotation: entries sealed with a retired vault key are re-encrypted under
+  the new one, checkpointed in vault_rekey_jobs so an interrupted rotation
+  resumes where it stopped
+
+Entries are walked in primary-key order (keyset pagination) in fixed-size
+batches, decrypted with decrypt_many and committed per batch, so memory stays
+flat regardless of vault size.
+"""
+import threading
+import time
+from sqlalchemy import select, update, bindparam, func
+from database_postgres import SessionLocal, PasswordEntry, VaultRekeyJob, SECURITY_LEVEL_LOST
+from crypto.encryption import PasswordEncryption, ENVELOPE_PREFIX, FORMAT_V3, KDF_NONE, V3_HEADER
+
+REKEY_BATCH_SIZE = 200
+LOGIN_UPGRADE_BATCH_SIZE = 32  # Small batches, so a login overshoots its time budget by little
+
+_running = set()
+_pending = {}  # {user_id: (encryptor, job_id)} queued behind the running pass
+_running_lock = threading.Lock()
+
+
+def _reencrypt_pass(db, user_id: int, encryptor: PasswordEncryption, start_id: int,
+                    batch_size: int, job: VaultRekeyJob = None, only=None, deadline: float = None) -> int:
+    """
+    Re-encrypt out-of-date entries with id > start_id (restricted to blobs for
+    which only(blob) is true, if given). Stops after the first batch that
+    ends past deadline (time.monotonic()), if given. Returns number rewritten.
+    """
+    table = PasswordEntry.__table__
+    header = encryptor.current_header()
+
+    # Compare-and-swap: skip rows the user edited since we read them.
+    # updated_at is kept as-is because the stored password did not change.
+    rewrite = (
+        update(table)
+        .where(table.c.id == bindparam('b_id'))
+        .where(table.c.encrypted_password == bindparam('b_old'))
+        .values(encrypted_password=bindparam('b_new'), updated_at=table.c.updated_at)
+    )
+
+    rewritten = 0
+    last_id = start_id
+
+    while True:
+        rows = db.execute(
+            select(table.c.id, table.c.encrypted_password)
+            .where(table.c.user_id == user_id)
+            .where(table.c.id > last_id)
+            .where(func.substr(table.c.encrypted_password, 1, len(header)) != header)
+            .where(func.coalesce(table.c.security_level, '') != SECURITY_LEVEL_LOST)  # No key left to read them
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+
+        if not rows:
+            return rewritten
+
+        last_id = rows[-1][0]
+        if only is not None:
+            rows = [row for row in rows if only(row[1])]
+
+        results = encryptor.decrypt_many(encrypted for _, encrypted in rows)
+        params = [
+            {'b_id': entry_id, 'b_old': encrypted, 'b_new': encryptor.encrypt(plaintext)}
+            for (entry_id, encrypted), (plaintext, error) in zip(rows, results)
+            if error is None  # Leave unreadable rows untouched
+        ]
+
+        if params:
+            db.execute(rewrite, params)
+        rewritten += len(params)
+
+        if job is not None:
+            job.last_entry_id = max(job.last_entry_id, last_id)
+            job.entries_done += len(params)
+
+        db.commit()  # Batch and checkpoint land together
+
+        if deadline is not None and time.monotonic() >= deadline:
+            return rewritten
+
+
+def _entries_needing_retired_key(db, user_id: int, key_id: int) -> int:
+    """Count entries sealed with vault key key_id, or in the v2 format (no key id recorded)."""
+    table = PasswordEntry.__table__
+    retired_header = V3_HEADER.pack(FORMAT_V3, KDF_NONE, 0, key_id)
+    v2_prefix = ENVELOPE_PREFIX.encode('ascii')
+    return db.execute(
+        select(func.count())
+        .select_from(table)
+        .where(table.c.user_id == user_id)
+        .where(
+            (func.substr(table.c.encrypted_password, 1, len(retired_header)) == retired_header)
+            | (func.substr(table.c.encrypted_password, 1, len(v2_prefix)) == v2_prefix)
+        )
+    ).scalar()
+
+
+def upgrade_password_derived_entries(db, user_id: int, encryptor: PasswordEncryption, time_budget: float,
+                                     batch_size: int = LOGIN_UPGRADE_BATCH_SIZE) -> int:
+    """
+    Rewrite entries that need the master password to decrypt (v1 text and
+    password-derived v3) under the vault key, in the caller's session, for
+    about time_budget seconds.
+
+    Run at login, while the master password is still at hand: sessions only
+    hold the vault keyring, so these entries are unreadable until rewritten.
+    Each one costs a PBKDF2 run, so a large legacy vault would hold the
+    request past the worker timeout; whatever the budget doesn't cover is
+    left to the background job (start_reencryption with the same encryptor,
+    which carries the master password). Commits per batch. Returns number
+    rewritten.
+    """
+    deadline = time.monotonic() + time_budget
+    return _reencrypt_pass(db, user_id, encryptor, 0, batch_size,
+                           only=PasswordEncryption.needs_kdf, deadline=deadline)
+
+
+def reencrypt_entries(user_id: int, encryptor: PasswordEncryption, job_id: int = None,
+                      batch_size: int = REKEY_BATCH_SIZE) -> int:
+    """
+    Rewrite every entry of a user that isn't v3 under encryptor's current key.
+
+    Pass 1 resumes from the job checkpoint (or the start). Pass 2 sweeps from
+    the start again to catch entries written with a retired key behind the
+    cursor while pass 1 was running. A rotation job is marked complete, and
+    its wrapped retired key wiped, only once no entry under the retired key
+    (or in the key-less v2 format) is left; otherwise it stays running.
+
+    Args:
+        user_id: Owner of the entries
+        encryptor: Current vault key, plus a keyring of retired keys and the
+            master password if retired/legacy entries must be read
+        job_id: VaultRekeyJob to checkpoint (None for format upgrades)
+
+    Returns:
+        Number of entries rewritten
+    """
+    db = SessionLocal()
+    try:
+        job = db.get(VaultRekeyJob, job_id) if job_id else None
+        start_id = job.last_entry_id if job else 0
+
+        rewritten = _reencrypt_pass(db, user_id, encryptor, start_id, batch_size, job)
+        rewritten += _reencrypt_pass(db, user_id, encryptor, 0, batch_size, job)
+
+        if job is not None:
+            left = _entries_needing_retired_key(db, user_id, job.from_key_id)
+            if left:
+                # The wrapped retired key is their only way back: keep it and
+                # leave the job running so the next login retries them
+                print(f"⚠️ Rekey job {job.id}: {left} entries still need retired key {job.from_key_id}")
+            else:
+                job.status = 'complete'
+                job.wrapped_old_key = None
+                job.recovery_wrapped_old_key = None
+                db.commit()
+
+        return rewritten
+    finally:
+        db.close()
+
+
+def start_key_rotation(db, user, master_password: str, current_key: bytes):
+    """
+    Switch a user to a fresh vault key and record a rekey job.
+
+    The new key becomes current immediately (new writes use it); the retired key
+    is kept, wrapped under the master password, on the job row until every
+    entry has been re-encrypted. The recovery-key wrap covers the retired key
+    only: it moves to the job (so a reset mid-rotation can re-wrap the retired
+    key) and the user must generate a new recovery key before a reset can
+    unlock the new one.
+
+    Returns:
+        (new_key, job)
+    """
+    wrapper = PasswordEncryption(master_password)
+    new_key = PasswordEncryption.generate_vault_key()
+
+    job = VaultRekeyJob(
+        user_id=user.id,
+        from_key_id=user.vault_key_id,
+        to_key_id=user.vault_key_id + 1,
+        wrapped_old_key=wrapper.wrap_vault_key(current_key),
+        recovery_wrapped_old_key=user.recovery_wrapped_vault_key,
+        last_entry_id=0,
+        entries_done=0,
+        status='running'
+    )
+    user.wrapped_vault_key = wrapper.wrap_vault_key(new_key)
+    user.vault_key_id = job.to_key_id
+    user.recovery_wrapped_vault_key = None
+
+    db.add(job)
+    db.commit()
+    return new_key, job
+
+
+def start_reencryption(user_id: int, encryptor: PasswordEncryption, job_id: int = None):
+    """
+    Run reencrypt_entries in a daemon thread (one run per user at a time).
+
+    A request that arrives while the user's run is in flight is queued and run
+    by that thread when it finishes (the newest encryptor wins; a queued job
+    id is kept), so a rotation started during a login's upgrade isn't dropped.
+    """
+    with _running_lock:
+        if user_id in _running:
+            _, queued_job_id = _pending.get(user_id, (None, None))
+            _pending[user_id] = (encryptor, job_id or queued_job_id)
+            return
+        _running.add(user_id)
+
+    def run(encryptor, job_id):
+        while True:
+            try:
+                count = reencrypt_entries(user_id, encryptor, job_id)
+                if count:
+                    print(f"🔁 Re-encrypted {count} entries under vault key {encryptor.key_id} for user {user_id}")
+            except Exception as e:
+                print(f"⚠️ Vault re-encryption failed for user {user_id}: {e}")
+
+            with _running_lock:
+                if user_id not in _pending:
+                    _running.discard(user_id)
+                    return
+                encryptor, job_id = _pending.pop(user_id)
+
+    threading.Thread(target=run, args=(encryptor, job_id), name=f'vault-reencrypt-{user_id}', daemon=True).start()
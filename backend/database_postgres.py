@@ -1,8 +1,12 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey
+from flask import g
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, LargeBinary, Float, Index, bindparam, event, func, inspect, text, update
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
+from config import Config
+from utils.db_pool import TimedQueuePool, apply_sqlite_pragmas
+from utils import metrics
 
 # Get DATABASE_URL from environment (Render provides this automatically)
 DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -15,40 +19,79 @@ if DATABASE_URL and DATABASE_URL.startswith('postgres://'):
 if not DATABASE_URL:
     DATABASE_URL = 'sqlite:///passwords.db'
 
-engine = create_engine(DATABASE_URL)
+def build_engine(url: str):
+    """Engine with the pool (and, on SQLite, the pragma profile) from Config."""
+    engine = create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=Config.DB_POOL_PRE_PING
+    )
+    if engine.dialect.name == 'sqlite':
+        apply_sqlite_pragmas(engine, Config.sqlite_pragmas())
+    return engine
+
+engine = build_engine(DATABASE_URL)
+metrics.register('db_pool', lambda: engine.pool.stats())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Partial: recovery looks up "the user with a recovery key"
+        Index('ix_users_recovery_key_hash', 'recovery_key_hash',
+              sqlite_where=text('recovery_key_hash IS NOT NULL'),
+              postgresql_where=text('recovery_key_hash IS NOT NULL')),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     master_password_hash = Column(String(255), nullable=False)
     recovery_key_hash = Column(String(255), nullable=True)
+    wrapped_vault_key = Column(LargeBinary, nullable=True)  # Vault key wrapped under master password (v3 blob)
+    vault_key_id = Column(Integer, nullable=False, default=1, server_default='1')  # Bumped on key rotation
+    recovery_wrapped_vault_key = Column(LargeBinary, nullable=True)  # Same vault key wrapped under recovery key
+    vault_version = Column(Integer, nullable=False, default=1, server_default='1')  # Bumped by every entry write (ETag)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     sessions = relationship('Session', back_populates='user', cascade='all, delete-orphan')
     password_entries = relationship('PasswordEntry', back_populates='user', cascade='all, delete-orphan')
+    rekey_jobs = relationship('VaultRekeyJob', back_populates='user', cascade='all, delete-orphan')
 
 class Session(Base):
     __tablename__ = 'sessions'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    session_token = Column(String(255), unique=True, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)  # Logout / revoke all
+    session_token = Column(String(255), unique=True, nullable=False)  # SHA-256 of the cookie token
+    wrapped_vault_key = Column(LargeBinary, nullable=True)  # Vault keyring sealed under the token
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)  # Scanned by the session reaper
     
     user = relationship('User', back_populates='sessions')
 
+# security_level of entries sealed with a vault key that a recovery reset
+# could not carry over: kept, but never decryptable again
+SECURITY_LEVEL_LOST = 'Lost'
+
 class PasswordEntry(Base):
     __tablename__ = 'password_entries'
+    __table_args__ = (
+        Index('ix_password_entries_user_id_id', 'user_id', 'id'),  # Re-encryption keyset batches
+        # Listing pages: one index per sort key, id last as the keyset tie-breaker
+        Index('ix_password_entries_user_id_updated_at_id', 'user_id', 'updated_at', 'id'),
+        Index('ix_password_entries_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        Index('ix_password_entries_user_id_level_updated_at_id', 'user_id', 'security_level', 'updated_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     website = Column(String(255), nullable=False)
     username = Column(String(255), nullable=False)
-    encrypted_password = Column(String(500), nullable=False)
+    encrypted_password = Column(LargeBinary, nullable=False)  # v3 blob: header | iv | ct | tag
     security_level = Column(String(50), default='calm')
     notes = Column(String(1000))
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -56,14 +99,161 @@ class PasswordEntry(Base):
     
     user = relationship('User', back_populates='password_entries')
 
+# Case-insensitive website/username prefix filters and A-Z sorting (expression indexes)
+Index('ix_password_entries_user_id_website_id',
+      PasswordEntry.user_id, func.lower(PasswordEntry.website), PasswordEntry.id)
+Index('ix_password_entries_user_id_username_id',
+      PasswordEntry.user_id, func.lower(PasswordEntry.username), PasswordEntry.id)
+
+# Full-text search over website/username/notes (queried by api/vault_search.py)
+# - PostgreSQL: tsvector column (website weighted A, username B, notes C)
+#   under a GIN index, kept current by a trigger on every insert/update
+#   (a plain column, not GENERATED ... STORED, so adding it to an existing
+#   table needs no rewrite; see migrations/versions/v009_search_index.py)
+# - SQLite: FTS5 table keyed by rowid = entry id, kept in sync by the session
+#   hook below, so every ORM insert/update/delete of an entry updates it
+#   (Core bulk inserts/deletes call index_entries/unindex_entries themselves)
+SEARCH_COLUMNS = ('website', 'username', 'notes')
+SEARCH_INDEX_DDL = {
+    'postgresql': [
+        "ALTER TABLE password_entries ADD COLUMN IF NOT EXISTS search_vector tsvector",
+        "CREATE OR REPLACE FUNCTION password_entries_search_vector() RETURNS trigger AS $$ "
+        "BEGIN NEW.search_vector := "
+        "setweight(to_tsvector('simple', coalesce(NEW.website, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(NEW.username, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(NEW.notes, '')), 'C'); "
+        "RETURN NEW; END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS password_entries_search_vector ON password_entries",
+        "CREATE TRIGGER password_entries_search_vector "
+        "BEFORE INSERT OR UPDATE OF website, username, notes ON password_entries "
+        "FOR EACH ROW EXECUTE FUNCTION password_entries_search_vector()",
+        "CREATE INDEX IF NOT EXISTS ix_password_entries_search_vector "
+        "ON password_entries USING GIN (search_vector)"
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS password_entries_fts "
+        "USING fts5(website, username, notes, prefix='2 3')",
+        "INSERT INTO password_entries_fts (rowid, website, username, notes) "
+        "SELECT id, website, username, coalesce(notes, '') FROM password_entries "
+        "WHERE id NOT IN (SELECT rowid FROM password_entries_fts)"  # Backfill
+    ]
+}
+
+def install_search_index(connection):
+    """Create (or backfill) the dialect's search index; safe to re-run."""
+    for statement in SEARCH_INDEX_DDL.get(connection.dialect.name, []):
+        connection.execute(text(statement))
+
+event.listen(PasswordEntry.__table__, 'after_create',
+             lambda table, connection, **kw: install_search_index(connection))
+
+def index_entries(connection, entries):
+    """
+    Add rows to the search index after a Core/bulk insert (which skips the
+    session hook). entries: dicts with id, website, username, notes.
+    No-op on PostgreSQL, where the trigger has already filled the column.
+    """
+    if connection.dialect.name != 'sqlite' or not entries:
+        return
+    connection.execute(
+        text("INSERT INTO password_entries_fts (rowid, website, username, notes) "
+             "VALUES (:id, :website, :username, :notes)"),
+        [{**{column: entry[column] for column in ('id',) + SEARCH_COLUMNS}, 'notes': entry['notes'] or ''}
+         for entry in entries]
+    )
+
+def unindex_entries(connection, entry_ids):
+    """Drop rows from the search index after a Core/bulk delete (no-op on PostgreSQL)."""
+    if connection.dialect.name != 'sqlite' or not entry_ids:
+        return
+    connection.execute(
+        text("DELETE FROM password_entries_fts WHERE rowid IN :ids").bindparams(bindparam('ids', expanding=True)),
+        {'ids': list(entry_ids)}
+    )
+
+def bump_vault_version(connection, user_id):
+    """
+    Advance the user's vault_version in the caller's transaction, so the new
+    version commits (or rolls back) together with the entry writes it covers.
+    """
+    connection.execute(update(User).where(User.id == user_id).values(vault_version=User.vault_version + 1))
+
+@event.listens_for(SessionLocal, 'after_flush')
+def _sync_search_index(session, flush_context):
+    """
+    Mirror the flush's entry inserts/updates/deletes into the SQLite FTS
+    table: one DELETE and one executemany INSERT per flush, not per row.
+    session.new/dirty/deleted and attribute history still describe the
+    flush at this point.
+    """
+    connection = session.connection()
+    if connection.dialect.name != 'sqlite':
+        return
+
+    changed = [
+        entry for entry in session.dirty
+        if isinstance(entry, PasswordEntry)
+        and any(inspect(entry).attrs[column].history.has_changes() for column in SEARCH_COLUMNS)
+    ]
+    removed = [entry.id for entry in session.deleted if isinstance(entry, PasswordEntry)]
+    unindex_entries(connection, removed + [entry.id for entry in changed])
+
+    added = [entry for entry in session.new if isinstance(entry, PasswordEntry)] + changed
+    index_entries(connection, [{'id': entry.id, 'website': entry.website, 'username': entry.username,
+                                'notes': entry.notes} for entry in added])
+
+class VaultRekeyJob(Base):
+    """Checkpoint of a vault key rotation (entries re-encrypted in id order)."""
+    __tablename__ = 'vault_rekey_jobs'
+    __table_args__ = (
+        Index('ix_vault_rekey_jobs_user_id_status', 'user_id', 'status'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    from_key_id = Column(Integer, nullable=False)
+    to_key_id = Column(Integer, nullable=False)
+    wrapped_old_key = Column(LargeBinary, nullable=True)  # Retired key, wiped when the job completes
+    recovery_wrapped_old_key = Column(LargeBinary, nullable=True)  # Retired key under the recovery key (reset mid-rotation)
+    last_entry_id = Column(Integer, nullable=False, default=0)  # Keyset cursor
+    entries_done = Column(Integer, nullable=False, default=0)
+    status = Column(String(20), nullable=False, default='running')  # running, complete
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    user = relationship('User', back_populates='rekey_jobs')
+
+class RateLimitCounter(Base):
+    """Shared rate-limit counter: attempts for one key in one fixed window."""
+    __tablename__ = 'rate_limit_counters'
+    
+    rate_key = Column(String(255), primary_key=True)
+    window_start = Column(Integer, primary_key=True)  # Unix time, aligned to the window length
+    count = Column(Float, nullable=False, default=0)
+    expires_at = Column(Integer, nullable=False, index=True)  # Unix time after which the row can't count
+
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
 
 def get_db():
-    """Get database session"""
-    db = SessionLocal()
+    """
+    Database session for the current request (created on first use).
+
+    close_db() closes it when the app context tears down, on every path,
+    so routes never close it themselves.
+    """
+    if 'db' not in g:
+        g.db = SessionLocal()
+    return g.db
+
+def close_db(exception=None):
+    """teardown_appcontext hook: roll back on an unhandled error, always close."""
+    db = g.pop('db', None)
+    if db is None:
+        return
     try:
-        yield db
+        if exception is not None:
+            db.rollback()
     finally:
         db.close()
@@ -0,0 +1,120 @@
+"""
+Run EXPLAIN on the app's hot queries and flag full-table scans.
+
+Usage:
+    python index_advisor.py
+
+Works on SQLite (EXPLAIN QUERY PLAN) and PostgreSQL (EXPLAIN with
+enable_seqscan off, so a Seq Scan means no index can serve the query even
+on a small table). Exits 1 if any query scans, so it can gate CI.
+"""
+import sys
+from datetime import datetime
+from sqlalchemy import select, delete, func
+from api.vault_query import ListingQuery
+from database_postgres import engine, User, Session, PasswordEntry, VaultRekeyJob, RateLimitCounter
+
+USER_ID = 1
+
+
+def listing_pages():
+    """A second page of the vault listing for each indexed sort/filter combination."""
+    combos = [
+        ('recently updated', ListingQuery(limit=50)),
+        ('oldest first', ListingQuery(sort='created_at', limit=50)),
+        ('by security level', ListingQuery(security_level='Alert', limit=50)),
+        ('website prefix A-Z', ListingQuery(sort='website', website='git', limit=50)),
+        ('username prefix A-Z', ListingQuery(sort='username', username='ali', limit=50)),
+    ]
+    pages = []
+    for name, listing in combos:
+        first = listing.apply(select(PasswordEntry.id).where(PasswordEntry.user_id == USER_ID))
+        listing.after = ('x' if listing.sort_key in ('website', 'username') else datetime(2026, 1, 1), 1)
+        second = listing.apply(select(PasswordEntry.id).where(PasswordEntry.user_id == USER_ID))
+        pages += [(f'vault listing: {name}', first), (f'vault listing: {name}, next page', second)]
+    return pages
+
+
+def hot_queries():
+    """(name, statement) for each query the routes and background jobs run."""
+    now = datetime.utcnow()
+    return [
+        ('vault listing', select(PasswordEntry).where(PasswordEntry.user_id == USER_ID).order_by(PasswordEntry.id)),
+        *listing_pages(),
+        ('entry lookup', select(PasswordEntry).where(PasswordEntry.id == 1, PasswordEntry.user_id == USER_ID)),
+        ('re-encryption batch', select(PasswordEntry.id, PasswordEntry.encrypted_password)
+            .where(PasswordEntry.user_id == USER_ID, PasswordEntry.id > 0,
+                   func.substr(PasswordEntry.encrypted_password, 1, 10) != b'\x03\x00')
+            .order_by(PasswordEntry.id).limit(200)),
+        ('session lookup', select(Session.user_id, Session.expires_at).where(Session.session_token == 'x')),
+        ('logout / revoke user sessions', delete(Session).where(Session.user_id == USER_ID)),
+        ('expired-session reaper', delete(Session).where(Session.id.in_(
+            select(Session.id).where(Session.expires_at < now).order_by(Session.expires_at).limit(500).scalar_subquery()
+        ))),
+        ('recovery user lookup', select(User).where(User.recovery_key_hash.isnot(None)).limit(1)),
+        ('running rekey job', select(VaultRekeyJob).where(VaultRekeyJob.user_id == USER_ID, VaultRekeyJob.status == 'running')),
+        ('rate limit counts', select(RateLimitCounter.window_start, RateLimitCounter.count)
+            .where(RateLimitCounter.rate_key == 'login:1', RateLimitCounter.window_start.in_((0, 900)))),
+        ('rate limit sweep', delete(RateLimitCounter).where(RateLimitCounter.expires_at < 0)),
+    ]
+
+
+def explain(conn, statement):
+    """Return the plan as a list of lines."""
+    compiled = statement.compile(dialect=engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.construct_params()
+    if compiled.positiontup:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    if engine.dialect.name == 'postgresql':
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        rows = conn.exec_driver_sql(f"EXPLAIN {compiled}", params).all()
+        return [row[0] for row in rows]
+
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return [row[-1] for row in rows]
+
+
+def scans(plan):
+    """Plan lines that read a whole table (or sort what an index could order)."""
+    flagged = []
+    for line in plan:
+        text = line.strip()
+        if 'Seq Scan' in text:
+            flagged.append(text)
+        elif text.startswith('SCAN ') and 'USING' not in text:
+            flagged.append(text)
+        elif 'USE TEMP B-TREE' in text:
+            flagged.append(text)  # Sorting rows an index could return in order
+    return flagged
+
+
+def advise():
+    problems = 0
+    with engine.connect() as conn:
+        for name, statement in hot_queries():
+            transaction = conn.begin()
+            try:
+                plan = explain(conn, statement)
+            finally:
+                transaction.rollback()  # EXPLAIN only; also drops SET LOCAL
+
+            flagged = scans(plan)
+            problems += bool(flagged)
+            print(f"{'⚠️ ' if flagged else '✅'} {name}")
+            for line in plan:
+                print(f"      {line}")
+    return problems
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print(f"INDEX ADVISOR ({engine.dialect.name})")
+    print("=" * 70 + "\n")
+
+    problems = advise()
+    print()
+    if problems:
+        print(f"⚠️ {problems} queries scan a full table - add an index or run the latest migrations")
+        sys.exit(1)
+    print("✅ Every hot query uses an index")
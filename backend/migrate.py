@@ -0,0 +1,34 @@
+"""
+Upgrade the database schema to the version the code expects.
+
+Usage:
+    python migrate.py              # apply pending migrations
+    python migrate.py status       # show current and latest version
+    python migrate.py --target 4   # stop at a given version
+
+Works on both SQLite and PostgreSQL (DATABASE_URL). Run it before starting
+the app after each deploy; app.py refuses to start on an old schema.
+"""
+import argparse
+from migrations.runner import upgrade, current_version, load_migrations
+
+
+def status():
+    current = current_version()
+    print(f"📋 Current version: {'empty database' if current is None else current}")
+    for migration in load_migrations():
+        applied = current is not None and migration.version <= current
+        print(f"   {'✅' if applied else '⏳'} v{migration.version:03d} {migration.name}: {migration.description}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='BinO-Vault schema migrations')
+    parser.add_argument('command', nargs='?', choices=('upgrade', 'status'), default='upgrade')
+    parser.add_argument('--target', type=int, default=None, help='Version to stop at (default: latest)')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        status()
+    else:
+        version = upgrade(target=args.target)
+        print(f"✅ Database at version {version}")
@@ -0,0 +1,252 @@
+"""
+Versioned, dialect-aware schema migrations on the app's SQLAlchemy engine.
+
+- Each migration is a module in migrations/versions named vNNN_<name>.py with
+  a docstring and an upgrade(ctx) function; NNN is its schema version
+- Applied versions are recorded in schema_migrations
+- A fresh database is created from the models (create_all) and stamped with
+  the latest version; an existing database without schema_migrations is
+  treated as version 0 (the pre-migration scripts era)
+- Steps are written to be re-runnable (add_column/create_table skip what
+  exists), because backfills commit per batch and can be interrupted
+- Each migration freezes the tables, indexes and DDL it creates in its own
+  file; it never imports the live models, so editing a model later can't
+  change what an old version does
+- On PostgreSQL indexes are built and dropped CONCURRENTLY, outside any
+  transaction, so writes to the table carry on while they build
+- app.py only checks the version; run `python migrate.py` to upgrade
+"""
+import importlib
+import pkgutil
+import re
+from datetime import datetime
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, inspect, select, insert, text, func
+from database_postgres import engine as app_engine, Base
+
+BACKFILL_BATCH_SIZE = 1000
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(255), nullable=False),
+    Column('applied_at', DateTime, nullable=False, default=datetime.utcnow)
+)
+
+
+class SchemaOutOfDateError(Exception):
+    """Raised at startup when the database is behind the code."""
+
+    def __init__(self, current: int, latest: int):
+        super().__init__(f'Database schema is at version {current}, code expects {latest}')
+        self.current = current
+        self.latest = latest
+
+
+class Migration:
+    def __init__(self, version: int, name: str, module):
+        self.version = version
+        self.name = name
+        self.description = (module.__doc__ or name).strip().splitlines()[0]
+        self.upgrade = module.upgrade
+
+
+def load_migrations():
+    """All migrations in version order."""
+    from migrations import versions
+
+    found = []
+    for info in pkgutil.iter_modules(versions.__path__):
+        match = re.match(r'v(\d+)_(\w+)$', info.name)
+        if match:
+            module = importlib.import_module(f'migrations.versions.{info.name}')
+            found.append(Migration(int(match.group(1)), match.group(2), module))
+
+    found.sort(key=lambda migration: migration.version)
+    versions_seen = [migration.version for migration in found]
+    if len(set(versions_seen)) != len(versions_seen):
+        raise RuntimeError(f'Duplicate migration versions: {versions_seen}')
+    return found
+
+
+def latest_version() -> int:
+    migrations = load_migrations()
+    return migrations[-1].version if migrations else 0
+
+
+class MigrationContext:
+    """Dialect-aware helpers handed to each migration's upgrade()."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.binary_type = 'BYTEA' if self.dialect == 'postgresql' else 'BLOB'
+
+    def columns(self, table: str) -> dict:
+        """{name: column info} for an existing table ({} if missing)."""
+        inspector = inspect(self.engine)
+        if table not in inspector.get_table_names():
+            return {}
+        return {col['name']: col for col in inspector.get_columns(table)}
+
+    def has_table(self, table: str) -> bool:
+        return table in inspect(self.engine).get_table_names()
+
+    def add_column(self, table: str, name: str, ddl: str) -> bool:
+        """ALTER TABLE ... ADD COLUMN unless it exists. Returns True if added."""
+        if name in self.columns(table):
+            print(f"   ⚠️ {table}.{name} already exists - skipping")
+            return False
+        with self.engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+        print(f"   ✅ {table}.{name} added")
+        return True
+
+    def create_table(self, table: Table) -> bool:
+        """Create a migration's frozen Table (with its indexes) unless it exists."""
+        if self.has_table(table.name):
+            return False
+        table.create(bind=self.engine)
+        print(f"   ✅ {table.name} table created")
+        return True
+
+    def _autocommit(self):
+        """Connection outside any transaction (CREATE/DROP INDEX CONCURRENTLY refuse to run in one)."""
+        return self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+
+    def create_indexes(self, table: Table):
+        """
+        Create any of a migration's frozen Table's indexes that are missing.
+
+        On PostgreSQL each is built CONCURRENTLY (no lock blocking writes);
+        an invalid index left by an interrupted build is dropped and rebuilt.
+        """
+        indexes = sorted(table.indexes, key=lambda index: index.name)
+        if self.dialect != 'postgresql':
+            # IF NOT EXISTS rather than checkfirst: reflection skips expression indexes
+            with self.engine.begin() as conn:
+                for index in indexes:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+        else:
+            with self._autocommit() as conn:
+                invalid = set(conn.execute(text(
+                    "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE NOT i.indisvalid"
+                )).scalars())
+                for index in indexes:
+                    if index.name in invalid:
+                        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+                    index.dialect_options['postgresql']['concurrently'] = True
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+        print(f"   ✅ {table.name} indexes ready")
+
+    def drop_index(self, name: str):
+        """DROP INDEX IF EXISTS (CONCURRENTLY on PostgreSQL)."""
+        if self.dialect != 'postgresql':
+            self.execute(f"DROP INDEX IF EXISTS {name}")
+            return
+        with self._autocommit() as conn:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+    def execute(self, sql: str, params: dict = None):
+        with self.engine.begin() as conn:
+            return conn.execute(text(sql), params or {})
+
+    def _id_ranges(self, table: str, batch_size: int):
+        with self.engine.connect() as conn:
+            low, high = conn.execute(text(f"SELECT MIN(id), MAX(id) FROM {table}")).one()
+        if low is None:
+            return []
+        return [(start, start + batch_size) for start in range(low - 1, high, batch_size)]
+
+    def _batched(self, table: str, sql: str, params: dict, batch_size: int) -> int:
+        changed = 0
+        for start, end in self._id_ranges(table, batch_size):
+            with self.engine.begin() as conn:
+                changed += conn.execute(text(sql), {**params, 'start': start, 'end': end}).rowcount
+        return changed
+
+    def backfill(self, table: str, set_sql: str, where_sql: str = '1=1',
+                 params: dict = None, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+        """
+        Online backfill: run the UPDATE over primary-key ranges of batch_size,
+        one short transaction per range, so a large table is never locked by a
+        single long statement. Keep where_sql idempotent (e.g. "col IS NULL")
+        so an interrupted backfill can simply be run again.
+
+        Returns:
+            Rows updated
+        """
+        sql = f"UPDATE {table} SET {set_sql} WHERE id > :start AND id <= :end AND ({where_sql})"
+        return self._batched(table, sql, params or {}, batch_size)
+
+    def delete_batched(self, table: str, where_sql: str = '1=1',
+                       params: dict = None, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+        """DELETE matching rows in primary-key ranges (see backfill). Returns rows deleted."""
+        sql = f"DELETE FROM {table} WHERE id > :start AND id <= :end AND ({where_sql})"
+        return self._batched(table, sql, params or {}, batch_size)
+
+
+def current_version(engine=None):
+    """Highest applied version, 0 for a pre-migration database, None for an empty one."""
+    engine = engine or app_engine
+    tables = inspect(engine).get_table_names()
+    if 'schema_migrations' not in tables:
+        return 0 if 'users' in tables else None
+    with engine.connect() as conn:
+        return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def _stamp(engine, migration):
+    with engine.begin() as conn:
+        conn.execute(insert(schema_migrations).values(
+            version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+        ))
+
+
+def upgrade(engine=None, target: int = None) -> int:
+    """
+    Apply pending migrations up to target (default: latest).
+
+    An empty database is created at the latest version regardless of target.
+
+    Returns:
+        Version the database is at afterwards
+    """
+    engine = engine or app_engine
+    migrations = load_migrations()
+    latest = migrations[-1].version if migrations else 0
+    target = latest if target is None else target
+    version = current_version(engine)
+
+    if version is None:
+        # Empty database: build the current schema directly and stamp every version
+        Base.metadata.create_all(bind=engine)
+        _metadata.create_all(bind=engine)
+        for migration in migrations:
+            _stamp(engine, migration)
+        print(f"✅ Created schema at version {latest}")
+        return latest
+
+    _metadata.create_all(bind=engine)
+    ctx = MigrationContext(engine)
+    for migration in migrations:
+        if version < migration.version <= target:
+            print(f"🔧 v{migration.version:03d} {migration.name}: {migration.description}")
+            migration.upgrade(ctx)
+            _stamp(engine, migration)
+            version = migration.version
+    return version
+
+
+def check_schema(engine=None):
+    """
+    Raises:
+        SchemaOutOfDateError: Pending migrations (or an empty database)
+    """
+    current = current_version(engine) or 0
+    latest = latest_version()
+    if current < latest:
+        raise SchemaOutOfDateError(current, latest)
+    return current
@@ -0,0 +1,29 @@
+"""Recovery key hash, session expiry and the password_entries table (day-15 scripts)."""
+from datetime import datetime, timedelta
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, LargeBinary, ForeignKey
+
+# Frozen as of this version (indexes come in v007); never import the live models here
+metadata = MetaData()
+Table('users', metadata, Column('id', Integer, primary_key=True))
+password_entries = Table(
+    'password_entries', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('website', String(255), nullable=False),
+    Column('username', String(255), nullable=False),
+    Column('encrypted_password', LargeBinary, nullable=False),
+    Column('security_level', String(50)),
+    Column('notes', String(1000)),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime)
+)
+
+
+def upgrade(ctx):
+    ctx.add_column('users', 'recovery_key_hash', 'VARCHAR(255)')
+
+    if ctx.add_column('sessions', 'expires_at', 'TIMESTAMP'):
+        ctx.backfill('sessions', 'expires_at = :expiry', 'expires_at IS NULL',
+                     params={'expiry': datetime.utcnow() + timedelta(hours=24)})
+
+    ctx.create_table(password_entries)
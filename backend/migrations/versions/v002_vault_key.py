@@ -0,0 +1,5 @@
+"""users.wrapped_vault_key (envelope encryption; entries re-encrypted at next login)."""
+
+
+def upgrade(ctx):
+    ctx.add_column('users', 'wrapped_vault_key', ctx.binary_type)
@@ -0,0 +1,58 @@
+"""Store ciphertexts as raw bytes instead of base64 text.
+
+- SQLite: column types aren't enforced, so text values are cast to BLOB in
+  batched updates
+- PostgreSQL: expand/contract instead of ALTER COLUMN ... TYPE (which
+  rewrites and locks the whole table): add a BYTEA column, backfill it in
+  batches, then swap the columns in one short transaction
+
+Old text blobs stay readable (decryption dispatches on the format version).
+"""
+
+BINARY_COLUMNS = [
+    ('password_entries', 'encrypted_password', 'NOT NULL'),
+    ('users', 'wrapped_vault_key', ''),
+]
+
+
+def _sqlite(ctx, table, column):
+    converted = ctx.backfill(table, f"{column} = CAST({column} AS BLOB)", f"typeof({column}) = 'text'")
+    print(f"   ✅ {table}.{column}: {converted} rows converted")
+
+
+def _postgresql(ctx, table, column, constraint):
+    staging = f"{column}_bin"
+    ctx.add_column(table, staging, 'BYTEA')
+    ctx.backfill(table, f"{staging} = convert_to({column}, 'UTF8')",
+                 f"{staging} IS NULL AND {column} IS NOT NULL")
+
+    # Catch rows written during the backfill, then swap (short lock)
+    statements = [
+        f"UPDATE {table} SET {staging} = convert_to({column}, 'UTF8') "
+        f"WHERE {staging} IS NULL AND {column} IS NOT NULL",
+        f"ALTER TABLE {table} DROP COLUMN {column}",
+        f"ALTER TABLE {table} RENAME COLUMN {staging} TO {column}",
+    ]
+    if constraint:
+        statements.append(f"ALTER TABLE {table} ALTER COLUMN {column} SET {constraint}")
+    with ctx.engine.begin() as conn:
+        conn.exec_driver_sql(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+    print(f"   ✅ {table}.{column} is BYTEA")
+
+
+def upgrade(ctx):
+    for table, column, constraint in BINARY_COLUMNS:
+        columns = ctx.columns(table)
+        if column not in columns:
+            print(f"   ⚠️ {table}.{column} not found - skipping")
+            continue
+
+        if ctx.dialect == 'postgresql':
+            if columns[column]['type'].python_type is bytes:
+                print(f"   ⚠️ {table}.{column} already BYTEA - skipping")
+                continue
+            _postgresql(ctx, table, column, constraint)
+        else:
+            _sqlite(ctx, table, column)
@@ -0,0 +1,25 @@
+"""Key rotation: users.vault_key_id, users.recovery_wrapped_vault_key, vault_rekey_jobs."""
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, LargeBinary, ForeignKey
+
+# Frozen as of this version (indexes come in v007); never import the live models here
+metadata = MetaData()
+Table('users', metadata, Column('id', Integer, primary_key=True))
+vault_rekey_jobs = Table(
+    'vault_rekey_jobs', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('from_key_id', Integer, nullable=False),
+    Column('to_key_id', Integer, nullable=False),
+    Column('wrapped_old_key', LargeBinary),
+    Column('last_entry_id', Integer, nullable=False),
+    Column('entries_done', Integer, nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime)
+)
+
+
+def upgrade(ctx):
+    ctx.add_column('users', 'vault_key_id', 'INTEGER NOT NULL DEFAULT 1')
+    ctx.add_column('users', 'recovery_wrapped_vault_key', ctx.binary_type)
+    ctx.create_table(vault_rekey_jobs)
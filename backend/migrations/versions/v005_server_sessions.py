@@ -0,0 +1,10 @@
+"""Server-side sessions: sessions.wrapped_vault_key; old raw-token sessions are dropped."""
+
+
+def upgrade(ctx):
+    if ctx.add_column('sessions', 'wrapped_vault_key', ctx.binary_type):
+        deleted = ctx.delete_batched('sessions')
+        print(f"   🧹 Removed {deleted} old sessions (everyone logs in once more)")
+
+    # Tokens are looked up by hash; tables from the sqlite scripts lack the unique index
+    ctx.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_sessions_session_token ON sessions (session_token)")
@@ -0,0 +1,17 @@
+"""Shared rate-limit counters (cross-worker login and route budgets)."""
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, Index
+
+# Frozen as of this version; never import the live models here
+metadata = MetaData()
+rate_limit_counters = Table(
+    'rate_limit_counters', metadata,
+    Column('rate_key', String(255), primary_key=True),
+    Column('window_start', Integer, primary_key=True),
+    Column('count', Float, nullable=False),
+    Column('expires_at', Integer, nullable=False),
+    Index('ix_rate_limit_counters_expires_at', 'expires_at')
+)
+
+
+def upgrade(ctx):
+    ctx.create_table(rate_limit_counters)
@@ -0,0 +1,33 @@
+"""Secondary indexes for the hot query paths (check with index_advisor.py)."""
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, Index, text
+
+# Frozen as of this version: only the indexed columns; never import the live models here
+metadata = MetaData()
+TABLES = [
+    Table('users', metadata,
+          Column('recovery_key_hash', String(255)),
+          # Partial: recovery looks up "the user with a recovery key"
+          Index('ix_users_recovery_key_hash', 'recovery_key_hash',
+                sqlite_where=text('recovery_key_hash IS NOT NULL'),
+                postgresql_where=text('recovery_key_hash IS NOT NULL'))),
+    Table('sessions', metadata,
+          Column('user_id', Integer),
+          Column('expires_at', DateTime),
+          Index('ix_sessions_user_id', 'user_id'),
+          Index('ix_sessions_expires_at', 'expires_at')),
+    Table('password_entries', metadata,
+          Column('id', Integer),
+          Column('user_id', Integer),
+          Column('updated_at', DateTime),
+          Index('ix_password_entries_user_id_id', 'user_id', 'id'),
+          Index('ix_password_entries_user_id_updated_at', 'user_id', 'updated_at')),
+    Table('vault_rekey_jobs', metadata,
+          Column('user_id', Integer),
+          Column('status', String(20)),
+          Index('ix_vault_rekey_jobs_user_id_status', 'user_id', 'status')),
+]
+
+
+def upgrade(ctx):
+    for table in TABLES:
+        ctx.create_indexes(table)
@@ -0,0 +1,30 @@
+"""Per-sort-key indexes for the keyset-paginated vault listing."""
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, Index, func
+
+# Frozen as of this version: only the indexed columns; never import the live models here
+metadata = MetaData()
+password_entries = Table(
+    'password_entries', metadata,
+    Column('id', Integer),
+    Column('user_id', Integer),
+    Column('website', String(255)),
+    Column('username', String(255)),
+    Column('security_level', String(50)),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime)
+)
+columns = password_entries.c
+# Listing pages: one index per sort key, id last as the keyset tie-breaker
+Index('ix_password_entries_user_id_updated_at_id', columns.user_id, columns.updated_at, columns.id)
+Index('ix_password_entries_user_id_created_at_id', columns.user_id, columns.created_at, columns.id)
+Index('ix_password_entries_user_id_level_updated_at_id',
+      columns.user_id, columns.security_level, columns.updated_at, columns.id)
+# Case-insensitive website/username prefix filters and A-Z sorting (expression indexes)
+Index('ix_password_entries_user_id_website_id', columns.user_id, func.lower(columns.website), columns.id)
+Index('ix_password_entries_user_id_username_id', columns.user_id, func.lower(columns.username), columns.id)
+
+
+def upgrade(ctx):
+    ctx.create_indexes(password_entries)
+    # Superseded by ix_password_entries_user_id_updated_at_id
+    ctx.drop_index('ix_password_entries_user_id_updated_at')
@@ -0,0 +1,56 @@
+"""Full-text search index over website/username/notes (FTS5 / tsvector)."""
+from sqlalchemy import MetaData, Table, Column, Integer, Index, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+# Frozen as of this version; never import the live search index DDL here
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(website, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(username, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(notes, '')), 'C')"
+)
+SEARCH_TRIGGER_DDL = [
+    "CREATE OR REPLACE FUNCTION password_entries_search_vector() RETURNS trigger AS $$ "
+    "BEGIN NEW.search_vector := "
+    "setweight(to_tsvector('simple', coalesce(NEW.website, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(NEW.username, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(NEW.notes, '')), 'C'); "
+    "RETURN NEW; END $$ LANGUAGE plpgsql",
+    "DROP TRIGGER IF EXISTS password_entries_search_vector ON password_entries",
+    "CREATE TRIGGER password_entries_search_vector "
+    "BEFORE INSERT OR UPDATE OF website, username, notes ON password_entries "
+    "FOR EACH ROW EXECUTE FUNCTION password_entries_search_vector()"
+]
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS password_entries_fts "
+    "USING fts5(website, username, notes, prefix='2 3')",
+    "INSERT INTO password_entries_fts (rowid, website, username, notes) "
+    "SELECT id, website, username, coalesce(notes, '') FROM password_entries "
+    "WHERE id NOT IN (SELECT rowid FROM password_entries_fts)"  # Backfill
+]
+
+metadata = MetaData()
+password_entries = Table(
+    'password_entries', metadata,
+    Column('id', Integer),
+    Column('search_vector', TSVECTOR),
+    Index('ix_password_entries_search_vector', 'search_vector', postgresql_using='gin')
+)
+
+
+def upgrade(ctx):
+    if ctx.dialect == 'sqlite':
+        # SQLite backfills the FTS5 table from existing rows
+        with ctx.engine.begin() as conn:
+            for statement in SQLITE_DDL:
+                conn.execute(text(statement))
+    elif ctx.dialect == 'postgresql':
+        # A plain nullable column (no table rewrite, unlike a STORED generated
+        # one); the trigger keeps new writes current while the batched
+        # backfill fills existing rows, then the GIN index builds concurrently
+        ctx.add_column('password_entries', 'search_vector', 'tsvector')
+        with ctx.engine.begin() as conn:
+            for statement in SEARCH_TRIGGER_DDL:
+                conn.execute(text(statement))
+        ctx.backfill('password_entries', f"search_vector = {SEARCH_VECTOR}", "search_vector IS NULL")
+        ctx.create_indexes(password_entries)
+    print("   ✅ password_entries search index ready")
@@ -0,0 +1,5 @@
+"""users.vault_version (ETag for conditional GETs on the vault listing)."""
+
+
+def upgrade(ctx):
+    ctx.add_column('users', 'vault_version', 'INTEGER NOT NULL DEFAULT 1')
@@ -0,0 +1,5 @@
+"""vault_rekey_jobs.recovery_wrapped_old_key (password reset during a key rotation)."""
+
+
+def upgrade(ctx):
+    ctx.add_column('vault_rekey_jobs', 'recovery_wrapped_old_key', ctx.binary_type)
@@ -0,0 +1,118 @@
+"""Test script for Argon2 memory admission control"""
+import multiprocessing
+import tempfile
+import threading
+import time
+import pytest
+from auth.admission import AdmissionTimeout, HostAdmissionController, MemoryAdmissionController, fcntl
+
+def make_controllers():
+    """Both controllers with room for two 64 MiB reservations"""
+    controllers = [MemoryAdmissionController(budget_kib=2 * 65536, timeout=1)]
+    if fcntl is not None:
+        controllers.append(HostAdmissionController(budget_kib=2 * 65536, slot_kib=65536,
+                                                   lock_dir=tempfile.mkdtemp(), timeout=1))
+    return controllers
+
+@pytest.mark.parametrize('controller', make_controllers(), ids=lambda c: type(c).__name__)
+def test_blocks_until_release(controller):
+    """Test a reservation over budget waits, and is admitted once memory is released"""
+    admitted = threading.Event()
+    with controller.reserve(65536), controller.reserve(65536):
+        def third():
+            with controller.reserve(65536, timeout=5):
+                admitted.set()
+        waiter = threading.Thread(target=third)
+        waiter.start()
+        time.sleep(0.1)
+        assert not admitted.is_set()  # Budget full: still waiting
+        assert controller.stats()['waiting'] == 1
+    waiter.join(5)
+    assert admitted.is_set()
+
+    stats = controller.stats()
+    assert (stats['admitted'], stats['in_use_kib'], stats['peak_kib']) == (3, 0, 2 * 65536)
+    print(f"✅ {type(controller).__name__}: blocked while full, admitted after release")
+
+@pytest.mark.parametrize('controller', make_controllers(), ids=lambda c: type(c).__name__)
+def test_timeout_and_oversize(controller):
+    """Test AdmissionTimeout when the budget stays full; an oversize request runs alone"""
+    with controller.reserve(65536):
+        start = time.monotonic()
+        with pytest.raises(AdmissionTimeout):
+            with controller.reserve(2 * 65536, timeout=0.1):
+                pass
+        assert 0.1 <= time.monotonic() - start < 1
+    assert controller.stats()['timeouts'] == 1
+
+    with controller.reserve(10 * 65536):  # Bigger than the budget: takes all of it
+        with pytest.raises(AdmissionTimeout):
+            with controller.reserve(1, timeout=0.05):
+                pass
+    with controller.reserve(2 * 65536, timeout=0):  # Everything was released
+        pass
+    print(f"✅ {type(controller).__name__}: timeout, oversize and release")
+
+def hold_budget(lock_dir, held, release):
+    controller = HostAdmissionController(budget_kib=2 * 65536, slot_kib=65536, lock_dir=lock_dir)
+    with controller.reserve(2 * 65536):
+        held.set()
+        release.wait(5)
+
+@pytest.mark.skipif(fcntl is None, reason='flock not available')
+def test_budget_is_shared_across_processes():
+    """Test another process holding the budget blocks this one (one cap per host)"""
+    lock_dir = tempfile.mkdtemp()
+    held, release = multiprocessing.Event(), multiprocessing.Event()
+    worker = multiprocessing.Process(target=hold_budget, args=(lock_dir, held, release))
+    worker.start()
+    try:
+        assert held.wait(5)
+        controller = HostAdmissionController(budget_kib=2 * 65536, slot_kib=65536, lock_dir=lock_dir)
+        with pytest.raises(AdmissionTimeout):
+            with controller.reserve(65536, timeout=0.1):
+                pass
+        release.set()
+        with controller.reserve(2 * 65536, timeout=5):
+            pass
+    finally:
+        release.set()
+        worker.join(5)
+    print("✅ Budget held in another worker process blocks this one")
+
+@pytest.mark.skipif(fcntl is None, reason='flock not available')
+def test_crashed_holder_frees_its_slots():
+    """Test the kernel releases a killed worker's reservation"""
+    lock_dir = tempfile.mkdtemp()
+    held, release = multiprocessing.Event(), multiprocessing.Event()
+    worker = multiprocessing.Process(target=hold_budget, args=(lock_dir, held, release))
+    worker.start()
+    assert held.wait(5)
+    worker.kill()
+    worker.join(5)
+
+    controller = HostAdmissionController(budget_kib=2 * 65536, slot_kib=65536, lock_dir=lock_dir)
+    with controller.reserve(2 * 65536, timeout=1):
+        pass
+    print("✅ A killed worker leaks no budget")
+
+@pytest.mark.skipif(fcntl is None, reason='flock not available')
+def test_forked_child_does_not_keep_slots():
+    """Test a process forked mid-reservation (e.g. the hashing pool) doesn't pin the parent's slots"""
+    if multiprocessing.get_start_method() != 'fork':
+        pytest.skip('fork start method only')
+    controller = HostAdmissionController(budget_kib=65536, slot_kib=65536, lock_dir=tempfile.mkdtemp())
+    release = multiprocessing.Event()
+    with controller.reserve(65536):
+        child = multiprocessing.Process(target=release.wait, args=(5,))
+        child.start()
+    try:
+        with controller.reserve(65536, timeout=1):  # Child is still alive
+            pass
+    finally:
+        release.set()
+        child.join(5)
+    print("✅ Forked children close inherited slot locks")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
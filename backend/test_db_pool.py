@@ -0,0 +1,32 @@
+"""Test script for the instrumented connection pool and SQLite pragmas"""
+import os
+import tempfile
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from config import Config
+from utils.db_pool import TimedQueuePool, apply_sqlite_pragmas
+
+def test_pool_metrics_and_pragmas():
+    """Test that checkouts, timeouts and occupancy are counted and WAL is on"""
+    engine = create_engine(
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'pool.db'),
+        poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.1
+    )
+    apply_sqlite_pragmas(engine, Config.sqlite_pragmas())
+    
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == 'wal'
+        assert engine.pool.stats()['checked_out'] == 1
+        try:
+            engine.connect()
+            assert False, "pool should be exhausted"
+        except PoolTimeoutError:
+            pass
+    
+    stats = engine.pool.stats()
+    assert stats['checked_out'] == 0 and stats['peak_checked_out'] == 1
+    assert stats['checkouts'] == 1 and stats['timeouts'] == 1
+    print(f"✅ Pool stats: {stats}")
+
+if __name__ == "__main__":
+    test_pool_metrics_and_pragmas()
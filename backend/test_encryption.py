@@ -1,5 +1,10 @@
 """Test script for encryption module"""
-from crypto.encryption import PasswordEncryption
+import base64
+import os
+from crypto.encryption import (
+    PasswordEncryption, DECRYPTION_FAILED, FORMAT_UNKNOWN, FORMAT_V1_LEGACY, FORMAT_V2_ENVELOPE, FORMAT_V3,
+    KDF_NONE, V3_HEADER
+)
 
 def test_encryption_round_trip():
     """Test that encryption and decryption work correctly"""
@@ -60,6 +65,111 @@ def test_wrong_password():
     print("✅ WRONG PASSWORD TEST PASSED!")
     print("="*70)
 
+def test_vault_key_envelope():
+    """Test that entries sealed with the vault key need no KDF and survive a re-wrap"""
+    master_password = "MyPassword123"
+    vault_key = PasswordEncryption.generate_vault_key()
+    
+    wrapped = PasswordEncryption(master_password).wrap_vault_key(vault_key)
+    unwrapped = PasswordEncryption(master_password).unwrap_vault_key(wrapped)
+    assert unwrapped == vault_key
+    
+    encryptor = PasswordEncryption(vault_key=unwrapped)
+    encrypted = encryptor.encrypt("SuperSecret@2026")
+    assert not PasswordEncryption.is_legacy(encrypted)
+    assert encryptor.decrypt(encrypted) == "SuperSecret@2026"
+    
+    # Wrong master password can't unwrap the vault key
+    try:
+        PasswordEncryption("WrongPassword").unwrap_vault_key(wrapped)
+        assert False, "Unwrap should have failed"
+    except AssertionError:
+        raise
+    except Exception:
+        pass
+    print("✅ Vault key envelope test passed")
+
+def make_v1_blob(master_password, plaintext):
+    """Build a pre-envelope blob: base64(salt + iv + ciphertext + tag)"""
+    salt = os.urandom(16)
+    encryptor = PasswordEncryption(master_password)
+    key = encryptor._derive_key(salt)
+    return base64.b64encode(salt + encryptor._seal(key, plaintext.encode('utf-8'))).decode('utf-8')
+
+def test_legacy_entries_still_decrypt():
+    """Test that v1 text, v2 text and v3 binary blobs all decrypt side by side"""
+    master_password = "MyPassword123"
+    vault_key = PasswordEncryption.generate_vault_key()
+    encryptor = PasswordEncryption(master_password, vault_key=vault_key)
+    
+    v1 = make_v1_blob(master_password, "OldSecret")
+    v2 = 'v2:' + base64.b64encode(PasswordEncryption._seal(vault_key, b"MidSecret")).decode('utf-8')
+    v3 = encryptor.encrypt("NewSecret")
+    
+    assert PasswordEncryption.blob_format(v1) == FORMAT_V1_LEGACY
+    assert PasswordEncryption.blob_format(v2.encode('ascii')) == FORMAT_V2_ENVELOPE
+    assert PasswordEncryption.blob_format(v3) == FORMAT_V3
+    assert PasswordEncryption.is_legacy(v1) and not PasswordEncryption.is_legacy(v3)
+    
+    assert encryptor.decrypt(v1) == "OldSecret"
+    assert encryptor.decrypt(v1.encode('ascii')) == "OldSecret"  # Text stored in a binary column
+    assert encryptor.decrypt(v2) == "MidSecret"
+    assert encryptor.decrypt(v3) == "NewSecret"
+    print("✅ Legacy compatibility test passed")
+
+def test_v3_header_is_authenticated():
+    """Test that the v3 header records KDF/key id and can't be altered"""
+    vault_key = PasswordEncryption.generate_vault_key()
+    encrypted = PasswordEncryption(vault_key=vault_key, key_id=7).encrypt("Secret")
+    _, kdf_id, cost, key_id = V3_HEADER.unpack(encrypted[:V3_HEADER.size])
+    assert (kdf_id, cost, key_id) == (KDF_NONE, 0, 7)
+    
+    tampered = encrypted[:5] + b'\x01' + encrypted[6:]  # Change the cost field
+    try:
+        PasswordEncryption(vault_key=vault_key, key_id=7).decrypt(tampered)
+        assert False, "Tampered header should fail"
+    except AssertionError:
+        raise
+    except Exception:
+        pass
+    print("✅ Header authentication test passed")
+
+def test_decrypt_many_keeps_order():
+    """Test that batch decryption keeps input order and reports failures per item"""
+    master_password = "MyPassword123"
+    encryptor = PasswordEncryption(master_password, vault_key=PasswordEncryption.generate_vault_key())
+    
+    items = [make_v1_blob(master_password, f"legacy{i}") for i in range(4)]
+    items.insert(2, encryptor.encrypt("envelope"))
+    items.append(make_v1_blob("WrongPassword", "unreadable"))
+    
+    results = encryptor.decrypt_many(items, max_parallel=3)
+    assert [plaintext for plaintext, _ in results[:5]] == ["legacy0", "legacy1", "envelope", "legacy2", "legacy3"]
+    assert results[5][0] == DECRYPTION_FAILED and results[5][1] is not None
+    print("✅ Batch decryption test passed")
+
+def test_corrupt_blobs_fail_per_entry():
+    """Test that truncated/random blobs are reported per entry, not raised by the pre-scan"""
+    master_password = "MyPassword123"
+    encryptor = PasswordEncryption(master_password, vault_key=PasswordEncryption.generate_vault_key())
+    corrupt = [b'\x03', b'\x03\x01\x00', bytes([0x9c, 0xff, 0x00, 0x80]) + os.urandom(28), None]
+    
+    for blob in corrupt:
+        assert PasswordEncryption.blob_format(blob) == FORMAT_UNKNOWN
+        assert not PasswordEncryption.needs_kdf(blob)
+    
+    good = [encryptor.encrypt("fine"), make_v1_blob(master_password, "legacy0"), make_v1_blob(master_password, "legacy1")]
+    for max_parallel in (1, 3):  # Inline and thread-pool paths
+        results = encryptor.decrypt_many(corrupt + good, max_parallel=max_parallel)
+        assert all(plaintext == DECRYPTION_FAILED and error for plaintext, error in results[:4])
+        assert [plaintext for plaintext, _ in results[4:]] == ["fine", "legacy0", "legacy1"]
+    print("✅ Corrupt blob test passed")
+
 if __name__ == "__main__":
     test_encryption_round_trip()
     test_wrong_password()
+    test_vault_key_envelope()
+    test_legacy_entries_still_decrypt()
+    test_v3_header_is_authenticated()
+    test_decrypt_many_keeps_order()
+    test_corrupt_blobs_fail_per_entry()
@@ -0,0 +1,152 @@
+"""Test script for the Argon2 hashing service (bounded queue, 503 backpressure)"""
+import os
+import signal
+import threading
+import time
+import pytest
+from flask import Flask
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError
+from config import Config
+from database_postgres import close_db, User
+from auth import hashing_service as hashing_module
+from auth.hashing_service import HashingService, HashingBusyError
+from auth.password_hasher import MasterPasswordManager
+from api import auth_routes
+
+FAST_PARAMS = {'time_cost': 1, 'memory_cost': 8, 'parallelism': 1}
+
+def blocking_hash_task(release):
+    """A _hash_task stand-in that holds its worker until release is set"""
+    def task(params, password, submitted_at):
+        release.wait(5)
+        return f'hash:{password}', time.time() - submitted_at
+    return task
+
+def wait_for(predicate):
+    deadline = time.monotonic() + 5
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.005)
+
+def test_bounded_queue_rejects_when_full(monkeypatch):
+    """Test workers + queue_size calls are admitted and the next is rejected"""
+    service = HashingService(workers=1, queue_size=1, retry_after=7, pool_kind='thread', params=FAST_PARAMS)
+    release = threading.Event()
+    monkeypatch.setattr(hashing_module, '_hash_task', blocking_hash_task(release))
+
+    results = []
+    callers = [threading.Thread(target=lambda i=i: results.append(service.hash(f'pw{i}'))) for i in range(2)]
+    for caller in callers:
+        caller.start()
+    wait_for(lambda: service.stats()['in_flight'] == 2)
+    assert service.stats()['queue_depth'] == 1  # One running, one waiting for the worker
+
+    with pytest.raises(HashingBusyError) as busy:
+        service.hash('pw2')
+    assert busy.value.retry_after == 7
+    print("✅ Full queue rejects with HashingBusyError")
+
+    release.set()
+    for caller in callers:
+        caller.join(5)
+    assert sorted(results) == ['hash:pw0', 'hash:pw1']
+
+    stats = service.stats()
+    assert (stats['completed'], stats['rejected'], stats['in_flight'], stats['queue_depth']) == (2, 1, 0, 0)
+    assert stats['max_queue_depth'] == 1 and stats['max_wait_ms'] >= stats['avg_wait_ms'] >= 0
+    print("✅ Slots released; stats count completed, rejected and queue depth")
+
+def test_hash_verify_and_rehash():
+    """Test real Argon2 calls through the pool, and parameter-change detection"""
+    service = HashingService(workers=1, queue_size=0, pool_kind='thread', params=FAST_PARAMS)
+    password_hash = service.hash('correct horse')
+    assert service.verify(password_hash, 'correct horse')
+    with pytest.raises(VerifyMismatchError):
+        service.verify(password_hash, 'wrong')
+    assert not service.needs_rehash(password_hash)
+    assert HashingService(1, 0, pool_kind='thread', params={**FAST_PARAMS, 'time_cost': 2}).needs_rehash(password_hash)
+    assert service.stats()['completed'] == 2  # A mismatch raises, it isn't a completed call
+    print("✅ Hash/verify through the pool")
+
+def test_library_default_hashes_are_not_rehashed():
+    """Test the configured defaults match hashes made by PasswordHasher() (no silent rehash)"""
+    legacy_hash = PasswordHasher().hash('pw')
+    assert not HashingService(1, 0, pool_kind='thread', params=Config.argon2_params()).needs_rehash(legacy_hash)
+    assert not MasterPasswordManager().needs_rehash(legacy_hash)
+    print("✅ Hashes with library defaults are left alone")
+
+def test_rehash_only_strengthens():
+    """Test a retune rehashes only when no parameter would go down"""
+    stored = PasswordHasher(**{**FAST_PARAMS, 'time_cost': 2, 'memory_cost': 16}).hash('pw')
+    def needs_rehash(**params):
+        return HashingService(1, 0, pool_kind='thread', params={**FAST_PARAMS, **params}).needs_rehash(stored)
+
+    assert needs_rehash(time_cost=3, memory_cost=16)
+    assert needs_rehash(time_cost=2, memory_cost=32)
+    assert not needs_rehash(time_cost=2, memory_cost=16)  # Same parameters
+    assert not needs_rehash(time_cost=1, memory_cost=16)  # Weaker
+    assert not needs_rehash(time_cost=3, memory_cost=8)  # Mixed: memory would go down
+    print("✅ Rehash only upgrades, never weakens")
+
+def killed_task(*args):
+    """Dies like an OOM-killed Argon2 child"""
+    os.kill(os.getpid(), signal.SIGKILL)
+
+def test_broken_pool_is_rebuilt():
+    """Test a killed child maps to HashingBusyError once, then the pool is rebuilt"""
+    service = HashingService(workers=1, queue_size=0, retry_after=4, pool_kind='process', params=FAST_PARAMS)
+    with pytest.raises(HashingBusyError) as busy:
+        service._run(FAST_PARAMS['memory_cost'], killed_task)
+    assert busy.value.retry_after == 4
+    assert service.stats()['pool_restarts'] == 1
+
+    password_hash = service.hash('pw')  # A fresh pool serves the next call
+    assert service.verify(password_hash, 'pw')
+    stats = service.stats()
+    assert (stats['completed'], stats['rejected'], stats['pool_restarts'], stats['in_flight']) == (2, 1, 1, 0)
+    print("✅ Broken pool: 503 for the affected call, rebuilt for the next")
+
+def make_auth_client():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(auth_routes.auth_bp, url_prefix='/api/auth')
+    app.teardown_appcontext(close_db)
+    return app.test_client()
+
+def test_busy_routes_return_503(db, make_vault, monkeypatch):
+    """Test /login and /register answer 503 + Retry-After while hashing is saturated"""
+    make_vault()  # Login looks up the (single) user before verifying
+
+    def busy(*args, **kwargs):
+        raise HashingBusyError(9)
+    monkeypatch.setattr(auth_routes.hashing_service, 'verify', busy)
+    monkeypatch.setattr(auth_routes.hashing_service, 'hash', busy)
+
+    client = make_auth_client()
+    for path in ('/api/auth/login', '/api/auth/register'):
+        if path == '/api/auth/register':
+            for user in db.query(User).all():
+                db.delete(user)  # Registration only hashes when no user exists yet
+            db.commit()
+        response = client.post(path, json={'master_password': 'MyPassword123'},
+                               environ_base={'REMOTE_ADDR': '198.51.100.7'})
+        assert response.status_code == 503, (path, response.json)
+        assert response.headers['Retry-After'] == '9'
+        assert response.json['error'] == 'Server busy, please retry shortly'
+    print("✅ /login and /register return 503 with Retry-After")
+
+def test_duplicate_registration_skips_hashing(make_vault, monkeypatch):
+    """Test that registering when a user exists is refused before any Argon2 work"""
+    make_vault()
+    hashed = []
+    monkeypatch.setattr(auth_routes.hashing_service, 'hash', lambda *args, **kwargs: hashed.append(1))
+
+    response = make_auth_client().post('/api/auth/register', json={'master_password': 'another-pw'},
+                                       environ_base={'REMOTE_ADDR': '198.51.100.8'})
+    assert response.status_code == 400 and response.json['error'] == 'User already exists'
+    assert hashed == []
+    print("✅ Duplicate registration refused without hashing")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
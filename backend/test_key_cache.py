@@ -0,0 +1,49 @@
+"""Test script for the derived-key cache"""
+import time
+from crypto.encryption import PasswordEncryption
+from crypto.key_cache import DerivedKeyCache
+
+def test_cache_hits_skip_derivation():
+    """Test that decrypting the same legacy entry twice derives its key once"""
+    cache = DerivedKeyCache(max_entries=8, idle_ttl=60)
+    legacy = PasswordEncryption("MyPassword123").encrypt("SuperSecret@2026")
+    
+    encryptor = PasswordEncryption("MyPassword123", key_cache=cache, cache_owner=1)
+    assert encryptor.decrypt(legacy) == "SuperSecret@2026"
+    assert encryptor.decrypt(legacy) == "SuperSecret@2026"
+    
+    stats = cache.stats()
+    assert stats['misses'] == 1 and stats['hits'] == 1
+    print(f"✅ Cache stats: {stats}")
+
+def test_lru_and_idle_eviction():
+    """Test that the cache stays bounded and drops idle keys"""
+    cache = DerivedKeyCache(max_entries=2, idle_ttl=0.05)
+    derive = lambda salt: b'k' * 32
+    
+    for salt in (b'a', b'b', b'c'):
+        cache.get_or_derive(1, salt, derive)
+    assert cache.stats()['size'] == 2
+    assert cache.stats()['evictions'] == 1
+    
+    time.sleep(0.1)
+    cache.get_or_derive(1, b'd', derive)
+    assert cache.stats()['size'] == 1
+    print("✅ Eviction test passed")
+
+def test_purge_zeroizes_keys():
+    """Test that purging a user wipes the stored key bytes"""
+    cache = DerivedKeyCache()
+    cache.get_or_derive(1, b'salt', lambda salt: b'\x01' * 32)
+    cache.get_or_derive(2, b'salt', lambda salt: b'\x02' * 32)
+    stored = cache._entries[(1, b'salt')][0]
+    
+    assert cache.purge(1) == 1
+    assert stored == bytearray(32)
+    assert cache.stats()['size'] == 1
+    print("✅ Purge test passed")
+
+if __name__ == "__main__":
+    test_cache_hits_skip_derivation()
+    test_lru_and_idle_eviction()
+    test_purge_zeroizes_keys()
@@ -0,0 +1,24 @@
+"""Test script for /metrics access control"""
+from utils import metrics
+
+def test_token_required_when_configured():
+    """Test that a configured token is the only way in, whatever the peer address"""
+    assert metrics.is_authorized('Bearer s3cret', token='s3cret')
+    assert metrics.is_authorized('bearer s3cret', token='s3cret')
+    assert not metrics.is_authorized('Bearer wrong', token='s3cret')
+    assert not metrics.is_authorized(None, token='s3cret')
+    assert not metrics.is_authorized('Basic s3cret', token='s3cret')
+    print("✅ Bearer token checked when METRICS_TOKEN is set")
+
+def test_nothing_authorized_without_token():
+    """Test that without a token no caller (loopback included, e.g. behind a proxy) gets the snapshot"""
+    assert not metrics.is_authorized(None, token='')
+    assert not metrics.is_authorized('Bearer ', token='')
+    assert not metrics.is_authorized('Bearer anything', token=None)
+    print("✅ Nothing authorized without a token")
+
+if __name__ == "__main__":
+    print("🧪 Testing Metrics Access...\n")
+    test_token_required_when_configured()
+    test_nothing_authorized_without_token()
+    print("\n🎉 All tests passed!")
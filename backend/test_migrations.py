@@ -0,0 +1,92 @@
+"""Test script for the versioned migration runner"""
+import os
+import tempfile
+from sqlalchemy import create_engine, inspect, text
+from migrations.runner import upgrade, current_version, check_schema, latest_version, SchemaOutOfDateError
+
+def make_legacy_db():
+    """A passwords.db as the pre-migration sqlite scripts left it."""
+    engine = create_engine('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'legacy.db'))
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                          "master_password_hash TEXT NOT NULL, created_at TEXT NOT NULL)"))
+        conn.execute(text("CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                          "user_id INTEGER NOT NULL, session_token TEXT NOT NULL, created_at TEXT)"))
+        conn.execute(text("INSERT INTO users (master_password_hash, created_at) VALUES ('hash', '2024-01-01')"))
+        conn.execute(text("INSERT INTO sessions (user_id, session_token) VALUES (1, 'raw-token')"))
+    return engine
+
+def test_legacy_database_upgrades_to_latest():
+    """Test that a pre-migration database reaches the latest version and keeps its data"""
+    engine = make_legacy_db()
+    assert current_version(engine) == 0
+    try:
+        check_schema(engine)
+        assert False, "old schema should be rejected"
+    except SchemaOutOfDateError:
+        pass
+    
+    assert upgrade(engine, target=2) == 2
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO password_entries (user_id, website, username, encrypted_password) "
+                          "VALUES (1, 'site', 'me', 'djI6dGV4dA==')"))
+    
+    assert upgrade(engine) == latest_version()
+    assert check_schema(engine) == latest_version()
+    
+    columns = {col['name'] for col in inspect(engine).get_columns('users')}
+    assert {'recovery_key_hash', 'wrapped_vault_key', 'vault_key_id', 'recovery_wrapped_vault_key',
+            'vault_version'} <= columns
+    indexes = {index['name'] for index in inspect(engine).get_indexes('password_entries')}
+    assert 'ix_password_entries_user_id_id' in indexes
+    
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT typeof(encrypted_password) FROM password_entries")).scalar() == 'blob'
+        assert conn.execute(text("SELECT COUNT(*) FROM sessions")).scalar() == 0  # Raw-token sessions dropped
+        assert conn.execute(text("SELECT COUNT(*) FROM users")).scalar() == 1
+        assert conn.execute(text("SELECT rowid FROM password_entries_fts "
+                                 "WHERE password_entries_fts MATCH 'site'")).scalar() is not None  # Backfilled
+    
+    assert upgrade(engine) == latest_version()  # Nothing pending: no-op
+    print("✅ Legacy upgrade test passed")
+
+def test_empty_database_is_created_and_stamped():
+    """Test that a fresh database gets the current schema at the latest version"""
+    engine = create_engine('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'fresh.db'))
+    assert current_version(engine) is None
+    assert upgrade(engine) == latest_version()
+    assert check_schema(engine) == latest_version()
+    assert 'rate_limit_counters' in inspect(engine).get_table_names()
+    print("✅ Fresh database test passed")
+
+def schema(engine):
+    """{(type, name)} of the tables and named indexes (column types of legacy tables differ by design)"""
+    with engine.connect() as conn:
+        return set(conn.execute(text("SELECT type, name FROM sqlite_master "
+                                     "WHERE (type = 'table' OR name LIKE 'ix_%') AND name NOT LIKE 'sqlite_%'")).all())
+
+def test_upgraded_schema_matches_fresh():
+    """Test that the frozen migrations arrive at the tables and indexes the models create"""
+    legacy = make_legacy_db()
+    upgrade(legacy)
+    fresh = create_engine('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'fresh.db'))
+    upgrade(fresh)
+    # v005 adds the token's unique index by name; fresh tables carry a UNIQUE constraint instead
+    assert schema(legacy) - {('index', 'ix_sessions_session_token')} == schema(fresh)
+    print("✅ Upgraded and fresh schemas match")
+
+def test_migrations_do_not_import_models():
+    """Test that no migration depends on the live models (they must stay frozen)"""
+    from migrations import versions
+    folder = versions.__path__[0]
+    for name in sorted(os.listdir(folder)):
+        if name.startswith('v') and name.endswith('.py'):
+            with open(os.path.join(folder, name)) as f:
+                assert 'from database_postgres' not in f.read(), name
+    print("✅ Migrations are self-contained")
+
+if __name__ == "__main__":
+    test_legacy_database_upgrades_to_latest()
+    test_empty_database_is_created_and_stamped()
+    test_upgraded_schema_matches_fresh()
+    test_migrations_do_not_import_models()
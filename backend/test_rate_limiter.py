@@ -0,0 +1,231 @@
+"""Test script for the sliding-window rate limiter"""
+import os
+import threading
+from argon2.exceptions import VerifyMismatchError
+from database_postgres import init_db
+from flask import Flask
+from config import Config
+from utils.rate_limiter import RateLimiter, LocalBackend, HostBackend, DatabaseBackend, rate_limit, create_rate_limiter
+
+def test_blocks_after_max_attempts():
+    """Test that the fifth failure blocks and a reset unblocks"""
+    limiter = RateLimiter(max_attempts=5, window_minutes=15)
+    
+    for _ in range(4):
+        limiter.add_attempt('10.0.0.1')
+    assert limiter.is_rate_limited('10.0.0.1') == (False, 0)
+    assert limiter.remaining('10.0.0.1') == 1
+    
+    limiter.add_attempt('10.0.0.1')
+    is_limited, wait_seconds = limiter.is_rate_limited('10.0.0.1')
+    assert is_limited and 0 < wait_seconds <= 30 * 60
+    assert limiter.is_rate_limited('10.0.0.2') == (False, 0)
+    
+    limiter.reset_attempts('10.0.0.1')
+    assert limiter.is_rate_limited('10.0.0.1') == (False, 0)
+    print("✅ Limit test passed")
+
+def test_window_slides():
+    """Test that old attempts fade out as the window slides"""
+    limiter = RateLimiter(max_attempts=5, window_minutes=1)
+    for _ in range(5):
+        limiter.add_attempt('ip')
+    
+    state = limiter.local._windows['ip']
+    state.start -= 90  # Pretend the attempts happened 1.5 windows ago
+    assert limiter.remaining('ip') == 2  # 5 * (1 - 0.5) still counted
+    
+    state.start -= 60
+    assert limiter.remaining('ip') == 5
+    print("✅ Sliding window test passed")
+
+def test_key_table_stays_bounded():
+    """Test that distinct keys beyond max_keys evict the least recently used"""
+    limiter = RateLimiter(max_keys=100)
+    for i in range(1000):
+        limiter.add_attempt(f'ip-{i}')
+    
+    stats = limiter.stats()
+    assert stats['keys'] == 100 and stats['evictions'] == 900
+    print(f"✅ Bounded table: {stats}")
+
+def test_database_backend_is_shared():
+    """Test that two limiters (two workers) on the database backend share one count"""
+    init_db()
+    worker_a = RateLimiter(max_attempts=5, backend=DatabaseBackend(15 * 60))
+    worker_b = RateLimiter(max_attempts=5, backend=DatabaseBackend(15 * 60))
+    
+    for limiter in (worker_a, worker_b, worker_a, worker_b, worker_a):
+        limiter.add_attempt('203.0.113.7')
+    assert worker_b.is_rate_limited('203.0.113.7')[0]
+    assert worker_b.remaining('203.0.113.7') == 0
+    
+    worker_a.reset_attempts('203.0.113.7')
+    assert worker_b.is_rate_limited('203.0.113.7') == (False, 0)
+    print("✅ Shared backend test passed")
+
+def test_host_backend_is_shared_across_processes(tmp_path):
+    """Test that a forked worker and the parent spend one host-wide budget"""
+    path = str(tmp_path / 'login.counters')
+    limiter = RateLimiter(max_attempts=5, backend=HostBackend(15 * 60, path))
+    other = RateLimiter(max_attempts=5, backend=HostBackend(15 * 60, path))  # Another worker's instance
+
+    limiter.add_attempt('203.0.113.8')
+    other.add_attempt('203.0.113.8')
+    pid = os.fork()
+    if pid == 0:
+        allowed = [limiter.hit('203.0.113.8')[0] for _ in range(5)]
+        os._exit(0 if allowed == [True, True, True, False, False] else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert other.is_rate_limited('203.0.113.8')[0] and limiter.remaining('203.0.113.8') == 0
+
+    other.reset_attempts('203.0.113.8')
+    assert limiter.is_rate_limited('203.0.113.8') == (False, 0)
+    print("✅ Host backend shared by workers and forked children")
+
+def test_host_backend_stays_bounded(tmp_path):
+    """Test that the counter file never grows, and a live key survives a flood of new ones"""
+    backend = HostBackend(15 * 60, str(tmp_path / 'flood.counters'), max_keys=64)
+    limiter = RateLimiter(max_attempts=5, backend=backend)
+    for _ in range(5):
+        limiter.add_attempt('attacker')
+    for i in range(1000):
+        limiter.add_attempt(f'scanner-{i}')
+        if i % 5 == 0:
+            limiter.add_attempt('attacker', cost=0)  # Seen more recently than most of its probe range
+    assert os.path.getsize(tmp_path / 'flood.counters') == 64 * HostBackend.SLOT.size
+    assert backend.evictions > 0 and limiter.is_rate_limited('attacker')[0]
+    print("✅ Host backend bounded")
+
+def test_backend_follows_config(monkeypatch):
+    """Test host-shared counters by default, the shared table or local counters when configured"""
+    assert isinstance(create_rate_limiter().backend, HostBackend)
+    monkeypatch.setattr(Config, 'RATE_LIMIT_BACKEND', 'database')
+    assert isinstance(create_rate_limiter().backend, DatabaseBackend)
+    monkeypatch.setattr(Config, 'RATE_LIMIT_BACKEND', 'local')
+    assert create_rate_limiter().backend is None or isinstance(create_rate_limiter().backend, LocalBackend)
+    print("✅ Backend selection test passed")
+
+class BrokenBackend:
+    def now(self):
+        raise ConnectionError('database is down')
+
+def test_falls_back_to_local_counters():
+    """Test that a failing backend doesn't disable limiting"""
+    limiter = RateLimiter(max_attempts=2, backend=BrokenBackend(), fallback_cooldown=60)
+    limiter.add_attempt('ip')
+    limiter.add_attempt('ip')
+    assert limiter.is_rate_limited('ip')[0]
+    assert limiter.stats()['fallbacks'] == 1  # Not retried during the cooldown
+    print("✅ Fallback test passed")
+
+def test_route_decorator_weights_costs():
+    """Test that routes sharing a scope spend one budget, weighted by cost"""
+    app = Flask(__name__)
+    
+    @app.route('/cheap', methods=['POST'])
+    @rate_limit('test-scope', limit=30, cost=10)
+    def cheap():
+        return 'ok'
+    
+    @app.route('/expensive', methods=['POST'])
+    @rate_limit('test-scope', limit=30, cost=20)
+    def expensive():
+        return 'ok'
+    
+    client = app.test_client()
+    assert client.post('/expensive').status_code == 200
+    assert client.post('/expensive').status_code == 429  # 20 + 20 > 30
+    assert client.post('/cheap').status_code == 200
+    
+    response = client.post('/cheap')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    print("✅ Route decorator test passed")
+
+class RacingBackend(DatabaseBackend):
+    """Holds the first `parties` calls until all of them have arrived (widest race)"""
+    def __init__(self, window, parties):
+        super().__init__(window)
+        self.barrier = threading.Barrier(parties, timeout=5)
+        self.waiting = iter(range(parties))
+
+    def now(self):
+        if next(self.waiting, None) is not None:
+            self.barrier.wait()
+        return super().now()
+
+def run_concurrently(target, parties):
+    threads = [threading.Thread(target=target) for _ in range(parties)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+def test_concurrent_hits_never_exceed_limit():
+    """Test that requests racing on the shared backend can't all pass one check"""
+    init_db()
+    limiter = RateLimiter(max_attempts=5, backend=RacingBackend(15 * 60, parties=12))
+    results = []
+    run_concurrently(lambda: results.append(limiter.hit('race-key')[0]), 12)
+
+    assert results.count(True) == 5 and results.count(False) == 7
+    assert limiter.stats()['fallbacks'] == 0
+    assert limiter.remaining('race-key') == 0
+    print("✅ 12 concurrent hits, exactly 5 allowed")
+
+def test_rejected_hits_are_refunded():
+    """Test that rejected requests don't add to the count (no self-extending lockout)"""
+    init_db()
+    for backend in (None, HostBackend(15 * 60, os.path.join(Config.RATE_LIMIT_HOST_DIR, 'refund.counters')),
+                    DatabaseBackend(15 * 60)):
+        limiter = RateLimiter(max_attempts=30, backend=backend)
+        key = f'refund-{type(backend).__name__}'
+        assert limiter.hit(key, cost=10) == (True, 0)
+        assert limiter.hit(key, cost=10) == (True, 0)
+        for _ in range(3):
+            allowed, retry_after = limiter.hit(key, cost=20)
+            assert not allowed and retry_after > 0
+        assert limiter.hit(key, cost=10) == (True, 0)  # The rejected 60 units were given back
+        assert limiter.remaining(key) == 0
+
+        limiter.refund(key, cost=100)
+        assert limiter.remaining(key) == 30  # Floored at zero, never a negative count
+        limiter.reset_attempts(key)
+    print("✅ Rejected requests refunded on every backend")
+
+def test_concurrent_logins_never_exceed_limit(make_vault, monkeypatch):
+    """Test that concurrent wrong passwords get at most max_attempts verifications"""
+    from api import auth_routes
+    from test_hashing_service import make_auth_client
+    make_vault()
+
+    verified = []
+    def wrong_password(*args, **kwargs):
+        verified.append(1)
+        raise VerifyMismatchError()
+    monkeypatch.setattr(auth_routes.hashing_service, 'verify', wrong_password)
+    monkeypatch.setattr(auth_routes, 'rate_limiter',
+                        RateLimiter(max_attempts=5, backend=RacingBackend(15 * 60, parties=10)))
+
+    statuses = []
+    def attempt():
+        response = make_auth_client().post('/api/auth/login', json={'master_password': 'guess'},
+                                           environ_base={'REMOTE_ADDR': '198.51.100.99'})
+        statuses.append(response.status_code)
+    run_concurrently(attempt, 10)
+
+    assert len(statuses) == 10 and len(verified) == 5
+    assert statuses.count(429) >= 5
+    print("✅ 10 concurrent guesses, 5 verified")
+
+if __name__ == "__main__":
+    test_blocks_after_max_attempts()
+    test_window_slides()
+    test_key_table_stays_bounded()
+    test_database_backend_is_shared()
+    test_falls_back_to_local_counters()
+    test_route_decorator_weights_costs()
+    test_concurrent_hits_never_exceed_limit()
+    test_rejected_hits_are_refunded()
@@ -0,0 +1,59 @@
+"""Test script for request-scoped DB sessions (returned to the pool on every path)"""
+from flask import Flask, jsonify
+from database_postgres import init_db, engine, get_db, close_db, User
+from api.auth_routes import auth_bp
+
+def make_app():
+    """Minimal app with the real teardown hook and a route that fails mid-query"""
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.teardown_appcontext(close_db)
+
+    @app.route('/boom')
+    def boom():
+        db = get_db()
+        assert get_db() is db  # One session per request
+        db.query(User).count()
+        raise RuntimeError('boom')
+
+    @app.route('/caught')
+    def caught():
+        try:
+            get_db().query(User).count()
+            raise ValueError('handled')
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    return app
+
+def test_connections_return_to_pool():
+    """Test that success, early-return and error paths all release their connection"""
+    init_db()
+    client = make_app().test_client()
+
+    response = client.post('/api/auth/register', json={'master_password': 'correct horse'})
+    assert response.status_code in (201, 400)  # 400 if another test created the user
+    assert engine.pool.checkedout() == 0
+
+    response = client.post('/api/auth/register', json={'master_password': 'correct horse'})
+    assert response.status_code == 400  # Early return: user exists
+    assert engine.pool.checkedout() == 0
+    print("✅ Normal and early-return paths release the connection")
+
+    assert client.get('/caught').status_code == 500
+    assert engine.pool.checkedout() == 0
+    assert client.get('/boom').status_code == 500
+    assert engine.pool.checkedout() == 0
+    print("✅ Handled and unhandled errors release the connection")
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("TESTING REQUEST-SCOPED DB SESSIONS")
+    print("=" * 50 + "\n")
+
+    test_connections_return_to_pool()
+
+    print("\n" + "=" * 50)
+    print("ALL TESTS PASSED! ✅")
+    print("=" * 50)
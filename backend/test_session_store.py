@@ -0,0 +1,136 @@
+"""Test script for server-side sessions (opaque token + per-worker cache)"""
+from database_postgres import init_db, SessionLocal, User, Session as DBSession
+from crypto.encryption import PasswordEncryption
+from auth.session_store import SessionStore
+from auth.session_reaper import delete_expired_sessions
+from datetime import datetime, timedelta
+from database_postgres import engine
+
+def test_session_round_trip_and_revoke():
+    """Test that a token resolves to its vault keys and stops working after revoke"""
+    init_db()
+    db = SessionLocal()
+    user = User(master_password_hash='unused')
+    db.add(user)
+    db.commit()
+    
+    vault_key = PasswordEncryption.generate_vault_key()
+    retired_key = PasswordEncryption.generate_vault_key()
+    vault = PasswordEncryption(vault_key=vault_key, key_id=2, keyring={1: retired_key})
+    
+    store = SessionStore(cache_ttl=60, cache_size=8)
+    token = store.create(db, user.id, vault)
+    db.commit()
+    
+    # Only the token's hash is stored, and the keyring is sealed
+    row = db.query(DBSession).filter_by(user_id=user.id).first()
+    assert row.session_token != token
+    assert vault_key not in row.wrapped_vault_key
+    
+    state = store.load(token)
+    assert state.user_id == user.id
+    assert state.encryptor.vault_key == vault_key
+    assert state.encryptor.keyring[1] == retired_key
+    assert store.load(token) is state  # Second lookup served from cache
+    assert store.stats()['hits'] == 1
+    assert store.load('not-a-token') is None
+    print("✅ Session lookup and cache work")
+    
+    store.revoke(db, token)
+    db.commit()
+    assert store.load(token) is None
+    print("✅ Revoked session is rejected")
+    db.close()
+
+def test_reaper_deletes_expired_in_batches():
+    """Test that the reaper removes only expired sessions, batch by batch"""
+    init_db()
+    db = SessionLocal()
+    user = User(master_password_hash='unused')
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    
+    now = datetime.utcnow()
+    for i in range(25):
+        db.add(DBSession(user_id=user_id, session_token=f'expired-{i}', expires_at=now - timedelta(minutes=i + 1)))
+    for i in range(3):
+        db.add(DBSession(user_id=user_id, session_token=f'live-{i}', expires_at=now + timedelta(hours=1)))
+    db.commit()
+    db.close()
+    
+    with engine.connect() as conn:
+        assert delete_expired_sessions(conn, batch_size=10, now=now) == 25
+    
+    db = SessionLocal()
+    remaining = [row.session_token for row in db.query(DBSession).filter_by(user_id=user_id)]
+    assert sorted(remaining) == ['live-0', 'live-1', 'live-2']
+    db.close()
+    print("✅ Expired sessions reaped in batches")
+
+class FakePostgresConnection:
+    """Records calls; a statement after a failure raises, like an aborted PostgreSQL transaction"""
+    def __init__(self, log):
+        self.log = log
+        self.aborted = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.log.append('close')
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if self.aborted:
+            raise RuntimeError('current transaction is aborted')
+        if 'DELETE' in sql:
+            self.aborted = True
+            raise RuntimeError('deadlock detected')
+        self.log.append(sql.split('(')[0].replace('SELECT ', ''))
+        return self
+
+    def scalar(self):
+        return True
+
+    def commit(self):
+        self.log.append('commit')
+
+    def rollback(self):
+        self.aborted = False
+        self.log.append('rollback')
+
+    def invalidate(self):
+        self.log.append('invalidate')
+
+class FakePostgresEngine:
+    def __init__(self, log):
+        self.log = log
+        self.dialect = type('Dialect', (), {'name': 'postgresql'})()
+
+    def connect(self):
+        return FakePostgresConnection(self.log)
+
+def test_reaper_unlocks_after_failed_batch():
+    """Test a failing reap rolls back before pg_advisory_unlock, so the lock is released"""
+    from auth import session_reaper as reaper_module
+    log = []
+    original = reaper_module.engine
+    reaper_module.engine = FakePostgresEngine(log)
+    try:
+        reaper_module.SessionReaper().run_once()
+        assert False, "run_once should re-raise the reap error"
+    except RuntimeError as e:
+        assert 'deadlock' in str(e)
+    finally:
+        reaper_module.engine = original
+    
+    assert log == ['pg_try_advisory_lock', 'commit', 'rollback', 'pg_advisory_unlock', 'commit', 'close']
+    print("✅ Advisory lock released after a failed reap")
+
+if __name__ == "__main__":
+    print("🧪 Testing Session Store...\n")
+    test_session_round_trip_and_revoke()
+    test_reaper_deletes_expired_in_batches()
+    test_reaper_unlocks_after_failed_batch()
+    print("\n🎉 All tests passed!")
@@ -0,0 +1,101 @@
+"""Test script for batch create/update/delete in one transaction"""
+import pytest
+from sqlalchemy import event
+from database_postgres import engine, PasswordEntry
+from api.vault_batch import apply_batch
+from api.vault_search import search_entry_ids
+from api.password_routes import security_level_for
+
+class StatementCounter:
+    """Count SQL statements sent to the engine, by keyword and password_entries table"""
+    def __init__(self):
+        self.counts = {}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        words = statement.split()
+        table = next((word for word in words[1:4] if word.startswith('password_entries')), '')
+        key = f'{words[0].upper()} {table}'.strip()
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+def test_mixed_batch_is_set_based(db, make_vault):
+    """Test a large mixed batch: per-op results and a constant statement count"""
+    vault = make_vault(60)
+    user_id, encryptor, ids = vault.user_id, vault.encryptor, vault.entry_ids
+
+    operations = [{'op': 'delete', 'id': entry_id} for entry_id in ids[:50]]
+    operations += [{'op': 'update', 'id': entry_id, 'notes': 'stale'} for entry_id in ids[50:55]]
+    operations += [{'op': 'update', 'id': ids[55], 'password': 'N3w!Passw0rd#2026', 'website': 'renamed'}]
+    operations += [{'op': 'create', 'website': f'new{i}', 'username': 'me', 'password': 'pw'} for i in range(20)]
+
+    counter = StatementCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        results, committed = apply_batch(db, user_id, operations, encryptor, security_level_for)
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+    assert committed and all(result['status'] == 'ok' for result in results)
+    assert [result['op'] for result in results] == [operation['op'] for operation in operations]
+    assert all(isinstance(result['id'], int) for result in results)
+    # Deletes and search-index writes are set-based, not one per id. (Entry INSERTs
+    # go one row per statement on SQLite, which can't order batched RETURNING.)
+    assert counter.counts.get('DELETE password_entries', 0) == 1
+    assert counter.counts.get('UPDATE password_entries', 0) <= 2
+    assert counter.counts.get('DELETE password_entries_fts', 0) <= 2
+    assert counter.counts.get('INSERT password_entries_fts', 0) == 1
+    print(f"✅ 76 operations in {sum(counter.counts.values())} statements: {counter.counts}")
+
+    remaining = db.query(PasswordEntry).filter_by(user_id=user_id).all()
+    assert len(remaining) == 30
+    renamed = db.get(PasswordEntry, ids[55])
+    assert renamed.security_level == 'Calm'
+    assert encryptor.decrypt(renamed.encrypted_password) == 'N3w!Passw0rd#2026'
+    assert search_entry_ids(db, user_id, 'site1', 10) == []  # Deleted rows left the search index
+    assert search_entry_ids(db, user_id, 'renamed', 10) == [ids[55]]
+    print("✅ Deletes, updates and creates applied (search index in sync)")
+
+def test_failures_are_reported_per_operation(db, make_vault):
+    """Test skipped failures vs atomic rollback"""
+    vault, other = make_vault(3), make_vault(1)
+    user_id, encryptor, ids = vault.user_id, vault.encryptor, vault.entry_ids
+    other_user, other_ids = other.user_id, other.entry_ids
+
+    operations = [
+        {'op': 'delete', 'id': ids[0]},
+        {'op': 'delete', 'id': other_ids[0]},  # Someone else's entry
+        {'op': 'update', 'id': ids[0], 'notes': 'x'},  # Same id twice
+        {'op': 'create', 'website': 'a'},
+        {'op': 'rename', 'id': ids[1]},
+        {'op': 'update', 'id': ids[2]},
+        {'op': 'update', 'id': ids[1], 'password': ''}
+    ]
+    results, committed = apply_batch(db, user_id, operations, encryptor, security_level_for, atomic=True)
+    assert not committed
+    assert [result['status'] for result in results] == ['ok'] + ['error'] * 6
+    assert [result.get('error') for result in results[1:]] == [
+        'Password not found', 'id appears in more than one operation', 'username is required',
+        'op must be one of create, update, delete', 'Nothing to update', 'password must be a non-empty string']
+    assert db.query(PasswordEntry).filter_by(user_id=user_id).count() == 3
+    print("✅ Atomic batch with failures changes nothing")
+
+    results, committed = apply_batch(db, user_id, operations, encryptor, security_level_for)
+    assert committed
+    assert db.query(PasswordEntry).filter_by(user_id=user_id).count() == 2
+    assert db.query(PasswordEntry).filter_by(user_id=other_user).count() == 1
+    print("✅ Non-atomic batch skips failures and applies the rest")
+
+def test_null_notes_stored_as_empty(db, make_vault):
+    """Test that "notes": null clears notes to '' on update, as create and the single-entry routes do"""
+    vault = make_vault(1, entry=lambda i: {'notes': 'old'})
+    operations = [
+        {'op': 'update', 'id': vault.entry_ids[0], 'notes': None},
+        {'op': 'create', 'website': 'b', 'username': 'me', 'password': 'pw', 'notes': None}
+    ]
+    results, committed = apply_batch(db, vault.user_id, operations, vault.encryptor, security_level_for)
+    assert committed and [result['status'] for result in results] == ['ok', 'ok']
+    db.expire_all()
+    assert [entry.notes for entry in db.query(PasswordEntry).filter_by(user_id=vault.user_id)] == ['', '']
+    print("✅ null notes stored as ''")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
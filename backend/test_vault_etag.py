@@ -0,0 +1,129 @@
+"""Test script for the vault_version ETag and conditional GETs"""
+import importlib
+import pytest
+from sqlalchemy import event
+from config import Config
+from database_postgres import engine
+from migrations import runner
+
+METADATA = '/api/passwords/?fields=website,username,security_level'
+
+def test_conditional_get_skips_entries(make_vault, make_client):
+    """Test 304 on a matching If-None-Match for a metadata listing, without reading password_entries"""
+    client = make_client(make_vault())
+    client.post('/api/passwords/', json={'website': 'github.com', 'username': 'me', 'password': 'Abc!12345678xyz'})
+
+    response = client.get(METADATA)
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and etag.startswith('"')
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    assert 'Cookie' not in response.headers.get('Vary', '')  # The session cookie changes every request
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        cached = client.get(METADATA, headers={'If-None-Match': etag})
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert cached.status_code == 304 and cached.headers['ETag'] == etag and not cached.data
+    assert not any('password_entries' in statement for statement in statements)
+    print("✅ Matching If-None-Match answered with 304 before any entry is read")
+
+    assert client.get(METADATA, headers={'If-None-Match': 'W/' + etag}).status_code == 304
+    assert client.get(METADATA, headers={'If-None-Match': '"stale"'}).status_code == 200
+    print("✅ Weak and mismatched validators handled")
+
+def test_detail_conditional_get(make_vault, make_client):
+    """Test the detail endpoint tags metadata-only responses and never the decrypted one"""
+    client = make_client(make_vault())
+    entry_id = client.post('/api/passwords/', json={'website': 'github.com', 'username': 'me',
+                                                    'password': 'Abc!12345678xyz'}).get_json()['password_id']
+    detail = f'/api/passwords/{entry_id}'
+
+    response = client.get(detail + '?fields=website,username')
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    assert 'password' not in response.get_json()['password']
+    assert client.get(detail + '?fields=website,username', headers={'If-None-Match': etag}).status_code == 304
+
+    full = client.get(detail, headers={'If-None-Match': etag})
+    assert full.status_code == 200 and full.get_json()['password']['password'] == 'Abc!12345678xyz'
+    assert full.headers['Cache-Control'] == 'no-store' and 'ETag' not in full.headers
+
+    client.put(detail, json={'username': 'you'})
+    assert client.get(detail + '?fields=website,username', headers={'If-None-Match': etag}).status_code == 200
+    print("✅ Detail revalidates metadata with the vault ETag and keeps secrets no-store")
+
+def test_no_vary_cookie_under_the_real_app(make_vault, db, monkeypatch):
+    """Test app.py's app (with CORS adding Vary: Origin) drops only Cookie from Vary on ETag responses"""
+    from auth.session_store import session_store
+    monkeypatch.setattr(runner, 'check_schema', lambda: runner.latest_version())  # Test DB comes from create_all
+    monkeypatch.setattr(Config, 'SESSION_REAPER_ENABLED', False)
+    app = importlib.import_module('app').app
+
+    vault = make_vault(1)
+    token = session_store.create(db, vault.user_id, vault.encryptor)
+    db.commit()
+    client = app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session['token'] = token
+
+    response = client.get(METADATA, headers={'Origin': 'http://localhost:5173'})
+    assert response.status_code == 200 and response.headers['ETag']
+    vary = [value.strip().lower() for value in response.headers.get('Vary', '').split(',')]
+    assert 'origin' in vary and 'cookie' not in vary
+    print("✅ Vary keeps Origin and drops Cookie under the CORS-enabled app")
+
+    # The cross-origin client must be able to read the ETag and send it back
+    assert 'etag' in response.headers['Access-Control-Expose-Headers'].lower()
+    preflight = client.options(METADATA, headers={
+        'Origin': 'http://localhost:5173',
+        'Access-Control-Request-Method': 'GET',
+        'Access-Control-Request-Headers': 'if-none-match'
+    })
+    assert 'if-none-match' in preflight.headers['Access-Control-Allow-Headers'].lower()
+    print("✅ CORS exposes ETag and allows If-None-Match")
+
+def test_decrypted_responses_are_never_cached(make_vault, make_client):
+    """Test responses with plaintext passwords are no-store, untagged and never 304"""
+    vault = make_vault(1)
+    client = make_client(vault)
+    etag = client.get(METADATA).headers['ETag']
+
+    for path in ('/api/passwords/', '/api/passwords/?fields=website,password',
+                 f'/api/passwords/{vault.entry_ids[0]}'):
+        response = client.get(path, headers={'If-None-Match': etag})
+        assert response.status_code == 200 and 'secret0' in response.get_data(as_text=True)
+        assert response.headers['Cache-Control'] == 'no-store' and 'ETag' not in response.headers
+    print("✅ Full listing and single entry are no-store, never 304")
+
+def test_every_write_changes_the_etag(make_vault, make_client):
+    """Test that add, update, delete, batch and import each bump vault_version"""
+    client = make_client(make_vault())
+    etags = [client.get(METADATA).headers['ETag']]
+
+    def write_then_tag(response, status):
+        assert response.status_code == status, response.json
+        etags.append(client.get(METADATA).headers['ETag'])
+        return response
+
+    entry_id = write_then_tag(client.post('/api/passwords/', json={
+        'website': 'a', 'username': 'me', 'password': 'pw'}), 201).json['password_id']
+    write_then_tag(client.put(f'/api/passwords/{entry_id}', json={'notes': 'x'}), 200)
+    write_then_tag(client.post('/api/passwords/batch', json={
+        'operations': [{'op': 'create', 'website': 'b', 'username': 'me', 'password': 'pw'}]}), 200)
+    write_then_tag(client.post('/api/passwords/import?format=csv',
+                               data='url,username,password\nc,me,pw\n', content_type='text/csv'), 200)
+    write_then_tag(client.delete(f'/api/passwords/{entry_id}'), 200)
+    assert len(set(etags)) == len(etags)
+    print("✅ Each write produces a new ETag")
+
+    # Writes that change nothing keep the version
+    client.delete('/api/passwords/999999')
+    client.post('/api/passwords/batch', json={'operations': [{'op': 'delete', 'id': 999999}], 'atomic': True})
+    assert client.get(METADATA).headers['ETag'] == etags[-1]
+    print("✅ Failed writes leave the ETag alone")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
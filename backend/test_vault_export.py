@@ -0,0 +1,76 @@
+"""Test script for the streaming NDJSON export"""
+import base64
+import io
+import json
+import pytest
+from crypto.encryption import PasswordEncryption
+from api.vault_export import export_chunks
+from api.vault_import import iter_ndjson, import_entries
+from api.password_routes import security_level_for
+from database_postgres import PasswordEntry
+from conftest import MASTER_PASSWORD
+
+def test_plain_export_round_trips_through_import(db, make_vault):
+    """Test that a plain export is batched and re-imports to the same entries"""
+    vault = make_vault(25)
+
+    chunks = list(export_chunks(vault.user_id, 'plain', vault.encryptor, batch_size=10))
+    assert len(chunks) == 3  # One chunk per yield_per partition
+    lines = [json.loads(line) for line in ''.join(chunks).splitlines()]
+    assert [line['password'] for line in lines] == [f'secret{i}' for i in range(25)]
+
+    other = make_vault()
+    body = io.BytesIO(''.join(chunks).encode('utf-8'))
+    summary = import_entries(db, other.user_id, iter_ndjson(body), other.encryptor, security_level_for,
+                             batch_size=10, max_rows=100)
+    assert (summary.imported, summary.failed) == (25, 0)
+    print("✅ Plain export streams in batches and re-imports")
+
+def test_plain_export_leaves_failed_entries_unimportable(db, make_vault):
+    """Test that an entry that fails to decrypt exports without a password and is rejected on import"""
+    vault = make_vault(3)
+    entry = db.query(PasswordEntry).filter_by(user_id=vault.user_id).order_by(PasswordEntry.id).first()
+    entry.encrypted_password = b'not a ciphertext'
+    db.commit()
+
+    lines = [json.loads(line) for line in ''.join(export_chunks(vault.user_id, 'plain', vault.encryptor)).splitlines()]
+    assert lines[0]['password'] is None and lines[0]['error']
+    assert '[Decryption failed]' not in json.dumps(lines)
+
+    other = make_vault()
+    body = io.BytesIO('\n'.join(json.dumps(line) for line in lines).encode('utf-8'))
+    summary = import_entries(db, other.user_id, iter_ndjson(body), other.encryptor, security_level_for,
+                             batch_size=10, max_rows=100)
+    assert (summary.imported, summary.failed) == (2, 1)
+    assert 'was not exported' in summary.errors[0]['error']
+    print("✅ Undecryptable entries export as null and are not re-imported")
+
+def test_ciphertext_export_needs_only_master_password(make_vault):
+    """Test that a ciphertext export restores with the master password alone"""
+    vault = make_vault(5)
+
+    header, *entries = [json.loads(line) for line in
+                        ''.join(export_chunks(vault.user_id, 'ciphertext')).splitlines()]
+    assert header['bino_vault_export'] == 1 and len(entries) == 5
+    assert all('password' not in entry for entry in entries)
+
+    vault_key = PasswordEncryption(MASTER_PASSWORD).unwrap_vault_key(base64.b64decode(header['wrapped_vault_key']))
+    restored = PasswordEncryption(vault_key=vault_key, key_id=header['vault_key_id'])
+    assert [restored.decrypt(base64.b64decode(entry['encrypted_password'])) for entry in entries] == \
+        [f'secret{i}' for i in range(5)]
+    print("✅ Ciphertext export decrypts with the wrapped key in its header")
+
+def test_export_route_streams(make_vault, make_client):
+    """Test the route returns a streamed NDJSON attachment"""
+    client = make_client(make_vault(3))
+
+    response = client.get('/api/passwords/export')
+    assert response.status_code == 200 and response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    assert 'attachment' in response.headers['Content-Disposition']
+    assert len(response.get_data(as_text=True).splitlines()) == 3
+    assert client.get('/api/passwords/export?mode=zip').status_code == 400
+    print("✅ Export route streams an attachment")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
@@ -0,0 +1,108 @@
+"""Test script for the filtered, sorted, keyset-paginated vault listing"""
+import pytest
+from datetime import datetime, timedelta
+from database_postgres import PasswordEntry
+from api.vault_query import LISTING_FIELDS, ListingQuery, select_fields, serialize_rows
+
+START = datetime(2026, 1, 1)
+
+def listing_entry(i):
+    """Mixed-case websites, three usernames/levels, ties on updated_at"""
+    return {
+        'website': f"{'GitHub' if i % 2 else 'gitlab'}-{i:02d}",
+        'username': 'alice' if i % 3 else 'bob',
+        'security_level': ('Calm', 'Alert', 'Critical')[i % 3],
+        'created_at': START + timedelta(minutes=i),
+        'updated_at': START + timedelta(minutes=i // 2)  # Ties: id breaks them
+    }
+
+def fetch_all_pages(db, user_id, **params):
+    """Follow next_cursor to the end, returning ids and page count"""
+    ids, pages, cursor = [], 0, None
+    while True:
+        listing = ListingQuery(limit=5, cursor=cursor, **params)
+        query = listing.apply(db.query(PasswordEntry.id).filter(PasswordEntry.user_id == user_id))
+        rows, cursor = listing.page(query.all())
+        ids += [row[0] for row in rows]
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+def test_pages_cover_every_entry_in_order(db, make_vault):
+    """Test that following cursors visits each entry exactly once, in sort order"""
+    user_id = make_vault(23, entry=listing_entry).user_id
+    entries = db.query(PasswordEntry).filter_by(user_id=user_id).all()
+
+    ids, pages = fetch_all_pages(db, user_id)
+    expected = [e.id for e in sorted(entries, key=lambda e: (e.updated_at, e.id), reverse=True)]
+    assert ids == expected
+    assert pages == 5
+    print("✅ Default sort pages through every entry once (ties on updated_at)")
+
+    ids, _ = fetch_all_pages(db, user_id, sort='website')
+    expected = [e.id for e in sorted(entries, key=lambda e: (e.website.lower(), e.id))]
+    assert ids == expected
+    print("✅ Case-insensitive A-Z sort")
+
+def test_filters(db, make_vault):
+    """Test prefix and security-level filters"""
+    user_id = make_vault(23, entry=listing_entry).user_id
+    entries = db.query(PasswordEntry).filter_by(user_id=user_id).all()
+
+    ids, _ = fetch_all_pages(db, user_id, sort='-created_at', website='GITH', security_level='Alert')
+    expected = [e.id for e in sorted(entries, key=lambda e: e.created_at, reverse=True)
+                if e.website.startswith('GitHub') and e.security_level == 'Alert']
+    assert ids == expected and ids
+    print("✅ Website prefix + security level filter")
+
+    ids, _ = fetch_all_pages(db, user_id, username='b')
+    assert sorted(ids) == sorted(e.id for e in entries if e.username == 'bob')
+
+    ids, _ = fetch_all_pages(db, user_id, website='git_')
+    assert ids == []  # _ is literal, not a wildcard
+    print("✅ Username prefix filter, LIKE wildcards escaped")
+
+def test_invalid_parameters():
+    """Test that bad input raises ValueError (a 400 in the route)"""
+    for params in ({'sort': 'password'}, {'security_level': 'Fine'}, {'cursor': 'garbage'}):
+        try:
+            ListingQuery(**params)
+            assert False, params
+        except ValueError:
+            pass
+
+    cursor = ListingQuery(limit=1)._encode_cursor('x', 1)
+    try:
+        ListingQuery(sort='website', cursor=cursor)
+        assert False
+    except ValueError:
+        pass
+
+    for limit in ('0', '1000', 'ten'):
+        try:
+            ListingQuery.from_args({'limit': limit}, max_limit=200)
+            assert False, limit
+        except ValueError:
+            pass
+    assert ListingQuery.from_args({}, max_limit=200).paginated is False
+    print("✅ Invalid sort, level, cursor and limit rejected")
+
+def test_core_rows_serialize(db, make_vault):
+    """Test the Core column select serializes like the listing, with per-entry decrypt errors"""
+    vault = make_vault(3, entry=lambda i: {**listing_entry(i), **({'encrypted_password': b'unused'} if i else {})})
+    user_id, encryptor = vault.user_id, vault.encryptor
+
+    statement = select_fields(LISTING_FIELDS).where(PasswordEntry.user_id == user_id).order_by(PasswordEntry.id)
+    items = serialize_rows(LISTING_FIELDS, db.execute(statement).all(), encryptor)
+    assert items[0]['password'] == 'secret0' and items[0]['created_at'] == '2026-01-01 00:00:00'
+    assert items[0]['security_level'] == 'Calm' and 'error' not in items[0]
+    assert items[1]['password'] == '[Decryption failed]' and items[1]['security_level'] == 'Critical' and items[1]['error']
+    assert list(items[1]) == ['id', 'website', 'username', 'password', 'security_level', 'error']  # As before batching
+
+    fields = ['id', 'website', 'updated_at']
+    items = serialize_rows(fields, db.execute(select_fields(fields).where(PasswordEntry.user_id == user_id)).all())
+    assert all(list(item) == fields for item in items)
+    print("✅ Core rows serialize with batched decryption")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
@@ -0,0 +1,238 @@
+"""Test script for vault key rotation (streaming, resumable re-encryption)"""
+import base64
+import itertools
+import threading
+import pytest
+from argon2 import PasswordHasher
+from flask import Flask
+from database_postgres import SessionLocal, User, PasswordEntry, VaultRekeyJob, close_db
+from crypto.encryption import PasswordEncryption, V3_HEADER
+from crypto import vault_migration
+from api import auth_routes
+from api.recovery_routes import recovery_bp
+from api.password_routes import password_bp, VaultSessionInterface
+from conftest import MASTER_PASSWORD
+from test_encryption import make_v1_blob
+
+class Crash(Exception):
+    pass
+
+def test_rotation_resumes_from_checkpoint(db, make_vault):
+    """Test that an interrupted rotation resumes after its last committed batch"""
+    vault = make_vault(25)
+    user, old_key = db.get(User, vault.user_id), vault.vault_key
+    user_id, old_id = user.id, user.vault_key_id
+    new_key, job = vault_migration.start_key_rotation(db, user, MASTER_PASSWORD, old_key)
+    job_id = job.id
+    encryptor = PasswordEncryption(vault_key=new_key, key_id=job.to_key_id, keyring={old_id: old_key})
+    
+    # Crash right after the first batch commits
+    commit = db.commit
+    def commit_then_crash():
+        commit()
+        raise Crash()
+    db.commit = commit_then_crash
+    try:
+        vault_migration._reencrypt_pass(db, user_id, encryptor, 0, 10, job)
+    except Crash:
+        pass
+    db.close()
+    
+    db = SessionLocal()
+    job = db.get(VaultRekeyJob, job_id)
+    tenth_id = db.query(PasswordEntry.id).filter_by(user_id=user_id).order_by(PasswordEntry.id).offset(9).first()[0]
+    assert (job.last_entry_id, job.entries_done, job.status) == (tenth_id, 10, 'running')
+    db.close()
+    
+    assert vault_migration.reencrypt_entries(user_id, encryptor, job_id, batch_size=10) == 15
+    
+    db = SessionLocal()
+    job = db.get(VaultRekeyJob, job_id)
+    assert job.status == 'complete' and job.wrapped_old_key is None
+    entries = db.query(PasswordEntry).filter_by(user_id=user_id).order_by(PasswordEntry.id).all()
+    assert {V3_HEADER.unpack(e.encrypted_password[:V3_HEADER.size])[3] for e in entries} == {job.to_key_id}
+    assert [encryptor.decrypt(e.encrypted_password) for e in entries][:2] == ['secret0', 'secret1']
+    db.close()
+    print("✅ Resumable rotation test passed")
+
+def rotate(db, vault):
+    """Start a rotation for vault's user; returns (job_id, encryptor for the new key and the retired one)"""
+    user = db.get(User, vault.user_id)
+    old_id = user.vault_key_id
+    new_key, job = vault_migration.start_key_rotation(db, user, MASTER_PASSWORD, vault.vault_key)
+    return job.id, PasswordEncryption(vault_key=new_key, key_id=job.to_key_id, keyring={old_id: vault.vault_key})
+
+def test_rotation_rewrites_v2_entries_with_retired_key(db, make_vault):
+    """Test that v2 envelopes (no key id) still open after the current key changed"""
+    def v2_entry(i):
+        sealed = PasswordEncryption._seal(vault_key, f'envelope{i}'.encode('utf-8'))
+        return {'encrypted_password': ('v2:' + base64.b64encode(sealed).decode('ascii')).encode('ascii')}
+    vault_key = PasswordEncryption.generate_vault_key()
+    vault = make_vault(3, entry=v2_entry)
+    vault.vault_key = vault_key  # The entries' key becomes the retired one
+    job_id, encryptor = rotate(db, vault)
+
+    assert vault_migration.reencrypt_entries(vault.user_id, encryptor, job_id) == 3
+    db.expire_all()
+    assert db.get(VaultRekeyJob, job_id).status == 'complete'
+    entries = db.query(PasswordEntry).filter_by(user_id=vault.user_id).order_by(PasswordEntry.id).all()
+    assert [encryptor.decrypt(e.encrypted_password) for e in entries] == ['envelope0', 'envelope1', 'envelope2']
+    print("✅ v2 entries are read with the retired key and rewritten")
+
+def test_rotation_keeps_retired_key_while_entries_need_it(db, make_vault):
+    """Test that a job with unreadable retired-key entries stays running and keeps its wrapped key"""
+    vault = make_vault(2)
+    job_id, encryptor = rotate(db, vault)
+    broken = db.get(PasswordEntry, vault.entry_ids[0])
+    broken.encrypted_password = broken.encrypted_password[:-1] + b'\x00'  # Tag no longer verifies
+    db.commit()
+
+    assert vault_migration.reencrypt_entries(vault.user_id, encryptor, job_id) == 1
+    db.expire_all()
+    job = db.get(VaultRekeyJob, job_id)
+    assert job.status == 'running' and job.wrapped_old_key
+    print("✅ Retired key kept while an entry still needs it")
+
+def test_reencryption_requested_mid_run_is_queued(monkeypatch):
+    """Test that a second start_reencryption for a busy user runs after the first instead of being dropped"""
+    started, release, calls = threading.Event(), threading.Event(), []
+    def fake_reencrypt(user_id, encryptor, job_id):
+        calls.append(job_id)
+        started.set()
+        release.wait(5)
+        return 0
+    monkeypatch.setattr(vault_migration, 'reencrypt_entries', fake_reencrypt)
+
+    vault_migration.start_reencryption(-1, PasswordEncryption())
+    assert started.wait(5)
+    vault_migration.start_reencryption(-1, PasswordEncryption(), 42)
+    release.set()
+    for _ in range(500):
+        if -1 not in vault_migration._running:
+            break
+        threading.Event().wait(0.01)
+    assert calls == [None, 42]
+    print("✅ Rotation requested during an upgrade run is queued")
+
+_client_addresses = (f'198.51.100.{n}' for n in itertools.count(60))
+
+@pytest.fixture
+def app_client(db, monkeypatch):
+    """Full-app client on a database holding only the user it registers (the app is single-user)"""
+    for user in db.query(User).all():
+        db.delete(user)  # Cascades to entries (and their search rows), sessions and jobs
+    db.commit()
+    monkeypatch.setattr(auth_routes, 'start_reencryption', lambda *args: None)  # Keep rotations running
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = VaultSessionInterface()
+    app.register_blueprint(auth_routes.auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(recovery_bp, url_prefix='/api/recovery')
+    app.register_blueprint(password_bp)
+    app.teardown_appcontext(close_db)
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = next(_client_addresses)  # Own rate-limit budget per test
+    return client
+
+def call(client, method, path, status, **json):
+    response = client.open(path, method=method, json=json)
+    assert response.status_code == status, (path, response.status_code, response.json)
+    return response.json
+
+def test_reset_during_rotation_keeps_vault_readable(app_client):
+    """Test a recovery reset mid-rotation re-wraps the retired key too (no lockout)"""
+    client = app_client
+    call(client, 'POST', '/api/auth/register', 201, master_password='old-master-pw')
+    call(client, 'POST', '/api/auth/login', 200, master_password='old-master-pw')
+    for i in range(3):
+        call(client, 'POST', '/api/passwords/', 201, website=f'site{i}', username='me', password=f'secret{i}')
+    stale_key = call(client, 'POST', '/api/recovery/generate', 200)['recovery_key']
+
+    rotated = call(client, 'POST', '/api/auth/rotate-key', 202, master_password='old-master-pw')
+    assert rotated['recovery_key_reset'] and rotated['warning']
+
+    # The old recovery key can't unlock the new vault key: refused, nothing changed
+    error = call(client, 'POST', '/api/recovery/reset-password', 409,
+                 recovery_key=stale_key, new_master_password='new-master-pw')['error']
+    assert 'generate a new recovery key' in error
+    print("✅ Reset with a recovery key from before the rotation is refused")
+
+    recovery_key = call(client, 'POST', '/api/recovery/generate', 200)['recovery_key']
+    call(client, 'POST', '/api/recovery/reset-password', 200,
+         recovery_key=recovery_key, new_master_password='new-master-pw')
+    for _ in range(2):  # Every later login, not just the first
+        call(client, 'POST', '/api/auth/login', 200, master_password='new-master-pw')
+    passwords = call(client, 'GET', '/api/passwords/', 200)['passwords']
+    assert sorted(entry['password'] for entry in passwords) == ['secret0', 'secret1', 'secret2']
+    print("✅ Reset mid-rotation: login works and retired-key entries still decrypt")
+
+def test_unreadable_retired_key_does_not_block_login(app_client, db):
+    """Test login succeeds (without the retired key) if a job's wrapped key can't be unwrapped"""
+    client = app_client
+    call(client, 'POST', '/api/auth/register', 201, master_password='master-pw')
+    call(client, 'POST', '/api/auth/login', 200, master_password='master-pw')
+    call(client, 'POST', '/api/auth/rotate-key', 202, master_password='master-pw')
+
+    job = db.query(VaultRekeyJob).filter_by(status='running').one()
+    job.wrapped_old_key = PasswordEncryption('someone-else').wrap_vault_key(b'k' * 32)
+    db.commit()
+    call(client, 'POST', '/api/auth/login', 200, master_password='master-pw')
+    print("✅ Unreadable retired key: login still succeeds")
+
+def test_login_upgrade_stops_at_time_budget(db, make_vault):
+    """Test that the login upgrade stops after one batch past its budget and the job finishes the rest"""
+    vault = make_vault(5, entry=lambda i: {
+        'encrypted_password': make_v1_blob(MASTER_PASSWORD, f'legacy{i}').encode('ascii')})
+    encryptor = PasswordEncryption(MASTER_PASSWORD, vault_key=vault.vault_key)
+
+    assert vault_migration.upgrade_password_derived_entries(db, vault.user_id, encryptor, 0, batch_size=2) == 2
+    assert vault_migration.reencrypt_entries(vault.user_id, encryptor) == 3
+    db.expire_all()
+    entries = db.query(PasswordEntry).filter_by(user_id=vault.user_id).order_by(PasswordEntry.id).all()
+    assert [encryptor.decrypt(e.encrypted_password) for e in entries] == [f'legacy{i}' for i in range(5)]
+    assert not any(PasswordEncryption.needs_kdf(e.encrypted_password) for e in entries)
+    print("✅ Login upgrade bounded; background job upgrades the rest")
+
+def test_reset_with_pre_wrap_recovery_key(app_client, db):
+    """Test a recovery key from before vault-key wrapping still resets, and says the vault is lost"""
+    client = app_client
+    call(client, 'POST', '/api/auth/register', 201, master_password='forgotten-pw')
+    call(client, 'POST', '/api/auth/login', 200, master_password='forgotten-pw')
+    call(client, 'POST', '/api/passwords/', 201, website='site', username='me', password='secret')
+    user = db.query(User).one()
+    user.recovery_key_hash = PasswordHasher().hash('OLDRECOVERYKEY')
+    user.recovery_wrapped_vault_key = None  # What older recovery keys left behind
+    db.commit()
+
+    body = call(client, 'POST', '/api/recovery/reset-password', 200,
+                recovery_key='OLDRECOVERYKEY', new_master_password='new-master-pw')
+    assert body['vault_recovered'] is False and 'cannot be decrypted' in body['warning']
+    db.expire_all()
+    assert user.vault_key_id > 1
+    call(client, 'POST', '/api/auth/login', 200, master_password='new-master-pw')
+    call(client, 'POST', '/api/passwords/', 201, website='fresh', username='me', password='new-secret')
+    passwords = {e['website']: e for e in call(client, 'GET', '/api/passwords/', 200)['passwords']}
+    assert passwords['site']['security_level'] == 'Lost' and 'error' in passwords['site']
+    assert passwords['fresh']['password'] == 'new-secret'
+    print("✅ Pre-wrap recovery key resets the password and marks old entries lost")
+
+def test_login_upgrades_legacy_entries_before_session(app_client, db):
+    """Test legacy v1 entries decrypt straight after login (background job disabled)"""
+    client = app_client
+    call(client, 'POST', '/api/auth/register', 201, master_password='master-pw')
+    user = db.query(User).one()
+    db.add_all([PasswordEntry(user_id=user.id, website=f'site{i}', username='me',
+                              encrypted_password=make_v1_blob('master-pw', f'legacy{i}').encode('ascii'))
+                for i in range(3)])
+    db.commit()
+
+    call(client, 'POST', '/api/auth/login', 200, master_password='master-pw')
+    passwords = call(client, 'GET', '/api/passwords/', 200)['passwords']
+    assert sorted(entry['password'] for entry in passwords) == ['legacy0', 'legacy1', 'legacy2']
+    db.expire_all()
+    assert not any(PasswordEncryption.needs_kdf(e.encrypted_password) for e in db.query(PasswordEntry).all())
+    print("✅ Legacy entries are upgraded at login and readable from the session")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
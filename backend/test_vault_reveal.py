@@ -0,0 +1,51 @@
+"""Test script for the metadata-only listing (?fields=) and on-demand reveal"""
+import pytest
+from crypto.encryption import PasswordEncryption
+
+def test_metadata_listing_never_decrypts(make_vault, make_client, monkeypatch):
+    """Test ?fields= without password returns only those columns and skips decryption"""
+    client = make_client(make_vault(3))
+
+    def no_decrypt(*args, **kwargs):
+        raise AssertionError('metadata-only listing decrypted an entry')
+    monkeypatch.setattr(PasswordEncryption, 'decrypt', no_decrypt)
+    monkeypatch.setattr(PasswordEncryption, 'decrypt_many', no_decrypt)
+
+    response = client.get('/api/passwords/?fields=website,username,security_level')
+    assert response.status_code == 200, response.json
+    assert response.json['count'] == 3
+    assert all(set(item) == {'id', 'website', 'username', 'security_level'} for item in response.json['passwords'])
+
+    response = client.get('/api/passwords/?fields= website , ,created_at')
+    assert response.status_code == 200
+    assert all(set(item) == {'id', 'website', 'created_at'} for item in response.json['passwords'])
+    print("✅ Metadata-only listing returns the requested columns without decrypting")
+
+def test_invalid_fields_rejected(make_vault, make_client):
+    """Test unknown ?fields= values are a 400 naming them"""
+    client = make_client(make_vault(1))
+    for fields in ('bogus', 'website,encrypted_password', 'user_id'):
+        response = client.get(f'/api/passwords/?fields={fields}')
+        assert response.status_code == 400 and not response.json['success']
+        assert response.json['error'].startswith('Unknown fields:')
+    assert 'encrypted_password' in client.get('/api/passwords/?fields=website,encrypted_password').json['error']
+    print("✅ Unknown fields rejected")
+
+def test_reveal(make_vault, make_client):
+    """Test reveal decrypts one owned entry, uncached, and 404s for anyone else's"""
+    vault, other = make_vault(2), make_vault(1)
+    client = make_client(vault)
+
+    response = client.post(f'/api/passwords/{vault.entry_ids[1]}/reveal')
+    assert response.status_code == 200
+    assert response.json == {'success': True, 'id': vault.entry_ids[1], 'password': 'secret1'}
+    assert response.headers['Cache-Control'] == 'no-store'
+    print("✅ Reveal returns one password with Cache-Control: no-store")
+
+    for entry_id in (other.entry_ids[0], 999999):
+        response = client.post(f'/api/passwords/{entry_id}/reveal')
+        assert response.status_code == 404 and response.json['error'] == 'Password not found'
+    print("✅ Another user's entry (or a missing one) is a 404")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
@@ -0,0 +1,61 @@
+"""Test script for full-text vault search (FTS5 on SQLite)"""
+import pytest
+from database_postgres import PasswordEntry
+from api.vault_search import search_entry_ids, search_terms
+
+def add_entry(db, user_id, website, username, notes=None):
+    entry = PasswordEntry(user_id=user_id, website=website, username=username,
+                          encrypted_password=b'unused', notes=notes)
+    db.add(entry)
+    db.commit()
+    return entry.id
+
+def test_prefix_and_ranked_matching(db, make_vault):
+    """Test prefix terms, AND semantics and website-over-notes ranking"""
+    user_id = make_vault().user_id
+    github = add_entry(db, user_id, 'github.com', 'alice')
+    gitlab = add_entry(db, user_id, 'gitlab.com', 'bob')
+    notes_only = add_entry(db, user_id, 'example.org', 'carol', notes='old github account')
+    add_entry(db, user_id, 'bank.example', 'alice')
+
+    assert search_entry_ids(db, user_id, 'github', 10) == [github, notes_only]  # Website match first
+    assert set(search_entry_ids(db, user_id, 'git', 10)) == {github, gitlab, notes_only}
+    assert search_entry_ids(db, user_id, 'git ali', 10) == [github]
+    assert search_entry_ids(db, user_id, 'GIT', 1) == search_entry_ids(db, user_id, 'git', 1)
+    assert search_entry_ids(db, user_id, '"*) (', 10) == []
+    assert search_entry_ids(db, user_id, '") NOT (github', 10) == []  # NOT is a word here, not an operator
+    print("✅ Prefix, multi-word and ranked matching")
+
+    other_user = make_vault().user_id
+    add_entry(db, other_user, 'github.com', 'mallory')
+    assert search_entry_ids(db, user_id, 'mallory', 10) == []
+    print("✅ Results limited to the user's own entries")
+
+def test_index_follows_updates_and_deletes(db, make_vault):
+    """Test that ORM updates and deletes keep the search index in sync"""
+    user_id = make_vault().user_id
+    entry_id = add_entry(db, user_id, 'dropbox.com', 'dave')
+
+    entry = db.get(PasswordEntry, entry_id)
+    entry.website = 'box.com'
+    db.commit()
+    assert search_entry_ids(db, user_id, 'dropbox', 10) == []
+    assert search_entry_ids(db, user_id, 'box', 10) == [entry_id]
+
+    entry.notes = 'shared family folder'
+    db.commit()
+    assert search_entry_ids(db, user_id, 'famil', 10) == [entry_id]
+
+    db.delete(entry)
+    db.commit()
+    assert search_entry_ids(db, user_id, 'box', 10) == []
+    print("✅ Index follows updates and deletes")
+
+def test_search_terms():
+    assert search_terms('  GitHub.com  alice ') == ['github', 'com', 'alice']
+    assert search_terms(None) == []
+    assert len(search_terms('a ' * 20)) == 8
+    print("✅ Query words extracted and capped")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
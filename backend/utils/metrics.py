@@ -0,0 +1,46 @@
+"""
+Tiny in-process metrics registry.
+
+Components register a callable returning a dict; GET /metrics returns a
+snapshot of every registered source for this worker process.
+
+The snapshot exposes internals (session cache, rate-limit counters,
+hashing queue), so the endpoint needs "Authorization: Bearer
+<METRICS_TOKEN>". With no token configured the route isn't registered at
+all: behind a reverse proxy every caller looks like loopback, so the peer
+address can't stand in for a token.
+"""
+import hmac
+import os
+
+_sources = {}
+
+
+def register(name, fn):
+    """Register fn() -> dict under name (re-registering replaces it)."""
+    _sources[name] = fn
+
+
+def snapshot() -> dict:
+    """Collect current values from every registered source."""
+    data = {'pid': os.getpid()}
+    for name, fn in _sources.items():
+        try:
+            data[name] = fn()
+        except Exception as e:
+            data[name] = {'error': str(e)}
+    return data
+
+
+def is_authorized(authorization: str, token: str) -> bool:
+    """
+    Whether a /metrics request may see the snapshot.
+
+    Args:
+        authorization: The request's Authorization header (or None)
+        token: Configured admin token; None/empty never authorizes
+    """
+    if not token:
+        return False
+    scheme, _, supplied = (authorization or '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(supplied.strip().encode(), token.encode())
@@ -12,6 +12,17 @@ import SettingsModal from "./SettingsModal";
 import Avatar from "./Avatar";
 import StrengthBar from "./StrengthBar";
 
+// Listing columns; passwords are decrypted one at a time through reveal()
+const LISTING_FIELDS = "website,username,security_level,notes,created_at,updated_at";
+
+// Revealed passwords are cached per entry version: SQLite reuses the id of
+// a deleted last row, and updated_at changes on every edit
+const revealKey = (pwd) => `${pwd.id}@${pwd.updated_at}`;
+
+// Keep only the keys that still belong to a listed entry
+const pruneTo = (keys, current) =>
+  Object.fromEntries(Object.entries(current).filter(([key]) => keys.has(key)));
+
 export default function Dashboard() {
   const navigate = useNavigate();
   const { logout } = useAuth();
@@ -23,6 +34,7 @@ export default function Dashboard() {
   const [editingPassword, setEditingPassword] = useState(null);
   const [showGenerator, setShowGenerator] = useState(false);
   const [visiblePasswords, setVisiblePasswords] = useState(new Set());
+  const [revealed, setRevealed] = useState({});
   const [toast, setToast] = useState(null);
   const [viewingPassword, setViewingPassword] = useState(null);
   const [searchTerm, setSearchTerm] = useState("");
@@ -53,9 +65,13 @@ export default function Dashboard() {
     try {
       setLoading(true);
       setError(null);
-      const response = await passwordAPI.getAll();
+      const response = await passwordAPI.getAll({ fields: LISTING_FIELDS });
       if (response.success) {
-        setPasswords(response.passwords || []);
+        const entries = response.passwords || [];
+        const keys = new Set(entries.map(revealKey));
+        setPasswords(entries);
+        setRevealed((prev) => pruneTo(keys, prev));
+        setVisiblePasswords((prev) => new Set([...prev].filter((key) => keys.has(key))));
       } else {
         setError("Failed to load passwords");
       }
@@ -76,13 +92,47 @@ export default function Dashboard() {
     navigate("/");
   };
 
-  const togglePasswordVisibility = (id) => {
+  const revealPassword = async (pwd) => {
+    const key = revealKey(pwd);
+    if (key in revealed) {
+      return revealed[key];
+    }
+    const response = await passwordAPI.reveal(pwd.id);
+    setRevealed((prev) => ({ ...prev, [key]: response.password }));
+    return response.password;
+  };
+
+  const forgetRevealed = () => {
+    setRevealed({});
+    setVisiblePasswords(new Set());
+  };
+
+  // Entry with its decrypted password, for the details and edit modals
+  const withPassword = async (pwd) => {
+    try {
+      return { ...pwd, password: await revealPassword(pwd) };
+    } catch (err) {
+      showToast("Failed to decrypt password", "error");
+      return null;
+    }
+  };
+
+  const togglePasswordVisibility = async (pwd) => {
+    const key = revealKey(pwd);
+    if (!visiblePasswords.has(key)) {
+      try {
+        await revealPassword(pwd);
+      } catch (err) {
+        showToast("Failed to decrypt password", "error");
+        return;
+      }
+    }
     setVisiblePasswords((prev) => {
       const newSet = new Set(prev);
-      if (newSet.has(id)) {
-        newSet.delete(id);
+      if (newSet.has(key)) {
+        newSet.delete(key);
       } else {
-        newSet.add(id);
+        newSet.add(key);
       }
       return newSet;
     });
@@ -116,6 +166,7 @@ export default function Dashboard() {
     }
     try {
       await passwordAPI.delete(id);
+      forgetRevealed();
       showToast("Password deleted successfully 🗑️", "success");
       fetchPasswords();
     } catch (err) {
@@ -582,7 +633,7 @@ export default function Dashboard() {
                   <div
                     key={pwd.id}
                     className="password-card"
-                    onClick={() => setViewingPassword(pwd)}
+                    onClick={async () => setViewingPassword(await withPassword(pwd))}
                     style={{
                       backgroundColor: "#2A2A2A",
                       borderRadius: "12px",
@@ -668,14 +719,14 @@ export default function Dashboard() {
                           flex: 1,
                         }}
                       >
-                        {visiblePasswords.has(pwd.id)
-                          ? pwd.password
+                        {visiblePasswords.has(revealKey(pwd))
+                          ? revealed[revealKey(pwd)]
                           : "••••••••••••"}
                       </code>
                       <button
                         onClick={(e) => {
                           e.stopPropagation();
-                          togglePasswordVisibility(pwd.id);
+                          togglePasswordVisibility(pwd);
                         }}
                         style={{
                           padding: "6px 12px",
@@ -687,12 +738,15 @@ export default function Dashboard() {
                           cursor: "pointer",
                         }}
                       >
-                        {visiblePasswords.has(pwd.id) ? "🙈 Hide" : "👁️ Show"}
+                        {visiblePasswords.has(revealKey(pwd)) ? "🙈 Hide" : "👁️ Show"}
                       </button>
                       <button
-                        onClick={(e) => {
+                        onClick={async (e) => {
                           e.stopPropagation();
-                          copyToClipboard(pwd.password, "Password");
+                          const full = await withPassword(pwd);
+                          if (full) {
+                            copyToClipboard(full.password, "Password");
+                          }
                         }}
                         style={{
                           padding: "6px 12px",
@@ -711,9 +765,9 @@ export default function Dashboard() {
 
                     <div style={{ display: "flex", gap: "12px" }}>
                       <button
-                        onClick={(e) => {
+                        onClick={async (e) => {
                           e.stopPropagation();
-                          setEditingPassword(pwd);
+                          setEditingPassword(await withPassword(pwd));
                         }}
                         style={{
                           flex: 1,
@@ -795,6 +849,7 @@ export default function Dashboard() {
           <AddPasswordModal
             onClose={() => setShowAddModal(false)}
             onSuccess={() => {
+              forgetRevealed();
               fetchPasswords();
               showToast("Password saved successfully! 🔐", "success");
             }}
@@ -805,6 +860,7 @@ export default function Dashboard() {
             password={editingPassword}
             onClose={() => setEditingPassword(null)}
             onSuccess={() => {
+              forgetRevealed();
               fetchPasswords();
               setEditingPassword(null);
               showToast("Password updated successfully! ✏️", "success");
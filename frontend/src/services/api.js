@@ -12,6 +12,9 @@ const apiClient = axios.create({
   withCredentials: true, // CRITICAL: Sends session cookies
 });
 
+// Last ETag-tagged listing per query ({ etag, data }), for If-None-Match
+const listingCache = new Map();
+
 // ==================== AUTH API ====================
 export const authAPI = {
   // Register new user
@@ -24,6 +27,7 @@ export const authAPI = {
 
   // Login
   login: async (masterPassword) => {
+    listingCache.clear();
     const response = await apiClient.post("/auth/login", {
       master_password: masterPassword,
     });
@@ -34,8 +38,43 @@ export const authAPI = {
 // ==================== PASSWORD API ====================
 export const passwordAPI = {
   // Get all passwords
-  getAll: async () => {
-    const response = await apiClient.get("/api/passwords/");
+  // Pass { fields: "website,username,security_level" } to skip decryption
+  // (use reveal() for one password). Metadata-only responses carry an ETag:
+  // the last body per query is kept here and sent back as If-None-Match, so
+  // an unchanged vault answers 304 and is neither re-read nor re-sent.
+  // Responses with passwords are no-store and never tagged
+  getAll: async (params = {}) => {
+    const key = JSON.stringify(params);
+    const cached = listingCache.get(key);
+    const response = await apiClient.get("/api/passwords/", {
+      params,
+      headers: cached ? { "If-None-Match": cached.etag } : {},
+      validateStatus: (status) =>
+        (status >= 200 && status < 300) || (status === 304 && !!cached),
+    });
+    if (response.status === 304) {
+      return cached.data;
+    }
+    const etag = response.headers.etag;
+    if (etag) {
+      listingCache.set(key, { etag, data: response.data });
+    } else {
+      listingCache.delete(key);
+    }
+    return response.data;
+  },
+
+  // Full-text search on website/username/notes (prefix match, best first)
+  search: async (q, params = {}) => {
+    const response = await apiClient.get("/api/passwords/search", {
+      params: { q, ...params },
+    });
+    return response.data;
+  },
+
+  // Decrypt a single password on demand
+  reveal: async (id) => {
+    const response = await apiClient.post(`/api/passwords/${id}/reveal`);
     return response.data;
   },
 